@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the generator steps and the verify_data.py query blocks
+
+Runs the generator as generate_augmented_data.py does (the Pipeline for
+STEP 1-7, sharded, then the STEP 8 checks and the STEP 9 writers) at several
+recipient scale factors, then every verify_data.py block on its output,
+and records wall time, rows/sec and peak memory (RSS growth over the stage,
+sampled in a background thread). Results are compared against a stored
+baseline: a stage regresses when it is slower / larger than the baseline by
+more than the threshold, and a scale or stage missing from the baseline
+fails too. Exit status 1 on any failure (for nightly builds).
+
+    python3 benchmarks/bench.py                       # 1x, 10x
+    python3 benchmarks/bench.py --scales 100 --update-baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from frescopa.aggregates import AggregateCollector, load_aggregates, save_aggregates
+from frescopa.integrity import IntegrityChecker
+from frescopa.pipeline import Pipeline
+from frescopa.recipients import RECIPIENT_COLUMNS
+from frescopa.report import PeakRss
+from frescopa.sharding import PENDING_ORDERS, SHARD_TABLES
+from frescopa.writer import write_csv
+import verify_data
+
+DATA_SAMPLE_DIR = ROOT / "data-sample"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Scales of a default run (each needs a baseline; 100x is recorded on the build host)
+SCALES = [1, 10]
+
+# A stage regresses past these relative increases over the baseline...
+THRESHOLDS = {'seconds': 0.25, 'peak_mb': 0.25}
+# ... if the increase is also above these absolute floors (timer / allocator noise)
+FLOORS = {'seconds': 0.25, 'peak_mb': 32.0}
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def measure(results, name, fn, rows=None):
+    """
+    Run fn() once, recording wall time, peak RSS growth and rows/sec.
+    rows is a count or a function of the result (default: len(result)).
+    """
+    with PeakRss() as memory:
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+    base, peak = memory.base, memory.peak
+
+    n_rows = rows(value) if callable(rows) else (len(value) if rows is None else rows)
+    results[name] = {
+        'seconds': round(seconds, 4),
+        'rows': int(n_rows),
+        'rows_per_sec': round(n_rows / seconds) if seconds > 0 else None,
+        'peak_mb': round((peak - base) / 2**20, 1),
+    }
+    print(f"   {name:32} {seconds:>8.3f}s {n_rows:>11,} rows {results[name]['peak_mb']:>9.1f} MB")
+    return value
+
+def quiet(fn, *args):
+    """Call fn without its report output"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args)
+
+def run_scale(scale, workers=1):
+    """The generator's STEP 1-9, then all verifier blocks, at one scale factor"""
+    results = {}
+    pipeline = Pipeline(scale=scale, workers=workers, data_sample_dir=DATA_SAMPLE_DIR)
+
+    measure(results, 'generate.load', lambda: [pipeline.brands, pipeline.sample_products, pipeline.sample_recipients],
+            rows=lambda samples: sum(len(df) for df in samples))
+    brands_df = pipeline.brands
+    products_df = measure(results, 'generate.products', lambda: pipeline.products)
+    measure(results, 'generate.recipients', lambda: pipeline.scaled_recipients)
+    recipients_df = measure(results, 'generate.segmentation', lambda: pipeline.recipients)
+
+    # STEP 4-7: the sharded activity tables, merged as in an in-memory run
+    def activity():
+        shards = list(pipeline.shards())
+        for shard in shards:
+            shard.pop(PENDING_ORDERS)
+        return {name: pd.concat([shard[name] for shard in shards], ignore_index=True) for name in SHARD_TABLES}
+    activity_tables = measure(results, 'generate.activity', activity,
+                              rows=lambda tables: sum(len(df) for df in tables.values()))
+
+    tables = {'brands': brands_df, 'products': products_df, 'recipients': recipients_df[RECIPIENT_COLUMNS],
+              **activity_tables}
+    total_rows = sum(len(df) for df in tables.values())
+
+    def integrity():
+        checker = IntegrityChecker({'brands': brands_df['name'].tolist(), 'recipients': recipients_df['crmid'].tolist(),
+                                    'products': products_df['code'].tolist()})
+        checker.check(tables)
+        return checker.finish()
+    measure(results, 'generate.integrity', integrity, rows=total_rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        # STEP 9: reference tables plain, activity tables with the run's id widths
+        measure(results, 'generate.write_csv',
+                lambda: [write_csv(df, directory, name, pipeline.id_widths if name in SHARD_TABLES else None)
+                         for name, df in tables.items()],
+                rows=total_rows)
+
+        def aggregate():
+            collector = AggregateCollector(pipeline.catalog)
+            collector.add(tables)
+            return save_aggregates(collector.result(), directory)
+        measure(results, 'generate.aggregates', aggregate, rows=total_rows)
+
+        # Fresh sidecar, then the fallback: load and recompute
+        measure(results, 'verify.sidecar', lambda: load_aggregates(directory), rows=total_rows)
+        loaded = measure(results, 'verify.load', lambda: verify_data.load_tables(directory), rows=total_rows)
+        aggregates = measure(results, 'verify.aggregate', lambda: verify_data.compute_aggregates(loaded),
+                             rows=total_rows)
+        for block in verify_data.QUERY_BLOCKS:
+            measure(results, f'verify.{block.__name__}', lambda: quiet(block, aggregates), rows=total_rows)
+    return results
+
+# ============================================================================
+# BASELINE
+# ============================================================================
+
+def missing(results, baseline):
+    """(scale, stage) of every result the baseline has no reference for"""
+    return [(scale, stage) for scale, stages in results.items()
+            for stage in stages if stage not in baseline.get(scale, {})]
+
+def regressions(results, baseline):
+    """(scale, stage, metric, baseline, current) for every threshold breach"""
+    found = []
+    for scale, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(scale, {}).get(stage)
+            if reference is None:
+                continue
+            for metric, threshold in THRESHOLDS.items():
+                current, previous = metrics[metric], reference[metric]
+                if current - previous > FLOORS[metric] and current > previous * (1 + threshold):
+                    found.append((scale, stage, metric, previous, current))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description="Frescopa generator / verifier benchmarks")
+    parser.add_argument('--scales', type=float, nargs='+', default=SCALES,
+                        help="recipient scale factors (default: 1 10)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for STEP 4-7, as in the generator (default: 1)")
+    parser.add_argument('--baseline', type=Path, default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="store these results as the new baseline (merged by scale)")
+    parser.add_argument('--output', type=Path, help="also write the results JSON here")
+    args = parser.parse_args()
+
+    results = {}
+    for scale in args.scales:
+        print(f"\n⏱️  Scale x{scale:g}")
+        results[f"{scale:g}"] = run_scale(scale, args.workers)
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+              'machine': platform.machine(), 'results': results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {'results': {}}
+    if args.update_baseline:
+        baseline.update({k: v for k, v in report.items() if k != 'results'})
+        baseline['results'].update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\n💾 Baseline updated: {args.baseline}")
+        return 0
+
+    # A result without a reference is a failure, not a silent pass
+    unmatched = missing(results, baseline['results'])
+    found = regressions(results, baseline['results'])
+    if not found and not unmatched:
+        print(f"\n✅ No regression against {args.baseline.name}")
+        return 0
+    if unmatched:
+        print(f"\n❌ {len(unmatched)} stage(s) not in {args.baseline.name} (record them with --update-baseline):")
+        for scale, stage in unmatched:
+            print(f"   x{scale} {stage}")
+    if found:
+        print(f"\n❌ {len(found)} regression(s) against {args.baseline.name}:")
+        for scale, stage, metric, previous, current in found:
+            print(f"   x{scale} {stage:32} {metric}: {previous} -> {current}")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Load the augmented data into a local SQLite database and run the demo queries in SQL
+"""
+
+import argparse
+import sqlite3
+from pathlib import Path
+
+from frescopa.database import DB_FILE, DEMO_QUERIES, export_sqlite, run_query
+
+DATA_DIR = Path("data-augmented")
+
+parser = argparse.ArgumentParser(description="Frescopa SQLite export")
+parser.add_argument('--data-dir', default=DATA_DIR, type=Path,
+                    help=f"directory of the tables to load (default: {DATA_DIR})")
+parser.add_argument('--db', type=Path,
+                    help=f"database file (default: <data-dir>/{DB_FILE})")
+parser.add_argument('--queries-only', action='store_true',
+                    help="run the demo queries against an existing database, without reloading it")
+args = parser.parse_args()
+
+db_path = args.db or args.data_dir / DB_FILE
+
+print("=" * 80)
+print("FRESCOPA SQLITE EXPORT")
+print("=" * 80)
+
+if not args.queries_only:
+    print(f"\n📥 Loading {args.data_dir}/ into {db_path}...")
+    timings = export_sqlite(args.data_dir, db_path)
+    indexes, index_seconds = timings.pop('indexes')
+    for name, (rows, seconds) in timings.items():
+        print(f"   ✓ {name + ':':<12} {rows:>10,} rows in {seconds:6.2f}s")
+    print(f"   ✓ {indexes} indexes built in {index_seconds:.2f}s")
+
+print("\n💡 DEMO QUERIES (SQL)")
+print("-" * 80)
+connection = sqlite3.connect(db_path)
+try:
+    for i, (name, (title, use_case, sql)) in enumerate(DEMO_QUERIES.items(), 1):
+        count, seconds = run_query(connection, name)
+        print(f"\n   Query {i}: {title}")
+        print(f"   Result: {count:,} ({seconds * 1000:.1f} ms)")
+        print(f"   Use case: {use_case}")
+finally:
+    connection.close()
+
+print("\n" + "=" * 80)
+print(f"✅ Database ready: {db_path}")
+print("=" * 80)
@@ -0,0 +1,4 @@
+"""
+Frescopa data generation engines
+Vectorized building blocks used by generate_augmented_data.py
+"""
@@ -0,0 +1,76 @@
+"""
+Abandoned cart engine (STEP 6)
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.catalog import CAPSULE, MACHINE
+from frescopa.purchases import sample_without_replacement
+from frescopa.timestamps import add_times
+
+ABANDONED_COLUMNS = ['date', 'cartid', 'cartnum', 'product', 'quantity', 'tosend', 'customer']
+
+ACTIVE_SEGMENTS = ['active_high', 'active_medium', 'occasional']
+MAX_CARTS_PER_CUSTOMER = 3
+CART_RECENCY_SCALE = 30    # days, exponential
+CART_MAX_AGE = 90          # days
+CART_SIZES = [1, 1, 2, 3]
+CART_QUANTITIES = [1, 5, 10, 15, 20]
+
+def active_customers(recipients_df):
+    """Recipients eligible for abandoned carts"""
+    return recipients_df[recipients_df['_internal_segment'].isin(ACTIVE_SEGMENTS)]
+
+def generate_abandoned(active_df, catalog, current_date, rng, carts_per_customer, max_lines, first_cart_id=1):
+    """
+    Generate exactly max_lines abandoned cart lines (fewer only when all
+    the carts drawn hold less). Each active customer abandons 1 to
+    min(carts_per_customer, MAX_CARTS_PER_CUSTOMER) carts; whole carts are
+    then kept in a uniformly random order until max_lines is reached (the
+    last one cut short). Cart ids follow customer order; all lines of a
+    cart share one timestamp.
+    """
+    crmids = active_df['crmid'].to_numpy()
+    current_day = np.datetime64(pd.Timestamp(current_date).date(), 'D')
+
+    # Carts of the whole active population
+    num_carts = rng.integers(1, min(carts_per_customer, MAX_CARTS_PER_CUSTOMER) + 1, len(crmids))
+    owners = np.repeat(np.arange(len(crmids)), num_carts)
+    days_ago = np.minimum(rng.exponential(scale=CART_RECENCY_SCALE, size=len(owners)).astype(np.int64),
+                          CART_MAX_AGE)
+    sizes = np.asarray(CART_SIZES)[rng.integers(0, len(CART_SIZES), len(owners))]
+
+    # Uniform sample of whole carts down to max_lines (the last one cut short)
+    order = rng.permutation(len(owners))
+    lines_before = np.cumsum(sizes[order]) - sizes[order]
+    kept_sizes = np.empty_like(sizes)
+    kept_sizes[order] = np.clip(max_lines - lines_before, 0, sizes[order])
+    kept = kept_sizes > 0
+
+    return build_carts(crmids[owners[kept]], (current_day - days_ago)[kept], catalog, rng, first_cart_id,
+                       sizes=kept_sizes[kept])
+
+def build_carts(crmids, cart_days, catalog, rng, first_cart_id=1, sizes=None):
+    """
+    Cart lines for a batch of carts: cart i belongs to crmids[i], was
+    abandoned on int day cart_days[i] and has sizes[i] lines (drawn from
+    CART_SIZES when not given). Cart ids are sequential in batch order.
+    """
+    cartable = np.r_[catalog.positions(CAPSULE), catalog.positions(MACHINE)]
+    n_carts = len(crmids)
+    if sizes is None:
+        sizes = np.asarray(CART_SIZES)[rng.integers(0, len(CART_SIZES), n_carts)]
+    picks = sample_without_replacement(rng, len(cartable), sizes)
+    cart_idx, slot = np.nonzero(picks >= 0)
+    cart_ids = first_cart_id + cart_idx
+
+    return pd.DataFrame({
+        'date': add_times(np.asarray(cart_days)[cart_idx].astype('datetime64[D]'), rng, groups=cart_ids),
+        'cartid': cart_ids,
+        'cartnum': slot + 1,
+        'product': catalog.codes[cartable[picks[cart_idx, slot]]],
+        'quantity': np.asarray(CART_QUANTITIES)[rng.integers(0, len(CART_QUANTITIES), len(cart_idx))],
+        'tosend': 0,
+        'customer': np.asarray(crmids)[cart_idx],
+    }, columns=ABANDONED_COLUMNS)
@@ -0,0 +1,158 @@
+"""
+Materialized report aggregates
+The counts and distributions verify_data.py reports (lines per product,
+orders per month, VIP / churn tiers, cart recency, the replenishment
+audience inputs...) are accumulated while the tables are generated and
+saved next to them, keyed by the content hash of every table file. The
+verifier answers from this sidecar while the files are unchanged and
+recomputes from the tables otherwise.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from frescopa.columnar import table_source
+
+AGGREGATES_FILE = "aggregates.npz"
+
+# Tables the sidecar is keyed on
+SOURCE_TABLES = ['products', 'recipients', 'purchases', 'wishlist', 'abandoned', 'segments']
+
+def _file_digest(path):
+    with open(path, 'rb') as handle:
+        return hashlib.file_digest(handle, 'blake2b').hexdigest()
+
+def table_sources(directory):
+    """{table: [file name, size, content hash]} of the files the tables load from"""
+    sources = {}
+    for name in SOURCE_TABLES:
+        _, path = table_source(directory, name)
+        if path.exists():
+            sources[name] = [path.name, path.stat().st_size, _file_digest(path)]
+    return sources
+
+def _counts(values):
+    """(distinct values, counts) in first-appearance order"""
+    codes, uniques = pd.factorize(np.asarray(values))
+    return np.asarray(uniques), np.bincount(codes, minlength=len(uniques))
+
+class AggregateCollector:
+    """
+    Accumulates the report aggregates from tables fed chunk by chunk.
+    Each chunk must hold whole customers (generator shards, or whole
+    tables): distinct orders and customers are summed across chunks.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.totals = {}
+        self.counts = {}
+        self.customers = []
+        self.columns = {}
+
+    def _add_total(self, key, value):
+        self.totals[key] = self.totals.get(key, 0) + int(value)
+
+    def _add_counts(self, key, values):
+        counts = self.counts.setdefault(key, {})
+        for value, count in zip(*_counts(values)):
+            counts[value] = counts.get(value, 0) + int(count)
+
+    def add(self, tables):
+        for name, df in tables.items():
+            self.columns.setdefault(name, list(df.columns))
+            self._add_total(f'{name}_rows', len(df))
+
+        if 'purchases' in tables:
+            purchases_df = tables['purchases']
+            self._add_total('orders', purchases_df['orderref'].nunique())
+            self._add_counts('product_lines', purchases_df['product'])
+            orders = purchases_df.drop_duplicates('orderref')
+            self._add_counts('month_orders', np.asarray(orders['date'], dtype='datetime64[M]'))
+
+            # Per-customer inputs of the replenishment audience (Query 5)
+            capsule = purchases_df['product'].isin(self.catalog.capsules).to_numpy()
+            machine = purchases_df['product'].isin(self.catalog.machines).to_numpy()
+            dates = np.asarray(purchases_df['date'], dtype='datetime64[m]')
+            self.customers.append(pd.DataFrame({
+                'last_capsule': np.where(capsule, dates, np.datetime64('NaT')),
+                'machine_owner': machine,
+            }, index=pd.Index(purchases_df['customer'], name='customer')).groupby(level=0, sort=False).max())
+
+        if 'segments' in tables:
+            self._add_counts('vip', tables['segments']['vip'])
+            self._add_counts('churnprop', tables['segments']['churnprop'])
+
+        if 'abandoned' in tables:
+            abandoned_df = tables['abandoned']
+            pending = abandoned_df[abandoned_df['tosend'] == 0]
+            self._add_total('pending_cart_items', len(pending))
+            self._add_total('pending_cart_customers', pending['customer'].nunique())
+            self._add_counts('cart_dates', np.asarray(abandoned_df['date'], dtype='datetime64[m]'))
+
+        if 'wishlist' in tables:
+            wishlist_df = tables['wishlist']
+            machines = wishlist_df['product'].isin(self.catalog.machines)
+            self._add_total('wishlist_machine_customers', wishlist_df['customer'][machines].nunique())
+
+    def result(self, integrity=None):
+        """
+        Aggregates as a flat dict of arrays. integrity is the STEP 8 outcome
+        ({check: violation count}) when the tables were validated.
+        """
+        aggregates = {key: np.int64(value) for key, value in self.totals.items()}
+        aggregates['columns'] = np.array([json.dumps(self.columns)])
+
+        for key, counts in self.counts.items():
+            values, totals = np.array(list(counts)), np.array(list(counts.values()), dtype=np.int64)
+            if key == 'product_lines':
+                # Most lines first, ties by code (independent of chunking)
+                order = np.lexsort((values.astype(str), -totals))
+            else:
+                order = np.argsort(values, kind='stable')
+            aggregates[f'{key}_values'] = values[order]
+            aggregates[f'{key}_counts'] = totals[order]
+
+        customers = (pd.concat(self.customers).groupby(level=0, sort=False).max() if self.customers
+                     else pd.DataFrame({'last_capsule': np.array([], 'datetime64[m]'), 'machine_owner': False}))
+        aggregates['purchase_customers'] = np.int64(len(customers))
+        aggregates['customer'] = customers.index.to_numpy().astype(str)
+        aggregates['last_capsule'] = customers['last_capsule'].to_numpy(dtype='datetime64[m]')
+        aggregates['machine_owner'] = customers['machine_owner'].to_numpy(dtype=bool)
+
+        if integrity is not None:
+            aggregates['integrity_checks'] = np.array(list(integrity), dtype=str)
+            aggregates['integrity_violations'] = np.array(list(integrity.values()), dtype=np.int64)
+        return aggregates
+
+def save_aggregates(aggregates, directory):
+    """Write the sidecar, keyed on the current table files (atomically)"""
+    path = directory / AGGREGATES_FILE
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as handle:
+        np.savez(handle, sources=np.array([json.dumps(table_sources(directory))]), **aggregates)
+    os.replace(tmp, path)
+    return path
+
+def load_aggregates(directory):
+    """The saved aggregates, or None when missing or stale (any table file changed)"""
+    path = directory / AGGREGATES_FILE
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        aggregates = {key: data[key] for key in data.files}
+    saved = json.loads(str(aggregates.pop('sources')[0]))
+    for name, (file_name, size, digest) in saved.items():
+        _, source = table_source(directory, name)
+        # Cheap checks first: the file a load would use, and its size
+        if source.name != file_name or not source.exists() or source.stat().st_size != size:
+            return None
+    if set(saved) != {name for name in SOURCE_TABLES if table_source(directory, name)[1].exists()}:
+        return None
+    if any(_file_digest(directory / file_name) != digest for file_name, _, digest in saved.values()):
+        return None
+    return aggregates
@@ -0,0 +1,191 @@
+"""
+Import batches
+Splits the Campaign CSVs into size-bounded import batches, so large tables
+load as many small files. Batches are cut on record boundaries and never
+inside an order (purchases.orderref) or a cart (abandoned.cartid); each is
+a complete CSV with the header, byte-identical to its slice of the table.
+Records are read as CSV, not as lines: a quoted field (a name or address
+with ';', '"' or a line break) stays in one record, and keys are unquoted.
+Batch files are written (and checksummed) in a thread pool. A manifest
+lists every batch with its rows, bytes, key range and SHA-256, so batches
+can be loaded in parallel and retried one at a time.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from frescopa.columnar import csv_source
+from frescopa.compression import open_compressed
+from frescopa.export import CSV_OPTIONS
+
+MANIFEST_FILE = "manifest.json"
+
+# Campaign import order (FK dependencies) and the key each table's batch range is reported on
+IMPORT_ORDER = ['brands', 'products', 'recipients', 'purchases', 'wishlist', 'abandoned', 'segments']
+BATCH_KEYS = {'brands': 'name', 'products': 'code', 'recipients': 'crmid', 'purchases': 'orderref',
+              'wishlist': 'wishListId', 'abandoned': 'cartid', 'segments': 'customer'}
+
+# Multi-line records a batch boundary must not cut
+GROUP_KEYS = {'purchases': 'orderref', 'abandoned': 'cartid'}
+
+# Bytes of CSV read per block
+READ_BYTES = 1 << 24
+
+SIZE_UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+def parse_size(text):
+    """Byte count from '500000', '64K', '512M' or '2G'"""
+    text = text.strip().upper().removesuffix('B')
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+def _write_batch(path, header, records):
+    data = header + b''.join(records)
+    with open(path, 'wb') as handle:
+        handle.write(data)
+    return len(data), hashlib.sha256(data).hexdigest()
+
+class _BatchWriter:
+    """Batch files of one table, written in a thread pool, at most 2 x threads in flight"""
+
+    def __init__(self, directory, name, header, threads):
+        self.directory = directory
+        self.name = name
+        self.header = header
+        self.batches = []
+        self._threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending = deque()
+
+    def submit(self, records, keys):
+        file_name = f"{self.name}_{len(self.batches) + 1:04d}.csv"
+        first, last = (key.decode(CSV_OPTIONS['encoding']) for key in (min(keys), max(keys)))
+        self.batches.append({'file': file_name, 'rows': len(records), 'first_key': first, 'last_key': last})
+        future = self._pool.submit(_write_batch, self.directory / file_name, self.header, records)
+        self._pending.append((self.batches[-1], future))
+        while len(self._pending) > 2 * self._threads:
+            self._collect()
+
+    def _collect(self):
+        batch, future = self._pending.popleft()
+        batch['bytes'], batch['sha256'] = future.result()
+
+    def close(self):
+        while self._pending:
+            self._collect()
+        self._pool.shutdown()
+
+def _key(record, key_index):
+    """Field key_index of a record (bytes, unquoted, without the line ending)"""
+    if b'"' not in record:
+        return record.split(b';', key_index + 1)[key_index].rstrip(b'\r\n')
+    text = record.decode(CSV_OPTIONS['encoding'])
+    fields = next(csv.reader(io.StringIO(text, newline=''), delimiter=CSV_OPTIONS['sep']))
+    return fields[key_index].encode(CSV_OPTIONS['encoding'])
+
+def _groups(records, key_index, grouped):
+    """(records, keys) runs of one record each, or of one order / cart when grouped"""
+    group, keys, last = [], [], None
+    for record in records:
+        key = _key(record, key_index)
+        if grouped and key != last and group:
+            if key < last:
+                raise ValueError(f"{key.decode()} after {last.decode()}: rows of a group are not contiguous")
+            yield group, keys
+            group, keys = [], []
+        group.append(record)
+        keys.append(key)
+        last = key
+        if not grouped:
+            yield group, keys
+            group, keys = [], []
+    if group:
+        yield group, keys
+
+def _records(handle):
+    """
+    Data records of an open CSV, read in blocks. A line ending inside a
+    quoted field continues the record: it ends where its quotes balance
+    ('""' escapes count twice).
+    """
+    record = b''
+    while True:
+        block = handle.readlines(READ_BYTES)
+        if not block:
+            break
+        for line in block:
+            if not record and b'"' not in line:
+                yield line
+                continue
+            record += line
+            if record.count(b'"') % 2 == 0:
+                yield record
+                record = b''
+    if record:
+        raise ValueError("unterminated quoted field at the end of the CSV")
+
+def split_table(data_dir, out_dir, name, max_rows=None, max_bytes=None, threads=None):
+    """
+    Split one table's CSV into batches of at most max_rows rows and
+    max_bytes bytes (header included; an order or cart larger than the
+    limit gets a batch of its own). Returns the manifest entry.
+    """
+    source = csv_source(data_dir, name)
+    for stale in out_dir.glob(f"{name}_*.csv"):
+        stale.unlink()
+
+    with open_compressed(source) as handle:
+        header = handle.readline()
+        key_index = header.rstrip(b'\r\n').split(b';').index(BATCH_KEYS[name].encode())
+        writer = _BatchWriter(out_dir, name, header, threads or os.cpu_count() or 1)
+        try:
+            records, keys, size = [], [], len(header)
+            for group, group_keys in _groups(_records(handle), key_index, name in GROUP_KEYS):
+                group_size = sum(map(len, group))
+                if records and ((max_rows and len(records) + len(group) > max_rows)
+                                or (max_bytes and size + group_size > max_bytes)):
+                    writer.submit(records, keys)
+                    records, keys, size = [], [], len(header)
+                records.extend(group)
+                keys.extend(group_keys)
+                size += group_size
+            if records:
+                writer.submit(records, keys)
+        finally:
+            writer.close()
+
+    return {'source': source.name, 'key': BATCH_KEYS[name], 'rows': sum(batch['rows'] for batch in writer.batches),
+            'batches': writer.batches}
+
+def split_directory(data_dir, out_dir, max_rows=None, max_bytes=None, threads=None):
+    """Split every table into out_dir and write the manifest last (atomically). Returns the manifest."""
+    if not max_rows and not max_bytes:
+        raise ValueError("import batches need a row or byte limit")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {'order': IMPORT_ORDER, 'max_rows': max_rows, 'max_bytes': max_bytes,
+                'encoding': CSV_OPTIONS['encoding'], 'separator': CSV_OPTIONS['sep'],
+                'tables': {name: split_table(data_dir, out_dir, name, max_rows, max_bytes, threads)
+                           for name in IMPORT_ORDER}}
+    path = out_dir / MANIFEST_FILE
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+    return manifest
+
+def check_batches(out_dir):
+    """Batches of the manifest whose file is missing or differs (size or checksum): the ones to redo"""
+    manifest = json.loads((out_dir / MANIFEST_FILE).read_text())
+    failed = []
+    for entry in manifest['tables'].values():
+        for batch in entry['batches']:
+            path = out_dir / batch['file']
+            if (not path.exists() or path.stat().st_size != batch['bytes']
+                    or hashlib.sha256(path.read_bytes()).hexdigest() != batch['sha256']):
+                failed.append(batch['file'])
+    return failed
@@ -0,0 +1,162 @@
+"""
+Content-keyed stage cache
+Each stage result is pickled under a key hashing the stage name, its
+inputs (tables, arrays, config values, sample files, RNG state) and the
+frescopa sources, so a rerun only recomputes the stages whose inputs
+changed. Stages that draw from a shared Generator store its state after
+the stage too, and restore it on a hit, so cached and fresh runs match.
+Any source or config change leaves the old entries behind, so the store is
+capped at a size limit: the least recently used entries are deleted first.
+"""
+
+import dataclasses
+import hashlib
+import os
+import pickle
+from collections.abc import Mapping
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = Path(".cache")
+
+# Size cap of the cache directory (least recently used entries go first)
+CACHE_LIMIT = 2 << 30
+
+def _source_version():
+    """Hash of the frescopa sources: any engine change invalidates the cache"""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).parent.glob('*.py')):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def _update(digest, value):
+    """Feed a value into a hash, recursing into containers"""
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr((list(value.columns), list(value.dtypes.astype(str)))).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        _update(digest, value.to_frame())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        if value.dtype == object:
+            digest.update(pd.util.hash_array(value.ravel()).tobytes())
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.random.SeedSequence):
+        _update(digest, ('SeedSequence', value.entropy, value.spawn_key, value.pool_size))
+    elif isinstance(value, np.random.Generator):
+        _update(digest, value.bit_generator.state)
+    elif isinstance(value, Path):
+        # Sample files are keyed by content, not by name or mtime
+        digest.update(value.read_bytes())
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        _update(digest, [(f.name, getattr(value, f.name)) for f in dataclasses.fields(value)])
+    elif isinstance(value, Mapping):
+        _update(digest, sorted(value.items(), key=lambda item: repr(item[0])))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}[{len(value)}]".encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, (datetime, date)):
+        digest.update(value.isoformat().encode())
+    else:
+        digest.update(repr(value).encode())
+
+def fingerprint(*parts):
+    """Stable hex digest of any mix of tables, arrays and plain values"""
+    digest = hashlib.sha256()
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+class StageCache:
+    """Pickle store of stage results keyed by input fingerprints, at most limit bytes"""
+
+    def __init__(self, directory=CACHE_DIR, enabled=True, limit=CACHE_LIMIT):
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.limit = limit
+        self.hits = []
+        self.misses = []
+        self.evicted = 0
+        self._version = _source_version() if enabled else None
+        self._size = 0
+        if enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.prune()
+
+    def _entries(self):
+        """(last used, size, path) of every entry, least recently used first"""
+        entries = []
+        for path in self.directory.glob('*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def prune(self):
+        """Delete least recently used entries until the cache fits in limit"""
+        entries = self._entries()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.limit:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+            self.evicted += 1
+
+    def key(self, stage, *inputs):
+        return f"{stage}-{fingerprint(self._version, stage, *inputs)[:32]}"
+
+    def load(self, key):
+        """Cached value of a key, or None"""
+        if not self.enabled:
+            return None
+        path = self.directory / f"{key}.pkl"
+        if not path.exists():
+            return None
+        with open(path, 'rb') as handle:
+            value = pickle.load(handle)
+        # A hit counts as a use: the modification time orders the eviction
+        os.utime(path)
+        return value
+
+    def store(self, key, value):
+        if not self.enabled:
+            return
+        path = self.directory / f"{key}.pkl"
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'wb') as handle:
+            pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._size += path.stat().st_size
+        if self._size > self.limit:
+            self.prune()
+
+    def record(self, stage, hit):
+        (self.hits if hit else self.misses).append(stage)
+
+    def stage(self, name, inputs, compute, rng=None):
+        """
+        Result of compute(), reused when a stage with the same inputs ran before.
+        With rng, its state is part of the key and is restored to the
+        post-stage state on a hit.
+        """
+        key = self.key(name, inputs, rng)
+        cached = self.load(key)
+        self.record(name, cached is not None)
+        if cached is not None:
+            value, state = cached
+            if rng is not None:
+                rng.bit_generator.state = state
+            return value
+
+        value = compute()
+        self.store(key, (value, rng.bit_generator.state if rng is not None else None))
+        return value
@@ -0,0 +1,81 @@
+"""
+Product catalog index
+Built once from the products table (after STEP 2) and shared by the
+generator steps and verify_data.py instead of masking products_df per line
+"""
+
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# products.category values
+CAPSULE = 1
+MACHINE = 2
+DISCOUNT = 3
+ACCESSORY = 4
+
+def _frozen(array):
+    """Read-only copy of an array"""
+    array = np.array(array)
+    array.setflags(write=False)
+    return array
+
+@dataclass(frozen=True)
+class ProductCatalog:
+    """Immutable code -> price / category index with per-category code arrays"""
+    codes: np.ndarray
+    prices: np.ndarray
+    categories: np.ndarray
+    index: MappingProxyType
+    price: MappingProxyType
+    category: MappingProxyType
+    by_category: MappingProxyType
+
+    @property
+    def capsules(self):
+        return self.by_category.get(CAPSULE, self.codes[:0])
+
+    @property
+    def machines(self):
+        return self.by_category.get(MACHINE, self.codes[:0])
+
+    @property
+    def accessories(self):
+        return self.by_category.get(ACCESSORY, self.codes[:0])
+
+    def positions(self, category):
+        """Row positions of the products in a category"""
+        return np.flatnonzero(self.categories == category)
+
+    def encode(self, codes):
+        """Vectorized code -> row position (-1 for unknown codes)"""
+        return pd.Index(self.codes).get_indexer(np.asarray(codes, dtype=object))
+
+    def __reduce__(self):
+        # Mapping proxies don't pickle: rebuild from the arrays (process pools)
+        return (_catalog_from_arrays, (self.codes, self.prices, self.categories))
+
+def build_catalog(products_df):
+    """Build the catalog index from a products table"""
+    return _catalog_from_arrays(products_df['code'].to_numpy(dtype=object),
+                                products_df['priceref'].to_numpy(dtype=float),
+                                products_df['category'].to_numpy(dtype=np.int64))
+
+def _catalog_from_arrays(codes, prices, categories):
+    codes = _frozen(codes)
+    prices = _frozen(prices)
+    categories = _frozen(categories)
+
+    by_category = {int(c): _frozen(codes[categories == c]) for c in np.unique(categories)}
+
+    return ProductCatalog(
+        codes=codes,
+        prices=prices,
+        categories=categories,
+        index=MappingProxyType({code: i for i, code in enumerate(codes)}),
+        price=MappingProxyType(dict(zip(codes, prices.tolist()))),
+        category=MappingProxyType(dict(zip(codes, categories.tolist()))),
+        by_category=MappingProxyType(by_category),
+    )
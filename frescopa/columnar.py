@@ -0,0 +1,157 @@
+"""
+Columnar sidecar output (Parquet / Feather)
+Typed copies of the Campaign CSVs, written next to them for analysis and
+fast reloads: dates as timestamps, product / brand codes as dictionary-encoded
+categories, ids in their Campaign form. The CSVs remain the import artifact.
+pyarrow is only needed when a columnar format is actually requested.
+"""
+
+import pandas as pd
+
+from frescopa.compression import csv_paths
+from frescopa.export import CSV_OPTIONS, DATE_COLUMNS
+from frescopa.ids import ID_PREFIXES, format_ids
+from frescopa.segments import SEGMENT_DATES
+from frescopa.timestamps import DATE_FORMAT, DAY_FORMAT
+
+COLUMNAR_FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+
+# Date columns stored as text in the Campaign tables
+TEXT_DATES = {'birthdate': DAY_FORMAT, **{col: DATE_FORMAT + ':%S' for col in SEGMENT_DATES}}
+
+# Low-cardinality code columns, dictionary-encoded
+CATEGORY_COLUMNS = ['product', 'brand', 'folder']
+
+# Rows per chunk when a table is streamed from disk
+CHUNK_ROWS = 1000000
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError("Columnar output needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+def to_columnar(df, id_widths=None, vocabulary=None):
+    """
+    Typed copy of a table. vocabulary fixes the categories of a code column
+    (e.g. the catalog codes) so every chunk of a stream shares one dictionary.
+    """
+    vocabulary = vocabulary or {}
+    typed = {}
+    for col in df.columns:
+        if col in ID_PREFIXES and pd.api.types.is_integer_dtype(df[col]):
+            typed[col] = format_ids(ID_PREFIXES[col], df[col], id_widths[col])
+        elif col in DATE_COLUMNS and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            typed[col] = pd.to_datetime(df[col], format=DATE_FORMAT)
+        elif col in TEXT_DATES and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            typed[col] = pd.to_datetime(df[col], format=TEXT_DATES[col])
+        elif col in CATEGORY_COLUMNS:
+            typed[col] = pd.Categorical(df[col], categories=vocabulary.get(col))
+    return df.assign(**typed) if typed else df
+
+class ChunkedColumnarWriter:
+    """Append DataFrame chunks to one Parquet / Feather file (one schema)"""
+
+    def __init__(self, path, fmt, id_widths=None, vocabulary=None):
+        self.pa = _pyarrow()
+        self.path = path
+        self.fmt = fmt
+        self.id_widths = id_widths
+        self.vocabulary = vocabulary
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df):
+        table = self.pa.Table.from_pandas(to_columnar(df, self.id_widths, self.vocabulary),
+                                          preserve_index=False)
+        if self._writer is None:
+            if self.fmt == 'parquet':
+                self._writer = self.pa.parquet.ParquetWriter(self.path, table.schema)
+            else:
+                options = self.pa.ipc.IpcWriteOptions(compression='lz4')
+                self._writer = self.pa.ipc.new_file(self.path, table.schema, options=options)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def columnar_path(directory, name, fmt):
+    return directory / f"{name}{COLUMNAR_FORMATS[fmt]}"
+
+def write_columnar(df, directory, name, fmt, id_widths=None, vocabulary=None):
+    """Write a whole table as its columnar sidecar"""
+    with ChunkedColumnarWriter(columnar_path(directory, name, fmt), fmt, id_widths, vocabulary) as writer:
+        writer.write(df)
+    return writer.path
+
+def csv_source(directory, name):
+    """Most recent of name.csv / name.csv.gz / name.csv.zst (name.csv when none exists)"""
+    return max((path for path in csv_paths(directory, name) if path.exists()),
+               key=lambda path: path.stat().st_mtime, default=directory / f"{name}.csv")
+
+def table_source(directory, name):
+    """(format, path) a table loads from: a sidecar at least as recent as the CSV, else the most recent CSV"""
+    csv_path = csv_source(directory, name)
+    for fmt in COLUMNAR_FORMATS:
+        path = columnar_path(directory, name, fmt)
+        if path.exists() and (not csv_path.exists() or path.stat().st_mtime >= csv_path.stat().st_mtime):
+            _pyarrow()
+            return fmt, path
+    return 'csv', csv_path
+
+def _parse_dates(df):
+    dates = {col: pd.to_datetime(df[col], format=DATE_FORMAT) for col in DATE_COLUMNS if col in df.columns}
+    return df.assign(**dates) if dates else df
+
+def read_table(directory, name, parse_dates=True):
+    """
+    Load a Campaign table, typed. The columnar sidecar is preferred when it
+    is at least as recent as the CSV; otherwise the most recent plain or
+    compressed CSV is parsed (dates left as text with parse_dates=False).
+    """
+    fmt, path = table_source(directory, name)
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    if fmt == 'feather':
+        return pd.read_feather(path)
+    # Compression is inferred from the suffix
+    df = pd.read_csv(path, sep=CSV_OPTIONS['sep'], encoding=CSV_OPTIONS['encoding'])
+    return _parse_dates(df) if parse_dates else df
+
+def iter_table(directory, name, chunk_rows=CHUNK_ROWS, parse_dates=True):
+    """
+    Same source and typing as read_table, as chunks of at most chunk_rows
+    rows. The index of each chunk is the row number in the table.
+    """
+    fmt, path = table_source(directory, name)
+    if fmt == 'csv':
+        with pd.read_csv(path, sep=CSV_OPTIONS['sep'], encoding=CSV_OPTIONS['encoding'],
+                         chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield _parse_dates(chunk) if parse_dates else chunk
+        return
+
+    pa = _pyarrow()
+    offset = 0
+    if fmt == 'parquet':
+        batches = pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    else:
+        # Memory-mapped: record batches are sliced without reading the file
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        batches = table.to_batches(max_chunksize=chunk_rows)
+    for batch in batches:
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
@@ -0,0 +1,73 @@
+"""
+Block-compressed output (gzip / zstd)
+Each chunk of rendered CSV is compressed as an independent gzip member or
+zstd frame in a thread pool (zlib and zstd release the GIL), so compression
+overlaps generation instead of running as a serial pass after it.
+Concatenated members / frames are plain .gz / .zst files for any reader.
+"""
+
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSION_LEVELS = {'gzip': 1, 'zstd': 3}
+
+# Rows per independently compressed block
+BLOCK_ROWS = 100000
+
+def compressor(kind):
+    """bytes -> compressed block function for a compression kind"""
+    level = COMPRESSION_LEVELS[kind]
+    if kind == 'gzip':
+        # mtime=0 keeps the output reproducible
+        return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd output needs zstandard (pip install zstandard)")
+    # Compressor objects are not thread-safe: one per block
+    return lambda data: zstandard.ZstdCompressor(level=level).compress(data)
+
+def open_compressed(path):
+    """Binary reader of a plain, .gz or .zst file (all members / frames)"""
+    if path.suffix == COMPRESSIONS['gzip']:
+        return gzip.open(path, 'rb')
+    if path.suffix == COMPRESSIONS['zstd']:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd input needs zstandard (pip install zstandard)")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+def csv_paths(directory, name):
+    """Candidate CSV paths of a table: plain, then each compressed variant"""
+    return [directory / f"{name}.csv"] + [directory / f"{name}.csv{suffix}" for suffix in COMPRESSIONS.values()]
+
+class BlockWriter:
+    """
+    Binary file fed with blocks compressed in a thread pool; blocks are
+    written in submission order with at most 2 x threads in flight
+    """
+
+    def __init__(self, path, kind, threads=None):
+        self._compress = compressor(kind)
+        self._threads = threads or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self._threads)
+        self._pending = deque()
+        self._handle = open(path, 'wb')
+
+    def submit(self, data):
+        self._pending.append(self._pool.submit(self._compress, data))
+        while len(self._pending) > 2 * self._threads:
+            self._handle.write(self._pending.popleft().result())
+
+    def close(self):
+        while self._pending:
+            self._handle.write(self._pending.popleft().result())
+        self._pool.shutdown()
+        self._handle.close()
@@ -0,0 +1,201 @@
+"""
+Single-customer regeneration
+Every shard draws from a seed stream keyed by (RANDOM_SEED, shard index),
+so any shard can be regenerated on its own, without the shards before it.
+A full run saves a shard index next to the tables: the STEP 3 inputs of
+every recipient and the id offset of every shard. generate_customer(crmid)
+regenerates the customer's shard from it and returns that customer's
+purchases, wishlist items, carts and segment row, identical to the batch
+output. The unit of work is the shard, not the customer: the first
+customer of a shard costs a regeneration of all its SHARD_SIZE customers
+(~0.4 s), and regenerated shards stay in memory, split by customer, so
+further customers of the same shard are a dictionary lookup.
+Without a shard index (no full run), the STEP 3 inputs are rebuilt from
+the seed and the sample files (a Pipeline), and the id offsets by
+generating the shards before the customer's shard once, to count their
+ids: shard i then costs i + 1 shard regenerations on first use.
+"""
+
+import functools
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from frescopa.catalog import build_catalog
+from frescopa.columnar import read_table
+from frescopa.export import to_campaign
+from frescopa.pipeline import Pipeline
+from frescopa.segmentation import INTERNAL_COLUMNS
+from frescopa.sharding import PENDING_ORDERS, SHARD_ID_COLUMNS, SHARD_SIZE, generate_shard, shard_tasks
+
+SHARD_INDEX_FILE = "shards.npz"
+
+# Regenerated shards kept in memory per index
+CACHED_SHARDS = 8
+
+class ShardIndexCollector:
+    """Per-shard id offsets, accumulated from shard tables fed in any chunking"""
+
+    def __init__(self, recipients_df, shard_size=SHARD_SIZE):
+        self.recipients = recipients_df[['crmid', *INTERNAL_COLUMNS]]
+        self.shard_size = shard_size
+        self._crmids = pd.Index(recipients_df['crmid'])
+        num_shards = -(-len(recipients_df) // shard_size)
+        self.max_ids = {id_col: np.zeros(num_shards, dtype=np.int64) for id_col in SHARD_ID_COLUMNS.values()}
+
+    def add(self, tables):
+        for name, id_col in SHARD_ID_COLUMNS.items():
+            if name in tables and len(tables[name]):
+                shards = self._crmids.get_indexer(tables[name]['customer']) // self.shard_size
+                np.maximum.at(self.max_ids[id_col], shards, tables[name][id_col].to_numpy(dtype=np.int64))
+
+    def result(self, current_date, seed, target_abandoned, id_widths):
+        """The shard index as a flat dict of arrays"""
+        index = {col: self.recipients[col].to_numpy(dtype=str) for col in ['crmid', '_internal_segment']}
+        index['_internal_acquisition'] = self.recipients['_internal_acquisition'].to_numpy(dtype='datetime64[D]')
+        index['_internal_owns_machine'] = self.recipients['_internal_owns_machine'].to_numpy(dtype=bool)
+        for id_col, max_ids in self.max_ids.items():
+            # Ids are offset by the largest id of the shards before
+            index[f'offset_{id_col}'] = np.r_[0, np.maximum.accumulate(max_ids)[:-1]].astype(np.int64)
+            index[f'width_{id_col}'] = np.int64(id_widths[id_col])
+        index.update(current_date=np.datetime64(current_date, 'us'), seed=np.int64(seed),
+                     target_abandoned=np.int64(target_abandoned), shard_size=np.int64(self.shard_size))
+        return index
+
+def save_shard_index(index, path):
+    """Write the shard index atomically (temp file + rename)"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as handle:
+        np.savez(handle, **index)
+    os.replace(tmp, path)
+    return path
+
+def _by_customer(df):
+    """df stably sorted by customer, and {crmid: (start, stop)} of each customer's rows"""
+    codes, customers = pd.factorize(df['customer'])
+    bounds = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(customers)))]
+    spans = dict(zip(customers, zip(bounds[:-1].tolist(), bounds[1:].tolist())))
+    return df.iloc[np.argsort(codes, kind='stable')], spans
+
+class CustomerIndex:
+    """
+    Regenerates single customers of a run from its recipients (with the
+    STEP 3 columns), catalog and config. offsets holds each shard's id
+    offsets ({id_col: offset} per shard); without them, they are counted
+    from the shards before, as they are needed.
+    """
+
+    def __init__(self, recipients_df, catalog, current_date, seed, target_abandoned, shard_size, id_widths,
+                 offsets=None):
+        self.recipients = recipients_df[['crmid', *INTERNAL_COLUMNS]]
+        self.rows = pd.Index(self.recipients['crmid'])
+        self.catalog = catalog
+        self.current_date = current_date
+        self.seed = seed
+        self.target_abandoned = target_abandoned
+        self.shard_size = shard_size
+        self.id_widths = id_widths
+        self.offsets = list(offsets) if offsets is not None else [{id_col: 0 for id_col in SHARD_ID_COLUMNS.values()}]
+        self._shards = OrderedDict()
+
+    def _generate(self, i):
+        """Shard i's tables with shard-local ids"""
+        task, = shard_tasks(self.recipients, self.catalog, self.current_date, self.seed,
+                            self.target_abandoned, self.shard_size, indices=[i])
+        tables = generate_shard(task)
+        del tables[PENDING_ORDERS]
+        return tables
+
+    def _keep(self, i, tables):
+        """Store shard i (shard-local ids) with its global ids, split by customer"""
+        for name, id_col in SHARD_ID_COLUMNS.items():
+            df = tables[name]
+            tables[name] = df.assign(**{id_col: df[id_col].to_numpy() + self.offsets[i][id_col]})
+        self._shards[i] = {False: {name: _by_customer(df) for name, df in tables.items()}}
+        if len(self._shards) > CACHED_SHARDS:
+            self._shards.popitem(last=False)
+
+    def _count_offsets(self, i):
+        """Id offsets up to shard i, from the largest ids of the shards before (as iter_shards does)"""
+        while len(self.offsets) <= i:
+            j = len(self.offsets) - 1
+            tables = self._generate(j)
+            self.offsets.append({id_col: self.offsets[j][id_col] + (int(tables[name][id_col].max())
+                                                                    if len(tables[name]) else 0)
+                                 for name, id_col in SHARD_ID_COLUMNS.items()})
+            self._keep(j, tables)
+
+    def shard(self, i, render=False):
+        """
+        Shard i's tables with global ids (Campaign strings with render=True),
+        as {table: (rows sorted by customer, {crmid: (start, stop)})}
+        """
+        if i not in self._shards:
+            self._count_offsets(i)
+            if i not in self._shards:
+                self._keep(i, self._generate(i))
+        self._shards.move_to_end(i)
+
+        shard = self._shards[i]
+        if render not in shard:
+            shard[render] = {name: (to_campaign(df, self.id_widths), spans) for name, (df, spans) in shard[False].items()}
+        return shard[render]
+
+    def customer(self, crmid, render=False):
+        """
+        {table: the customer's rows} for purchases, wishlist, abandoned and
+        segments; Campaign strings with render=True
+        """
+        if crmid not in self.rows:
+            raise KeyError(f"unknown crmid {crmid}")
+        row = self.rows.get_loc(crmid)
+        return {name: df.iloc[slice(*spans.get(crmid, (0, 0)))]
+                for name, (df, spans) in self.shard(row // self.shard_size, render).items()}
+
+def load_customer_index(data_dir):
+    """The CustomerIndex of a full run's shard index and products table"""
+    path = data_dir / SHARD_INDEX_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found - run a full generation first")
+    with np.load(path) as data:
+        index = {key: data[key] for key in data.files}
+
+    recipients_df = pd.DataFrame({
+        'crmid': index['crmid'],
+        '_internal_segment': index['_internal_segment'],
+        '_internal_acquisition': index['_internal_acquisition'].astype('datetime64[ns]'),
+        '_internal_owns_machine': index['_internal_owns_machine'],
+    })
+    id_cols = SHARD_ID_COLUMNS.values()
+    offsets = [{id_col: int(index[f'offset_{id_col}'][i]) for id_col in id_cols}
+               for i in range(len(index['offset_orderref']))]
+    return CustomerIndex(recipients_df, build_catalog(read_table(data_dir, 'products')),
+                         pd.Timestamp(index['current_date'][()]).to_pydatetime(), int(index['seed']),
+                         int(index['target_abandoned']), int(index['shard_size']),
+                         {id_col: int(index[f'width_{id_col}']) for id_col in id_cols}, offsets)
+
+def rebuild_customer_index(pipeline):
+    """The CustomerIndex of a Pipeline's run, rebuilt from the seed (no files needed)"""
+    return CustomerIndex(pipeline.recipients, pipeline.catalog, pipeline.current_date, pipeline.seed,
+                         pipeline.target_abandoned, pipeline.shard_size, pipeline.id_widths)
+
+@functools.lru_cache(maxsize=None)
+def customer_index(data_dir=Path("data-augmented"), **config):
+    """
+    The CustomerIndex of a data directory, loaded once per process; without
+    its shard index, rebuilt from the seed with Pipeline(**config)
+    """
+    if (data_dir / SHARD_INDEX_FILE).exists():
+        return load_customer_index(data_dir)
+    return rebuild_customer_index(Pipeline(**config))
+
+def generate_customer(crmid, data_dir=Path("data-augmented"), render=False, **config):
+    """
+    One customer's purchases, wishlist items, carts and segment row, as in
+    the full run (config: the Pipeline settings when data_dir has no shard
+    index, e.g. scale=10)
+    """
+    return customer_index(data_dir, **config).customer(crmid, render)
@@ -0,0 +1,144 @@
+"""
+SQLite export
+Bulk-loads the Campaign tables into a local SQLite database, a stand-in
+for the Campaign database to run (and time) the demo queries at scale.
+Tables are streamed chunk by chunk and inserted with batched executemany
+inside one transaction per table, with journaling relaxed for the load;
+indexes are built once the rows are in. Dates are stored as ISO 8601
+text so they sort and compare in SQL; ids keep their Campaign form.
+"""
+
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from frescopa.catalog import CAPSULE, MACHINE
+from frescopa.columnar import CHUNK_ROWS, TEXT_DATES, iter_table
+
+DB_FILE = "frescopa.db"
+
+# Rows per executemany call
+BATCH_ROWS = 50000
+
+# Column definitions, in Campaign column order
+TABLE_SCHEMAS = {
+    'brands': "label TEXT, name TEXT PRIMARY KEY",
+    'products': ("code TEXT PRIMARY KEY, priceref REAL, category INTEGER, description TEXT, "
+                 "brand TEXT REFERENCES brands(name), imageurl TEXT"),
+    'recipients': ("crmid TEXT PRIMARY KEY, firstname TEXT, lastname TEXT, email TEXT, "
+                   "brand TEXT REFERENCES brands(name), birthdate TEXT, folder TEXT"),
+    'purchases': ("date TEXT, orderref TEXT, orderline INTEGER, product TEXT REFERENCES products(code), "
+                  "price REAL, quantity INTEGER, customer TEXT REFERENCES recipients(crmid), "
+                  "PRIMARY KEY (orderref, orderline)"),
+    'wishlist': ("wishListId TEXT PRIMARY KEY, wishListName INTEGER, lastUpdate TEXT, creationDate TEXT, "
+                 "product TEXT REFERENCES products(code), customer TEXT REFERENCES recipients(crmid)"),
+    'abandoned': ("date TEXT, cartid TEXT, cartnum INTEGER, product TEXT REFERENCES products(code), "
+                  "quantity INTEGER, tosend INTEGER, customer TEXT REFERENCES recipients(crmid), "
+                  "PRIMARY KEY (cartid, cartnum)"),
+    'segments': ("customer TEXT PRIMARY KEY REFERENCES recipients(crmid), churnprop INTEGER, churndate TEXT, "
+                 "nps INTEGER, npsdate TEXT, reactscore INTEGER, reactdate TEXT, vip INTEGER, vipdate TEXT"),
+}
+
+# Secondary indexes, built after the load (orderref leads the purchases
+# primary key, segments.customer is its primary key)
+INDEXES = [
+    ('purchases', 'customer'), ('purchases', 'product'), ('purchases', 'date'),
+    ('wishlist', 'customer'), ('wishlist', 'product'),
+    ('abandoned', 'customer'), ('abandoned', 'product'), ('abandoned', 'date'),
+]
+
+# ISO precision of the dates that are not minute timestamps
+DATE_UNITS = {'birthdate': 'D', **{col: 's' for col in TEXT_DATES if col != 'birthdate'}}
+
+# Bulk-load pragmas: WAL, no fsync, temp b-trees in memory, 64 MB page cache
+LOAD_PRAGMAS = ["journal_mode = WAL", "synchronous = OFF", "temp_store = MEMORY", "cache_size = -65536"]
+
+# The verify_data.py demo queries: (title, use case, audience SQL)
+DEMO_QUERIES = {
+    'high_value': ("High-value customers (Gold/Platinum VIP)", "Premium capsule bundle offers",
+                   "SELECT customer FROM segments WHERE vip >= 3"),
+    'win_back': ("Very high churn risk (no purchase >6 months)", "Win-back campaign with 20% discount",
+                 "SELECT customer FROM segments WHERE churnprop = 3"),
+    'cart_recovery': ("Customers with abandoned carts (reminder not sent)", "24h automated reminder emails",
+                      "SELECT DISTINCT customer FROM abandoned WHERE tosend = 0"),
+    'wishlist_alert': ("Customers with machines in wishlist", "Machine promotion alerts",
+                       f"""SELECT DISTINCT w.customer FROM wishlist w
+                           JOIN products p ON p.code = w.product WHERE p.category = {MACHINE}"""),
+    'replenishment': ("Machine owners without capsule purchase in last 60 days", "Capsule replenishment reminder",
+                      f"""SELECT p.customer FROM purchases p JOIN products c ON c.code = p.product
+                          GROUP BY p.customer HAVING MAX(c.category = {MACHINE})
+                             AND IFNULL(MAX(CASE WHEN c.category = {CAPSULE} THEN p.date END), '') < '2025-11-15'"""),
+    'vip': ("Gold/Platinum VIP customers", "Exclusive VIP offers",
+            """SELECT r.crmid, r.email, r.brand FROM segments s
+               JOIN recipients r ON r.crmid = s.customer WHERE s.vip >= 3"""),
+}
+
+def _column_values(name, values):
+    """A chunk column as a list of SQLite values (ISO dates, None for missing)"""
+    if name in TEXT_DATES and not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, format=TEXT_DATES[name])
+    if pd.api.types.is_datetime64_any_dtype(values):
+        dates = np.asarray(values, dtype='datetime64[s]')
+        text = np.datetime_as_string(dates, unit=DATE_UNITS.get(name, 'm')).astype(object)
+        text[np.isnat(dates)] = None
+        return text.tolist()
+    values = values.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+def _insert(connection, name, chunk):
+    columns = [_column_values(col, chunk[col]) for col in chunk.columns]
+    placeholders = ", ".join("?" * len(columns))
+    rows = list(zip(*columns))
+    for start in range(0, len(rows), BATCH_ROWS):
+        connection.executemany(f"INSERT INTO {name} VALUES ({placeholders})", rows[start:start + BATCH_ROWS])
+
+def export_sqlite(data_dir, db_path, chunk_rows=CHUNK_ROWS):
+    """
+    (Re)build the database from the tables in data_dir, atomically.
+    Returns {table: (rows, seconds)}, with the index build under 'indexes'.
+    """
+    tmp = db_path.with_name(db_path.name + '.tmp')
+    for path in [tmp, tmp.with_name(tmp.name + '-wal'), tmp.with_name(tmp.name + '-shm')]:
+        if path.exists():
+            path.unlink()
+
+    timings = {}
+    connection = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            connection.execute(f"PRAGMA {pragma}")
+        for name, columns in TABLE_SCHEMAS.items():
+            connection.execute(f"CREATE TABLE {name} ({columns})")
+
+        for name in TABLE_SCHEMAS:
+            start, rows = time.perf_counter(), 0
+            connection.execute("BEGIN")
+            for chunk in iter_table(data_dir, name, chunk_rows):
+                _insert(connection, name, chunk)
+                rows += len(chunk)
+            connection.execute("COMMIT")
+            timings[name] = (rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        connection.execute("BEGIN")
+        for table, column in INDEXES:
+            connection.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+        connection.execute("COMMIT")
+        # Planner statistics, then back to durable settings for later use
+        connection.execute("ANALYZE")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        timings['indexes'] = (len(INDEXES), time.perf_counter() - start)
+    finally:
+        connection.close()
+    os.replace(tmp, db_path)
+    return timings
+
+def run_query(connection, name):
+    """(audience size, seconds) of a demo query"""
+    start = time.perf_counter()
+    count, = connection.execute(f"SELECT COUNT(*) FROM ({DEMO_QUERIES[name][2]})").fetchone()
+    return count, time.perf_counter() - start
@@ -0,0 +1,255 @@
+"""
+Incremental daily deltas
+A full run persists per-customer state (internal segment, acquisition,
+machine ownership, last order, order count, spend, scores, next scheduled
+order and the orders left of its quota) and the id counters. A delta loads
+that state, advances the clock N >= 1 days and emits only the new orders,
+abandoned carts and wishlist items plus the segment rows whose scores
+changed, then saves the advanced state.
+Nothing is rescanned: segments are rescored from the stored aggregates.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from frescopa.abandoned import ABANDONED_COLUMNS, ACTIVE_SEGMENTS, CART_MAX_AGE, CART_SIZES, build_carts
+from frescopa.catalog import ACCESSORY, MACHINE
+from frescopa.ids import id_width
+from frescopa.purchases import (PURCHASE_COLUMNS, REORDER_INTERVALS, _segment_lookup,
+                                apply_seasonality, build_orders, sample_without_replacement, to_days)
+from frescopa.segments import SEGMENT_COLUMNS, customer_aggregates, score_segments
+from frescopa.sharding import SHARD_ID_COLUMNS
+from frescopa.timestamps import add_times
+from frescopa.wishlist import UPDATE_DAYS, WISHLIST_COLUMNS, WISHLIST_ITEMS, WISHLIST_NAMES
+
+STATE_FILE = "state.npz"
+
+# Daily wishlist rate (per customer)
+DAILY_WISH_RATE = 0.001
+
+NEVER = np.iinfo(np.int64).max
+SCORE_COLUMNS = ['churnprop', 'nps', 'reactscore', 'vip']
+NPS_BANDS = [5, 10]            # order counts where the NPS choices change
+
+# ============================================================================
+# STATE
+# ============================================================================
+
+class StateCollector:
+    """Accumulates per-customer aggregates, scores and last ids from generated tables"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.aggregates = []
+        self.scores = []
+        self.pending = []
+        self.last_ids = {name: 0 for name in SHARD_ID_COLUMNS}
+
+    def add_pending(self, pending_df):
+        """Orders still due after the history (PENDING_COLUMNS), from the purchase engine"""
+        self.pending.append(pending_df)
+
+    def add(self, tables):
+        purchases_df = tables['purchases']
+        aggregates = customer_aggregates(purchases_df)
+        machine_buyers = pd.unique(purchases_df['customer'][purchases_df['product'].isin(self.catalog.machines)])
+        self.aggregates.append(aggregates.assign(machine=aggregates.index.isin(machine_buyers)))
+        self.scores.append(tables['segments'].set_index('customer')[SCORE_COLUMNS])
+        for name, id_col in SHARD_ID_COLUMNS.items():
+            if len(tables[name]) > 0:
+                self.last_ids[name] = max(self.last_ids[name], int(tables[name][id_col].max()))
+
+    def state(self, recipients_df, current_date, id_widths, seed, target_abandoned):
+        """State of a full run: each customer's next order and orders left continue its quota"""
+        crmids = recipients_df['crmid'].to_numpy(dtype=object)
+        aggregates = pd.concat(self.aggregates).reindex(crmids)
+        scores = pd.concat(self.scores).reindex(crmids)
+        pending = pd.concat(self.pending).set_index('customer').reindex(crmids)
+        due = pending['remaining'].notna().to_numpy()
+
+        state = {
+            'crmid': crmids.astype(str),
+            'segment': recipients_df['_internal_segment'].to_numpy(dtype=str),
+            'acquisition': to_days(recipients_df['_internal_acquisition']),
+            'owns_machine': (recipients_df['_internal_owns_machine'].to_numpy(dtype=bool)
+                             | aggregates['machine'].fillna(False).to_numpy(dtype=bool)),
+            'last_purchase': aggregates['last_purchase'].to_numpy(dtype='datetime64[m]'),
+            'orders': aggregates['orders'].fillna(0).to_numpy(dtype=np.int64),
+            'spent': aggregates['spent'].fillna(0).to_numpy(dtype=float),
+            **{col: scores[col].to_numpy(dtype=np.int64) for col in SCORE_COLUMNS},
+            'next_order': np.where(due, pending['next_order'].fillna(0).to_numpy(dtype=np.int64), NEVER),
+            'remaining_orders': pending['remaining'].fillna(0).to_numpy(dtype=np.int64),
+            'current_day': np.int64(to_days([current_date])[0]),
+            'seed': np.int64(seed),
+            'target_abandoned': np.int64(target_abandoned),
+        }
+        for name, id_col in SHARD_ID_COLUMNS.items():
+            state[f'last_{id_col}'] = np.int64(self.last_ids[name])
+            state[f'width_{id_col}'] = np.int64(id_widths[id_col])
+        return state
+
+def save_state(state, path):
+    """Write the state atomically (temp file + rename)"""
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as handle:
+        np.savez(handle, **state)
+    os.replace(tmp, path)
+
+def load_state(path):
+    if not path.exists():
+        raise FileNotFoundError(f"{path} not found - run a full generation first")
+    with np.load(path) as data:
+        state = {key: data[key] for key in data.files}
+    if 'remaining_orders' not in state or 'target_abandoned' not in state:
+        raise ValueError(f"{path} was saved by an older version - run a full generation first")
+    return state
+
+def next_order_days(segments, last_days, rng):
+    """Day of the next order after last_days (segment reorder interval + seasonality)"""
+    interval = rng.integers(_segment_lookup(segments, REORDER_INTERVALS, 0),
+                            _segment_lookup(segments, REORDER_INTERVALS, 1) + 1)
+    return apply_seasonality(last_days + interval, rng)
+
+# ============================================================================
+# DELTA
+# ============================================================================
+
+def _window_days(rng, start_day, days, n):
+    """n random days in (start_day, start_day + days]"""
+    return start_day + rng.integers(1, days + 1, n)
+
+def _delta_orders(state, catalog, end_day, rng):
+    """
+    Every scheduled order up to end_day. A customer is rescheduled after
+    each order until the quota left over from the full run is used up.
+    """
+    next_order = state['next_order'].copy()
+    remaining = state['remaining_orders'].copy()
+    customers, days = [], []
+    due = np.flatnonzero(next_order <= end_day)
+    while len(due) > 0:
+        customers.append(due)
+        days.append(next_order[due])
+        remaining[due] -= 1
+        next_order[due] = np.where(remaining[due] > 0,
+                                   next_order_days(state['segment'][due], next_order[due], rng), NEVER)
+        due = due[next_order[due] <= end_day]
+
+    customer_idx = np.concatenate(customers) if customers else np.empty(0, dtype=np.int64)
+    order_days = np.concatenate(days) if days else np.empty(0, dtype=np.int64)
+    order = np.lexsort((customer_idx, order_days))
+    customer_idx, order_days = customer_idx[order], order_days[order]
+
+    # A customer's first order ever may include a machine
+    first_order = np.zeros(len(customer_idx), dtype=bool)
+    _, first = np.unique(customer_idx, return_index=True)
+    first_order[first] = state['orders'][customer_idx[first]] == 0
+
+    purchases_df = build_orders(state['crmid'].astype(object), state['owns_machine'], customer_idx,
+                                order_days, first_order, catalog, rng, int(state['last_orderref']) + 1)
+    return purchases_df, next_order, remaining
+
+def _delta_carts(state, catalog, start_day, days, rng):
+    """Carts at the full run's volume: target_abandoned lines over the CART_MAX_AGE window"""
+    active = np.flatnonzero(np.isin(state['segment'], ACTIVE_SEGMENTS))
+    daily_carts = int(state['target_abandoned']) / CART_MAX_AGE / np.mean(CART_SIZES)
+    carts = rng.poisson(daily_carts / max(len(active), 1) * days, len(active))
+    owners = np.repeat(active, carts)
+    cart_days = _window_days(rng, start_day, days, len(owners))
+    order = np.lexsort((owners, cart_days))
+    return build_carts(state['crmid'].astype(object)[owners[order]], cart_days[order], catalog, rng,
+                       int(state['last_cartid']) + 1)
+
+def _delta_wishlist(state, catalog, start_day, days, rng):
+    available = np.r_[catalog.positions(MACHINE), catalog.positions(ACCESSORY)]
+    end_day = start_day + days
+    wishers = np.flatnonzero(rng.random(len(state['crmid'])) < DAILY_WISH_RATE * days)
+    num_items = WISHLIST_ITEMS[rng.integers(0, len(WISHLIST_ITEMS), len(wishers))]
+    picks = sample_without_replacement(rng, len(available), num_items)
+    customer_idx, slot = np.nonzero(picks >= 0)
+    n_items = len(customer_idx)
+
+    creation_day = _window_days(rng, start_day, days, len(wishers))[customer_idx]
+    update_day = np.minimum(creation_day + rng.integers(UPDATE_DAYS[0], UPDATE_DAYS[1] + 1, n_items), end_day)
+    creation = add_times(creation_day.astype('datetime64[D]'), rng)
+    last_update = np.maximum(add_times(update_day.astype('datetime64[D]'), rng), creation)
+
+    return pd.DataFrame({
+        'wishListId': int(state['last_wishListId']) + 1 + np.arange(n_items),
+        'wishListName': rng.integers(WISHLIST_NAMES[0], WISHLIST_NAMES[1] + 1, n_items),
+        'lastUpdate': last_update,
+        'creationDate': creation,
+        'product': catalog.codes[available[picks[customer_idx, slot]]],
+        'customer': state['crmid'].astype(object)[wishers[customer_idx]],
+    }, columns=WISHLIST_COLUMNS)
+
+def _rescore(state, new_state, end_date, rng):
+    """Segment rows of customers whose scores changed, from the stored aggregates"""
+    crmids = new_state['crmid'].astype(object)
+    has = new_state['orders'] > 0
+    aggregates = pd.DataFrame({
+        'last_purchase': new_state['last_purchase'][has].astype('datetime64[ns]'),
+        'orders': new_state['orders'][has],
+        'spent': new_state['spent'][has],
+    }, index=pd.Index(crmids[has], name='customer'))
+    segments_df = score_segments(crmids, aggregates, end_date, rng)
+
+    # NPS only moves when the customer changes order-count band
+    band_changed = np.digitize(new_state['orders'], NPS_BANDS) != np.digitize(state['orders'], NPS_BANDS)
+    segments_df['nps'] = np.where(band_changed, segments_df['nps'].to_numpy(), state['nps'])
+
+    changed = np.zeros(len(crmids), dtype=bool)
+    for col in SCORE_COLUMNS:
+        new_state[col] = segments_df[col].to_numpy(dtype=np.int64)
+        changed |= new_state[col] != state[col]
+    return segments_df[changed].reset_index(drop=True)[SEGMENT_COLUMNS]
+
+def generate_delta(state, catalog, days):
+    """
+    Advance the state by `days` days.
+    Returns (tables, new_state) where tables holds the delta purchases,
+    wishlist, abandoned and changed segment rows.
+    """
+    if days < 1:
+        raise ValueError(f"a delta advances the state by at least 1 day, not {days}")
+    start_day = int(state['current_day'])
+    end_day = start_day + days
+    end_date = pd.Timestamp(np.datetime64(end_day, 'D'))
+    rng = np.random.default_rng([int(state['seed']), start_day])
+
+    purchases_df, next_order, remaining = _delta_orders(state, catalog, end_day, rng)
+    abandoned_df = _delta_carts(state, catalog, start_day, days, rng)
+    wishlist_df = _delta_wishlist(state, catalog, start_day, days, rng)
+
+    # Fold the new orders into the per-customer aggregates
+    new_state = dict(state)
+    index = pd.Index(state['crmid'].astype(object))
+    delta = customer_aggregates(purchases_df).reindex(index)
+    bought = delta['orders'].notna().to_numpy()
+    new_state['orders'] = state['orders'] + delta['orders'].fillna(0).to_numpy(dtype=np.int64)
+    new_state['spent'] = state['spent'] + delta['spent'].fillna(0).to_numpy(dtype=float)
+    new_state['last_purchase'] = np.where(bought, delta['last_purchase'].to_numpy(dtype='datetime64[m]'),
+                                          state['last_purchase'])
+    machine_buyers = purchases_df['customer'][purchases_df['product'].isin(catalog.machines)]
+    new_state['owns_machine'] = state['owns_machine'] | index.isin(machine_buyers)
+    new_state['next_order'] = next_order
+    new_state['remaining_orders'] = remaining
+    new_state['current_day'] = np.int64(end_day)
+
+    for name, id_col in SHARD_ID_COLUMNS.items():
+        df = {'purchases': purchases_df, 'wishlist': wishlist_df, 'abandoned': abandoned_df}[name]
+        if len(df) > 0:
+            new_state[f'last_{id_col}'] = np.int64(df[id_col].max())
+        new_state[f'width_{id_col}'] = np.int64(max(int(state[f'width_{id_col}']),
+                                                    id_width(new_state[f'last_{id_col}'])))
+
+    segments_df = _rescore(state, new_state, end_date, rng)
+
+    tables = {'purchases': purchases_df[PURCHASE_COLUMNS], 'wishlist': wishlist_df,
+              'abandoned': abandoned_df[ABANDONED_COLUMNS], 'segments': segments_df}
+    return tables, new_state
+
+def state_id_widths(state):
+    return {id_col: int(state[f'width_{id_col}']) for id_col in SHARD_ID_COLUMNS.values()}
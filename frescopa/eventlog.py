@@ -0,0 +1,108 @@
+"""
+Chronological event log
+Merges purchases, wishlist additions and abandoned carts into one event
+log in timestamp order, as the NDJSON events of the replay server. The
+tables are ordered by customer, so the log is built by external sort in
+bounded memory: each table is read RUN_ROWS rows at a time, and each chunk
+is sorted by time into a run file; the runs are then k-way merged with a
+heap, at most MERGE_FANIN at a time (extra passes when there are more).
+Memory depends on RUN_ROWS and MERGE_FANIN, not on the table sizes.
+Run lines start with a fixed-width sort key (event minute, table, row), so
+the merge compares plain bytes and ties keep table and row order: the log
+is identical to the replay server's buffer.
+"""
+
+import heapq
+import itertools
+import os
+import tempfile
+from collections import deque
+
+import numpy as np
+
+from frescopa.columnar import iter_table
+from frescopa.replay import EVENT_TABLES, EventEncoder
+from frescopa.schema import render
+from frescopa.timestamps import parse_timestamps
+
+EVENT_LOG_FILE = "events.ndjson"
+
+# Rows sorted in memory per run, and runs merged per pass
+RUN_ROWS = 1 << 18
+MERGE_FANIN = 64
+
+# File buffer of each run read / log written during a merge
+IO_BUFFER = 1 << 20
+
+# Sort key digits: event minute (since 1970), table, row number in the table
+KEY_DIGITS = (10, 1, 12)
+KEY_WIDTH = sum(KEY_DIGITS)
+
+def _digits(values, width):
+    """Zero-padded decimal digits of non-negative ints, width bytes per value"""
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (np.asarray(values, dtype=np.int64)[:, None] // powers % 10 + ord('0')).astype(np.uint8)
+
+def _write_run(path, chunk, event_type, time_col, table, first_row):
+    """Write one chunk of a table as a run: keyed NDJSON lines in key order"""
+    chunk = render(chunk)
+    minutes = parse_timestamps(chunk[time_col].to_numpy(dtype=object)).astype(np.int64)
+    order = np.argsort(minutes, kind='stable')
+    encoder = EventEncoder(chunk, event_type)
+
+    out = np.zeros((len(chunk), KEY_WIDTH + encoder.width), dtype=np.uint8)
+    mask = np.zeros(out.shape, dtype=bool)
+    out[:, :KEY_WIDTH] = np.hstack([_digits(minutes[order], KEY_DIGITS[0]),
+                                    _digits(np.full(len(chunk), table), KEY_DIGITS[1]),
+                                    _digits(first_row + order, KEY_DIGITS[2])])
+    mask[:, :KEY_WIDTH] = True
+    encoder.fill(order, out[:, KEY_WIDTH:], mask[:, KEY_WIDTH:], np.arange(len(chunk)))
+    with open(path, 'wb') as handle:
+        handle.write(out[mask].tobytes())
+    return path
+
+def _merge(runs, path, keep_keys):
+    """k-way merge of sorted run files into path, keys stripped unless keep_keys"""
+    handles = [open(run, 'rb', buffering=IO_BUFFER) for run in runs]
+    try:
+        with open(path, 'wb', buffering=IO_BUFFER) as out:
+            lines = heapq.merge(*handles)
+            out.writelines(lines if keep_keys else (line[KEY_WIDTH:] for line in lines))
+    finally:
+        for handle in handles:
+            handle.close()
+    return path
+
+def write_event_log(data_dir, path=None, tables=tuple(EVENT_TABLES), run_rows=RUN_ROWS,
+                    fanin=MERGE_FANIN, work_dir=None):
+    """
+    Write the chronological event log of data_dir (default: events.ndjson
+    in it) atomically. Runs go to a temporary directory in work_dir
+    (default: next to the log). Returns {table: events}.
+    """
+    if fanin < 2:
+        raise ValueError("a merge pass needs at least 2 runs")
+    path = path or data_dir / EVENT_LOG_FILE
+    with tempfile.TemporaryDirectory(prefix='runs-', dir=work_dir or path.parent) as work:
+        names = (os.path.join(work, f"run{i:06d}") for i in itertools.count())
+        runs, counts = deque(), {}
+
+        # Pass 0: time-sorted runs of RUN_ROWS rows
+        for table, name in enumerate(tables):
+            event_type, time_col = EVENT_TABLES[name]
+            counts[name] = 0
+            for chunk in iter_table(data_dir, name, run_rows, parse_dates=False):
+                runs.append(_write_run(next(names), chunk, event_type, time_col, table, counts[name]))
+                counts[name] += len(chunk)
+
+        # Intermediate passes while more than fanin runs are left
+        while len(runs) > fanin:
+            group = [runs.popleft() for _ in range(fanin)]
+            runs.append(_merge(group, next(names), keep_keys=True))
+            for run in group:
+                os.remove(run)
+
+        tmp = path.with_name(path.name + '.tmp')
+        _merge(runs, tmp, keep_keys=False)
+        os.replace(tmp, path)
+    return counts
@@ -0,0 +1,35 @@
+"""
+Campaign export rendering
+Tables are generated with typed columns (datetime64 dates, integer ids) and
+rendered to the Adobe Campaign string formats only when written
+"""
+
+import pandas as pd
+
+from frescopa.ids import ID_PREFIXES, format_ids, id_width
+from frescopa.timestamps import format_timestamps
+
+DATE_COLUMNS = ['date', 'lastUpdate', 'creationDate']
+
+CSV_OPTIONS = {'sep': ';', 'index': False, 'encoding': 'latin-1'}
+
+def table_id_widths(df):
+    """Id width per id column, from the largest id in the table"""
+    return {col: id_width(df[col].max() if len(df) else None)
+            for col in ID_PREFIXES if col in df.columns}
+
+def to_campaign(df, id_widths=None):
+    """Copy of df with dates as dd/mm/yyyy HH:MM and ids as PREFIX000123"""
+    if id_widths is None:
+        id_widths = table_id_widths(df)
+    rendered = {}
+    for col in df.columns:
+        if col in DATE_COLUMNS and pd.api.types.is_datetime64_any_dtype(df[col]):
+            rendered[col] = format_timestamps(df[col])
+        elif col in ID_PREFIXES and pd.api.types.is_integer_dtype(df[col]):
+            rendered[col] = format_ids(ID_PREFIXES[col], df[col], id_widths[col])
+    return df.assign(**rendered) if rendered else df
+
+def write_campaign_csv(df, path, id_widths=None):
+    """Write a table in the Campaign import format (';' separated, latin-1)"""
+    to_campaign(df, id_widths).to_csv(path, **CSV_OPTIONS)
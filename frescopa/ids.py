@@ -0,0 +1,37 @@
+"""
+Sequential business IDs (ORD / WISH / CART)
+Engines work with integer ids; they are rendered with their prefix only on
+export. All ids of a table share one width, at least 6 digits, widened as
+needed so ids past 999,999 stay fixed-width and sortable.
+"""
+
+import numpy as np
+import pandas as pd
+
+ID_PREFIXES = {
+    'orderref': 'ORD',
+    'wishListId': 'WISH',
+    'cartid': 'CART',
+}
+
+MIN_ID_DIGITS = 6
+
+def id_width(max_id):
+    """Digits needed to render ids up to max_id"""
+    if max_id is None or pd.isna(max_id):
+        return MIN_ID_DIGITS
+    return max(MIN_ID_DIGITS, len(str(int(max_id))))
+
+def format_ids(prefix, ids, width=MIN_ID_DIGITS):
+    """Render integer ids as PREFIX + zero-padded digits in bulk"""
+    ids = np.asarray(ids, dtype=np.int64)
+    head = np.frombuffer(prefix.encode('ascii'), dtype=np.uint8)
+    chars = np.empty((len(ids), len(head) + width), dtype=np.uint8)
+    chars[:, :len(head)] = head
+    for digit in range(width):
+        chars[:, len(head) + width - 1 - digit] = ord('0') + (ids // 10 ** digit) % 10
+    return chars.view(f'S{chars.shape[1]}').ravel().astype(str).astype(object)
+
+def parse_ids(values, prefix):
+    """PREFIX000123 strings back to int64 ids"""
+    return pd.Series(values).str.slice(len(prefix)).astype(np.int64).to_numpy()
@@ -0,0 +1,329 @@
+"""
+Referential integrity engine
+Checks the Campaign relationships (foreign keys, 1:1 segments) and the
+table keys (orderref + orderline, cartid + cartnum, wishListId) on
+integer-encoded keys: FK values are looked up in a hash index of the
+reference column, business ids are parsed to integers. Tables are fed in
+any number of chunks (in-memory shards or chunks streamed from disk), so
+memory stays bounded: uniqueness keys are spilled to hash partitions on
+disk once they outgrow SPILL_KEYS. Every violation comes with its rows.
+"""
+
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from frescopa.columnar import CHUNK_ROWS, iter_table
+from frescopa.ids import ID_PREFIXES, MIN_ID_DIGITS, format_ids, id_width, parse_ids
+from frescopa.schema import KEY_PREFIXES
+
+# (table, column, reference table, reference column)
+FOREIGN_KEYS = [
+    ('products', 'brand', 'brands', 'name'),
+    ('recipients', 'brand', 'brands', 'name'),
+    ('purchases', 'customer', 'recipients', 'crmid'),
+    ('purchases', 'product', 'products', 'code'),
+    ('wishlist', 'customer', 'recipients', 'crmid'),
+    ('wishlist', 'product', 'products', 'code'),
+    ('abandoned', 'customer', 'recipients', 'crmid'),
+    ('abandoned', 'product', 'products', 'code'),
+    ('segments', 'customer', 'recipients', 'crmid'),
+]
+
+# Columns that must be unique together
+UNIQUE_KEYS = {
+    'purchases': ['orderref', 'orderline'],
+    'abandoned': ['cartid', 'cartnum'],
+    'wishlist': ['wishListId'],
+    'segments': ['customer'],
+}
+
+# (table, column) that must reference every row of its reference table
+COVERING_KEYS = [('segments', 'customer')]
+
+# Tables a directory check streams, references first
+CHECKED_TABLES = ['products', 'recipients', 'purchases', 'wishlist', 'abandoned', 'segments']
+
+# Line numbers are packed below the id: key = id * LINE_BASE + line
+LINE_BASE = 1 << 20
+
+# Buffered uniqueness keys per table before spilling to disk
+SPILL_KEYS = 5000000
+PARTITIONS = 64
+
+# Violating rows kept per check (counts are always exact)
+MAX_REPORTED_ROWS = 1000
+
+@dataclass
+class Violation:
+    """A failed check: how many rows violate it and (up to a limit) which ones"""
+    check: str
+    count: int
+    rows: pd.DataFrame
+
+def fk_label(table, column, reference, reference_column):
+    return f"{table}.{column} → {reference}.{reference_column}"
+
+def unique_label(table, columns):
+    return f"{table} ({', '.join(columns)}) unique"
+
+def covering_label(table, column, reference, reference_column):
+    return f"{reference}.{reference_column} covered by {table}.{column}"
+
+def _encode(values, encode_unique):
+    """
+    Apply an int encoding to the distinct values only (factorize is a C hash
+    pass, string conversions are not); missing values encode to -1
+    """
+    codes, uniques = pd.factorize(values)
+    return np.append(np.asarray(encode_unique(uniques), dtype=np.int64), -1)[codes]
+
+def _parse_ids(uniques, prefix):
+    """PREFIX000123 strings to int64, -1 for malformed ones"""
+    text = pd.Series(uniques, dtype=object).astype(str)
+    digits = text.str.slice(len(prefix))
+    valid = (text.str.startswith(prefix) & digits.str.fullmatch(r'\d+')).to_numpy(dtype=bool)
+    ids = np.full(len(text), -1, dtype=np.int64)
+    ids[valid] = parse_ids(digits[valid].radd(prefix), prefix)
+    return ids
+
+def _integer_ids(column, values):
+    """Business ids as int64, whether typed or rendered as PREFIX000123 (-1: malformed / missing)"""
+    if pd.api.types.is_integer_dtype(values):
+        return np.asarray(values, dtype=np.int64)
+    return _encode(values, lambda uniques: _parse_ids(uniques, ID_PREFIXES[column]))
+
+class _DuplicateFinder:
+    """Duplicated int64 keys among all keys added, with their row numbers"""
+
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self._keys = []
+        self._rows = []
+        self._buffered = 0
+        self._partitions = None
+
+    def add(self, keys, rows):
+        self._keys.append(keys)
+        self._rows.append(rows)
+        self._buffered += len(keys)
+        if self._buffered >= SPILL_KEYS:
+            self._spill()
+
+    def _spill(self):
+        if self._partitions is None:
+            self._partitions = tempfile.mkdtemp(prefix='integrity-', dir=self.spill_dir)
+        keys, rows = self._take()
+        part = keys % PARTITIONS
+        order = np.argsort(part, kind='stable')
+        bounds = np.searchsorted(part[order], np.arange(PARTITIONS + 1))
+        pairs = np.column_stack((keys, rows))[order]
+        for index in range(PARTITIONS):
+            if bounds[index] < bounds[index + 1]:
+                with open(os.path.join(self._partitions, f"{index}.bin"), 'ab') as handle:
+                    pairs[bounds[index]:bounds[index + 1]].tofile(handle)
+
+    def _take(self):
+        keys = np.concatenate(self._keys) if self._keys else np.empty(0, np.int64)
+        rows = np.concatenate(self._rows) if self._rows else np.empty(0, np.int64)
+        self._keys, self._rows, self._buffered = [], [], 0
+        return keys, rows
+
+    @staticmethod
+    def _duplicates(keys, rows):
+        order = np.argsort(keys, kind='stable')
+        keys, rows = keys[order], rows[order]
+        same = keys[1:] == keys[:-1]
+        duplicated = np.zeros(len(keys), dtype=bool)
+        duplicated[1:] |= same
+        duplicated[:-1] |= same
+        return keys[duplicated], rows[duplicated]
+
+    def finish(self):
+        """(keys, rows) of every row whose key occurs more than once"""
+        if self._partitions is None:
+            keys, rows = self._duplicates(*self._take())
+        else:
+            self._spill()
+            found = []
+            try:
+                for index in range(PARTITIONS):
+                    path = os.path.join(self._partitions, f"{index}.bin")
+                    if os.path.exists(path):
+                        pairs = np.fromfile(path, dtype=np.int64).reshape(-1, 2)
+                        found.append(self._duplicates(pairs[:, 0], pairs[:, 1]))
+            finally:
+                shutil.rmtree(self._partitions, ignore_errors=True)
+            keys = np.concatenate([keys for keys, _ in found]) if found else np.empty(0, np.int64)
+            rows = np.concatenate([rows for _, rows in found]) if found else np.empty(0, np.int64)
+        order = np.lexsort((rows, keys))
+        return keys[order], rows[order]
+
+class IntegrityChecker:
+    """
+    Feed tables chunk by chunk with check(), then finish() for the
+    violations. references maps a reference table name to its key values
+    (e.g. {'brands': names, 'recipients': crmids, 'products': codes}).
+    """
+
+    def __init__(self, references, max_rows=MAX_REPORTED_ROWS, spill_dir=None):
+        self.indexes = {name: pd.Index(np.asarray(values)).unique() for name, values in references.items()}
+        self.max_rows = max_rows
+        self.spill_dir = spill_dir
+        self.rows_checked = {}
+        self._fk_count = {fk: 0 for fk in FOREIGN_KEYS}
+        self._fk_rows = {fk: [] for fk in FOREIGN_KEYS}
+        self._covered = {(table, column): np.zeros(len(self.indexes[reference]), dtype=bool)
+                         for table, column, reference, _ in FOREIGN_KEYS
+                         if (table, column) in COVERING_KEYS and reference in self.indexes}
+        self._finders = {}
+        self._malformed = {}
+        self._id_widths = {}
+
+    def _keep(self, kept, rows):
+        """Append violating rows to a list while under max_rows"""
+        if self.max_rows is None:
+            kept.append(rows)
+            return
+        room = self.max_rows - sum(len(df) for df in kept)
+        if room > 0:
+            kept.append(rows.iloc[:room])
+
+    @staticmethod
+    def _lookup(index, values):
+        """Reference position of each value (-1: not found)"""
+        if (pd.api.types.is_integer_dtype(index) and not pd.api.types.is_integer_dtype(values)
+                and values.name in KEY_PREFIXES):
+            # Integer-encoded reference (compact tables), rendered keys
+            return _encode(values, lambda uniques: index.get_indexer(_parse_ids(uniques, KEY_PREFIXES[values.name])))
+        return _encode(values, index.get_indexer)
+
+    def _unique_keys(self, table, df, codes):
+        """int64 key per row of a table's unique columns (-1: malformed, or an invalid FK value)"""
+        columns = UNIQUE_KEYS[table]
+        if len(columns) == 1 and columns[0] in codes:
+            # FK column: its reference code, invalid values are reported by the FK check
+            return codes[columns[0]]
+        ids = _integer_ids(columns[0], df[columns[0]])
+        if (ids >= 0).any():
+            # Rendered ids keep their width, typed ones get the narrowest that fits
+            rendered = not pd.api.types.is_integer_dtype(df[columns[0]])
+            first = df[columns[0]].iloc[np.argmax(ids >= 0)]
+            width = len(first) - len(ID_PREFIXES[columns[0]]) if rendered else id_width(ids.max())
+            self._id_widths[table] = max(self._id_widths.get(table, 0), width)
+        if len(columns) == 1:
+            return ids
+        lines = pd.to_numeric(df[columns[1]], errors='coerce').to_numpy(dtype=float)
+        valid = (ids >= 0) & (lines >= 0) & (lines < LINE_BASE) & (lines == np.floor(lines))
+        return np.where(valid, ids * LINE_BASE + np.where(valid, lines, 0).astype(np.int64), -1)
+
+    def check(self, tables):
+        """Check one chunk per table (a dict of table name -> DataFrame)"""
+        for table, df in tables.items():
+            offset = self.rows_checked.get(table, 0)
+            self.rows_checked[table] = offset + len(df)
+            positions = np.arange(offset, offset + len(df), dtype=np.int64)
+            codes = {}
+            for fk in FOREIGN_KEYS:
+                child, column, reference, _ = fk
+                if child != table or reference not in self.indexes:
+                    continue
+                codes[column] = self._lookup(self.indexes[reference], df[column])
+                invalid = codes[column] < 0
+                if invalid.any():
+                    self._fk_count[fk] += int(invalid.sum())
+                    self._keep(self._fk_rows[fk], df[invalid].set_axis(positions[invalid]))
+                if (table, column) in self._covered:
+                    self._covered[(table, column)][codes[column][~invalid]] = True
+
+            if table in UNIQUE_KEYS:
+                keys = self._unique_keys(table, df, codes)
+                valid = keys >= 0
+                finder = self._finders.setdefault(table, _DuplicateFinder(self.spill_dir))
+                finder.add(keys[valid], positions[valid])
+                # Missing / malformed keys (FK-coded keys were reported by their FK check)
+                count, kept = self._malformed.setdefault(table, [0, []])
+                if UNIQUE_KEYS[table][0] not in codes and not valid.all():
+                    self._malformed[table][0] += int((~valid).sum())
+                    self._keep(kept, df[~valid].set_axis(positions[~valid]))
+
+    def _decode(self, table, keys):
+        """Key columns of a table back from their int64 keys"""
+        columns = UNIQUE_KEYS[table]
+        if columns[0] not in ID_PREFIXES:
+            reference = next(ref for child, col, ref, _ in FOREIGN_KEYS if (child, col) == (table, columns[0]))
+            return {columns[0]: self.indexes[reference][keys]}
+        ids = keys // LINE_BASE if len(columns) > 1 else keys
+        decoded = {columns[0]: format_ids(ID_PREFIXES[columns[0]], ids, self._id_widths.get(table, MIN_ID_DIGITS))}
+        if len(columns) > 1:
+            decoded[columns[1]] = keys % LINE_BASE
+        return decoded
+
+    def finish(self):
+        """
+        {check label: Violation or None} for every check that could run
+        (a check is skipped when its table or reference was never given)
+        """
+        results = {}
+        for fk in FOREIGN_KEYS:
+            table, column, reference, _ = fk
+            if table not in self.rows_checked or reference not in self.indexes:
+                continue
+            violation = None
+            if self._fk_count[fk]:
+                violation = Violation(fk_label(*fk), self._fk_count[fk], pd.concat(self._fk_rows[fk]))
+            results[fk_label(*fk)] = violation
+
+        for table, columns in UNIQUE_KEYS.items():
+            if table not in self._finders:
+                continue
+            keys, rows = self._finders.pop(table).finish()
+            malformed, malformed_rows = self._malformed.get(table, [0, []])
+            violation = None
+            if len(keys) or malformed:
+                limit = len(keys) if self.max_rows is None else self.max_rows
+                duplicates = pd.DataFrame(self._decode(table, keys[:limit]), index=rows[:limit])
+                violation = Violation(unique_label(table, columns), len(keys) + malformed,
+                                      pd.concat([df for df in [duplicates, *malformed_rows] if len(df)]))
+            results[unique_label(table, columns)] = violation
+
+        for table, column, reference, reference_column in FOREIGN_KEYS:
+            if (table, column) not in self._covered or table not in self.rows_checked:
+                continue
+            label = covering_label(table, column, reference, reference_column)
+            missing = np.flatnonzero(~self._covered[(table, column)])
+            violation = None
+            if len(missing):
+                limit = len(missing) if self.max_rows is None else self.max_rows
+                violation = Violation(label, len(missing),
+                                      pd.DataFrame({reference_column: self.indexes[reference][missing[:limit]]}))
+            results[label] = violation
+        return results
+
+def check_tables(tables, brands, max_rows=MAX_REPORTED_ROWS):
+    """Check in-memory tables (recipients and products are also the references)"""
+    checker = IntegrityChecker({'brands': brands, 'recipients': tables['recipients']['crmid'],
+                                'products': tables['products']['code']}, max_rows)
+    checker.check(tables)
+    return checker.finish()
+
+def check_directory(data_dir, brands, chunk_rows=CHUNK_ROWS, max_rows=MAX_REPORTED_ROWS, spill_dir=None):
+    """
+    Check the tables written to a directory, streamed chunk by chunk.
+    Only the reference keys, the keys of the table being checked and the
+    reported rows are held in memory.
+    """
+    def column(name, col):
+        return np.concatenate([chunk[col].to_numpy(dtype=object)
+                               for chunk in iter_table(data_dir, name, chunk_rows)])
+
+    checker = IntegrityChecker({'brands': brands, 'recipients': column('recipients', 'crmid'),
+                                'products': column('products', 'code')}, max_rows, spill_dir)
+    for name in CHECKED_TABLES:
+        for chunk in iter_table(data_dir, name, chunk_rows):
+            checker.check({name: chunk})
+    return checker.finish()
@@ -0,0 +1,175 @@
+"""
+Lazy generation pipeline
+STEP 1-7 of generate_augmented_data.py as a library: a Pipeline reads the
+samples, scales the recipients, assigns the internal segments and runs the
+activity shards only when a result is first used, and iter_table() yields
+a table chunk by chunk as the shards are generated, so a consumer can pull
+purchases straight into its own sink without writing and re-reading CSVs.
+Output is identical to the script run with the same settings (STEP 8-9,
+validation and files, stay in the script).
+"""
+
+from datetime import datetime
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from frescopa.cache import StageCache
+from frescopa.catalog import build_catalog
+from frescopa.export import CSV_OPTIONS, to_campaign
+from frescopa.recipients import RECIPIENT_COLUMNS, scale_recipients
+from frescopa.segmentation import assign_internal_segments
+from frescopa.sharding import SHARD_SIZE, SHARD_TABLES, id_widths_for, iter_shards
+
+DATA_SAMPLE_DIR = Path("data-sample")
+
+# Timeline
+CURRENT_DATE = datetime(2026, 1, 15)
+BUSINESS_START = datetime(2023, 1, 1)
+
+# Target volumes (abandoned carts at scale 1, scaled with the recipients)
+TARGET_PRODUCTS = 20
+TARGET_PURCHASES_ORDERS = 90000
+TARGET_WISHLIST = 4500
+TARGET_ABANDONED = 10000
+
+# Random seed for reproducibility (each shard derives its own stream from it)
+RANDOM_SEED = 42
+
+# STEP 2 products. EXACT COLUMNS: code, priceref, category, description, brand, imageurl
+NEW_PRODUCTS = [
+    {'code': 'RomaRoast', 'priceref': 11.50, 'category': 1, 'description': 'Roma Roast (9/10)', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'MilanoMagic', 'priceref': 12.00, 'category': 1, 'description': 'Milano Magic (8/10)', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'CapriCappuccino', 'priceref': 11.00, 'category': 1, 'description': 'Capri Cappuccino (6/10)', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'AmericanoBliss', 'priceref': 10.50, 'category': 1, 'description': 'Americano Bliss (7/10)', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'DecafDelight', 'priceref': 11.00, 'category': 1, 'description': 'Decaf Delight (5/10)', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'HazelnutHeaven', 'priceref': 12.50, 'category': 1, 'description': 'Hazelnut Heaven (7/10)', 'brand': 'javajunction', 'imageurl': ''},
+    {'code': 'ChocolateCharm', 'priceref': 13.00, 'category': 1, 'description': 'Chocolate Charm (8/10)', 'brand': 'javajunction', 'imageurl': ''},
+    {'code': 'IntenseIndulgence', 'priceref': 14.00, 'category': 1, 'description': 'Intense Indulgence (13/13)', 'brand': 'javajunction', 'imageurl': ''},
+    {'code': 'DescaleKit', 'priceref': 19.00, 'category': 4, 'description': 'Descaling Kit', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'CapsuleHolder', 'priceref': 29.00, 'category': 4, 'description': 'Rotating Capsule Holder', 'brand': 'coffeeworks', 'imageurl': ''},
+    {'code': 'MilkFrother', 'priceref': 89.00, 'category': 4, 'description': 'Milk Frother', 'brand': 'javajunction', 'imageurl': ''},
+    {'code': 'TravelMug', 'priceref': 24.00, 'category': 4, 'description': 'Insulated Travel Mug', 'brand': 'javajunction', 'imageurl': ''},
+]
+
+# Output tables, in Campaign import order
+TABLES = ['brands', 'products', 'recipients', *SHARD_TABLES]
+
+def read_sample(directory, name):
+    """A Campaign sample table as read by STEP 1"""
+    return pd.read_csv(directory / f"{name}.csv", sep=CSV_OPTIONS['sep'], encoding=CSV_OPTIONS['encoding'])
+
+class Pipeline:
+    """
+    One generation run's inputs and results, each computed on first use.
+    Results are drawn from one seeded stream in STEP order, whatever the
+    order they are used in.
+    """
+
+    def __init__(self, scale=1.0, seed=RANDOM_SEED, current_date=CURRENT_DATE, target_abandoned=None,
+                 workers=1, cache=None, data_sample_dir=DATA_SAMPLE_DIR, shard_size=SHARD_SIZE):
+        self.scale = scale
+        self.seed = seed
+        self.current_date = current_date
+        self.target_abandoned = (int(round(TARGET_ABANDONED * scale)) if target_abandoned is None
+                                 else target_abandoned)
+        self.workers = workers
+        self.cache = cache if cache is not None else StageCache(enabled=False)
+        self.data_sample_dir = data_sample_dir
+        self.shard_size = shard_size
+        self.rng = np.random.default_rng(seed)
+
+    # STEP 1: samples (and scaled recipients)
+
+    @cached_property
+    def brands(self):
+        return read_sample(self.data_sample_dir, "brands")
+
+    @cached_property
+    def sample_products(self):
+        return read_sample(self.data_sample_dir, "products")
+
+    @cached_property
+    def sample_recipients(self):
+        return read_sample(self.data_sample_dir, "recipients")
+
+    @cached_property
+    def scaled_recipients(self):
+        """The sample recipients, scaled when scale != 1"""
+        recipients_df = self.sample_recipients
+        if self.scale == 1:
+            return recipients_df
+        individuals_df = read_sample(self.data_sample_dir, "individuals")
+        return self.cache.stage('recipients', [recipients_df, individuals_df, self.scale],
+                                lambda: scale_recipients(recipients_df, individuals_df, self.scale, self.rng),
+                                self.rng)
+
+    # STEP 2: products
+
+    @cached_property
+    def products(self):
+        new_products_df = pd.DataFrame(NEW_PRODUCTS)
+        return self.cache.stage('products', [self.sample_products, new_products_df],
+                                lambda: pd.concat([self.sample_products, new_products_df], ignore_index=True))
+
+    @cached_property
+    def catalog(self):
+        """Immutable code -> price / category index used by STEP 4-7"""
+        return build_catalog(self.products)
+
+    # STEP 3: internal segmentation (columns never exported)
+
+    @cached_property
+    def recipients(self):
+        """Recipients with the internal segment columns"""
+        recipients_df = self.scaled_recipients
+        return self.cache.stage('segmentation', [recipients_df],
+                                lambda: assign_internal_segments(recipients_df, self.rng), self.rng)
+
+    # STEP 4-7: activity shards
+
+    @property
+    def id_widths(self):
+        """Id widths of the run, fixed before any shard is generated"""
+        return id_widths_for(len(self.recipients), self.target_abandoned)
+
+    def shards(self):
+        """Lazy iterator of shard tables ({table: DataFrame}, global ids) in shard order"""
+        return iter_shards(self.recipients, self.catalog, self.current_date, self.seed, self.target_abandoned,
+                           workers=self.workers, shard_size=self.shard_size, cache=self.cache)
+
+    def iter_table(self, name, chunk_rows=None, render=False):
+        """
+        Lazy iterator of a table as DataFrame chunks of at most chunk_rows
+        rows (default: whole table, or one chunk per shard). Activity tables
+        are generated shard by shard as chunks are pulled. render=True gives
+        the Campaign strings of the CSVs (dd/mm/yyyy HH:MM, ORD000001).
+        """
+        if name not in TABLES:
+            raise ValueError(f"unknown table {name} (one of {', '.join(TABLES)})")
+        return self._chunks(name, chunk_rows, render)
+
+    def _chunks(self, name, chunk_rows, render):
+        # Nothing is computed before the first chunk is pulled
+        if name in SHARD_TABLES:
+            frames = (shard[name] for shard in self.shards())
+        else:
+            frames = [self.recipients[RECIPIENT_COLUMNS] if name == 'recipients' else getattr(self, name)]
+
+        for df in frames:
+            if render:
+                df = to_campaign(df, self.id_widths)
+            step = chunk_rows or max(len(df), 1)
+            for start in range(0, len(df), step):
+                yield df.iloc[start:start + step]
+
+    def iter_records(self, name, render=False):
+        """Lazy iterator of a table's rows as {column: value} dicts"""
+        for chunk in self.iter_table(name, render=render):
+            yield from chunk.to_dict('records')
+
+def generate_table(name, chunk_rows=None, render=False, **config):
+    """Chunks of one table from a fresh Pipeline(**config) (see Pipeline.iter_table)"""
+    return Pipeline(**config).iter_table(name, chunk_rows, render)
@@ -0,0 +1,272 @@
+"""
+Vectorized purchase engine (STEP 4)
+Draws the order history of every customer at once as NumPy arrays
+instead of walking recipients row by row
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.catalog import ACCESSORY, CAPSULE, MACHINE
+from frescopa.timestamps import sample_minutes
+
+# ============================================================================
+# PURCHASE RULES
+# ============================================================================
+
+# Orders per customer (inclusive range)
+ORDER_COUNTS = {
+    'active_high': (8, 12),
+    'active_medium': (6, 9),
+    'occasional': (2, 4),
+    'one_time': (1, 2),
+    'lapsed': (3, 6)
+}
+
+# Days between two orders (inclusive range)
+REORDER_INTERVALS = {
+    'active_high': (25, 35),
+    'active_medium': (40, 60),
+    'occasional': (80, 120),
+    'one_time': (180, 365),
+    'lapsed': (30, 60)
+}
+
+# Lapsed customers stop buying 180-540 days before the current date
+LAPSED_CUTOFF_DAYS = (180, 540)
+
+MACHINE_FIRST_ORDER_PROB = 0.40
+CAPSULE_VARIETIES = np.array([1, 1, 2, 2, 3])
+CAPSULE_QUANTITIES = np.array([5, 10, 10, 15, 20])
+ACCESSORY_PROB = 0.05
+DISCOUNT_PROB = 0.20
+DISCOUNT_RATE = (0.05, 0.15)
+
+PURCHASE_COLUMNS = ['date', 'orderref', 'orderline', 'product', 'price', 'quantity', 'customer']
+
+# Orders a customer still has due after the generated history (int days)
+PENDING_COLUMNS = ['customer', 'next_order', 'remaining']
+
+# ============================================================================
+# ARRAY HELPERS
+# ============================================================================
+
+def to_days(values):
+    """Convert datetime-like values to int64 days since epoch"""
+    return pd.to_datetime(values).values.astype('datetime64[D]').astype(np.int64)
+
+def month_of(days):
+    """Calendar month (1-12) of int64 days since epoch"""
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+def apply_seasonality(days, rng):
+    """Vectorized apply_seasonality: shift order days by seasonal patterns"""
+    n = len(days)
+    month = month_of(days)
+
+    winter = np.isin(month, [9, 10, 11, 12, 1, 2])
+    early = winter & (rng.random(n) < 0.25)
+    shift = np.where(early, -rng.integers(5, 11, n), 0)
+    holidays = np.isin(month, [12, 1]) & (rng.random(n) < 0.15)
+    shift = shift - np.where(holidays, rng.integers(3, 8, n), 0)
+
+    summer = np.isin(month, [6, 7, 8]) & (rng.random(n) < 0.20)
+    shift = shift + np.where(summer, rng.integers(5, 16, n), 0)
+
+    return days + shift
+
+def sample_without_replacement(rng, n_items, counts):
+    """Pick counts[i] distinct indices in [0, n_items) per row, padded with -1"""
+    counts = np.minimum(counts, n_items)
+    k_max = int(counts.max()) if len(counts) else 0
+    picks = np.full((len(counts), k_max), -1, dtype=np.int64)
+    for j in range(k_max):
+        pick = rng.integers(0, n_items - j, size=len(counts))
+        # Skip over the indices already taken (sorted ascending)
+        taken = np.sort(picks[:, :j], axis=1)
+        for t in range(j):
+            pick += pick >= taken[:, t]
+        picks[:, j] = np.where(counts > j, pick, -1)
+    return picks
+
+def _segment_lookup(segments, table, column):
+    """Map segment names to one end of a (min, max) rule range"""
+    return pd.Series(segments).map({k: v[column] for k, v in table.items()}).to_numpy(dtype=np.int64)
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+
+def order_schedule(segments, acquisition_days, current_day, rng):
+    """
+    Draw order days for all customers as a (customers x max_orders) matrix.
+    Returns (days, valid, num_orders) where valid marks the orders that
+    actually happen and num_orders is each customer's order quota.
+    """
+    n = len(segments)
+    if n == 0:
+        return np.empty((0, 0), dtype=np.int64), np.empty((0, 0), dtype=bool), np.empty(0, dtype=np.int64)
+
+    num_orders = rng.integers(_segment_lookup(segments, ORDER_COUNTS, 0),
+                              _segment_lookup(segments, ORDER_COUNTS, 1) + 1)
+    min_interval = _segment_lookup(segments, REORDER_INTERVALS, 0)
+    max_interval = _segment_lookup(segments, REORDER_INTERVALS, 1)
+    is_lapsed = segments == 'lapsed'
+
+    max_orders = int(num_orders.max())
+    days = np.zeros((n, max_orders), dtype=np.int64)
+    valid = np.zeros((n, max_orders), dtype=bool)
+
+    alive = np.ones(n, dtype=bool)
+    day = acquisition_days + rng.integers(0, 15, n)
+    for order_num in range(max_orders):
+        if order_num > 0:
+            day = apply_seasonality(day + rng.integers(min_interval, max_interval + 1), rng)
+
+        cutoff = current_day - rng.integers(LAPSED_CUTOFF_DAYS[0], LAPSED_CUTOFF_DAYS[1] + 1, n)
+        alive &= order_num < num_orders
+        alive &= ~(is_lapsed & (day > cutoff))
+        alive &= day <= current_day
+
+        days[:, order_num] = day
+        valid[:, order_num] = alive
+
+    return days, valid, num_orders
+
+def pending_orders(segments, days, valid, num_orders):
+    """
+    Customers whose quota the history stops short of (current date reached):
+    (positions, day of the next order, orders left including it).
+    Lapsed customers never resume.
+    """
+    placed = valid.sum(axis=1)
+    pending = np.flatnonzero((placed < num_orders) & (segments != 'lapsed'))
+    return pending, days[pending, placed[pending]], num_orders[pending] - placed[pending]
+
+def generate_purchases(recipients_df, catalog, current_date, rng, first_order_id=1, with_pending=False):
+    """
+    Generate the purchases table for all recipients in one batch.
+    recipients_df needs crmid, _internal_segment, _internal_acquisition and
+    _internal_owns_machine. All lines of an order share one datetime64 timestamp;
+    orderref is a sequential integer starting at first_order_id.
+    with_pending=True also returns the orders still due after current_date
+    (PENDING_COLUMNS: customer, next order day, orders left).
+    """
+    buyers = recipients_df[recipients_df['_internal_segment'] != 'prospect']
+    segments = buyers['_internal_segment'].to_numpy()
+    crmids = buyers['crmid'].to_numpy()
+    owns_machine = buyers['_internal_owns_machine'].to_numpy(dtype=bool)
+    current_day = to_days([current_date])[0]
+
+    days, valid, num_orders = order_schedule(segments, to_days(buyers['_internal_acquisition']), current_day, rng)
+
+    # One row per order, customers in file order, orders chronological
+    customer_idx, order_num = np.nonzero(valid)
+    purchases_df = build_orders(crmids, owns_machine, customer_idx, days[customer_idx, order_num],
+                                order_num == 0, catalog, rng, first_order_id)
+    if not with_pending:
+        return purchases_df
+
+    pending, next_day, remaining = pending_orders(segments, days, valid, num_orders)
+    return purchases_df, pd.DataFrame({'customer': crmids[pending], 'next_order': next_day,
+                                       'remaining': remaining}, columns=PENDING_COLUMNS)
+
+def build_orders(crmids, owns_machine, customer_idx, order_days, first_order, catalog, rng, first_order_id=1):
+    """
+    Order lines for a batch of orders: order i is placed by customer
+    customer_idx[i] on int day order_days[i]. first_order marks each
+    customer's first order ever (the one that may include a machine).
+    """
+    n_orders = len(customer_idx)
+    order_times = (order_days.astype('datetime64[D]').astype('datetime64[m]')
+                   + sample_minutes(rng, n_orders).astype('timedelta64[m]'))
+
+    codes = catalog.codes
+    prices = catalog.prices
+    capsules = catalog.positions(CAPSULE)
+    machines = catalog.positions(MACHINE)
+    accessories = catalog.positions(ACCESSORY)
+
+    # First order: maybe buy machine (and own one from then on)
+    buys_machine = first_order & ~owns_machine[customer_idx] & (rng.random(n_orders) < MACHINE_FIRST_ORDER_PROB)
+    machine_pick = machines[rng.integers(0, len(machines), n_orders)]
+    bought_machine = np.zeros(len(crmids), dtype=bool)
+    bought_machine[customer_idx[buys_machine]] = True
+    has_machine = owns_machine[customer_idx] | bought_machine[customer_idx]
+
+    # Capsules: 1-3 distinct varieties for machine owners
+    varieties = np.where(has_machine, CAPSULE_VARIETIES[rng.integers(0, len(CAPSULE_VARIETIES), n_orders)], 0)
+    capsule_picks = sample_without_replacement(rng, len(capsules), varieties)
+    capsule_slots = capsule_picks.shape[1]
+    capsule_qty = CAPSULE_QUANTITIES[rng.integers(0, len(CAPSULE_QUANTITIES), (n_orders, capsule_slots))]
+
+    # Maybe add accessories
+    buys_accessory = (rng.random(n_orders) < ACCESSORY_PROB) & (len(accessories) > 0)
+    if len(accessories) > 0:
+        accessory_pick = accessories[rng.integers(0, len(accessories), n_orders)]
+    else:
+        accessory_pick = np.full(n_orders, -1)
+
+    # Slot matrix: machine | capsules... | accessory
+    n_slots = capsule_slots + 2
+    product_idx = np.full((n_orders, n_slots), -1, dtype=np.int64)
+    quantity = np.ones((n_orders, n_slots), dtype=np.int64)
+    product_idx[:, 0] = np.where(buys_machine, machine_pick, -1)
+    product_idx[:, 1:capsule_slots + 1] = np.where(capsule_picks >= 0, capsules[capsule_picks], -1)
+    quantity[:, 1:capsule_slots + 1] = capsule_qty
+    product_idx[:, capsule_slots + 1] = np.where(buys_accessory, accessory_pick, -1)
+
+    # Orders without any line never get an order reference
+    has_lines = (product_idx >= 0).any(axis=1)
+    order_ids = first_order_id + np.cumsum(has_lines) - 1
+
+    # Flatten the slot matrix into order lines (row-major keeps line order)
+    line_mask = product_idx >= 0
+    order_line = np.cumsum(line_mask, axis=1)[line_mask]
+    line_order = np.repeat(np.arange(n_orders), line_mask.sum(axis=1))
+
+    purchases_df = pd.DataFrame({
+        'date': order_times[line_order],
+        'orderref': order_ids[line_order],
+        'orderline': order_line,
+        'product': codes[product_idx[line_mask]],
+        'price': prices[product_idx[line_mask]],
+        'quantity': quantity[line_mask],
+        'customer': crmids[customer_idx[line_order]],
+    }, columns=PURCHASE_COLUMNS)
+    return append_discount_lines(purchases_df, rng)
+
+def append_discount_lines(purchases_df, rng):
+    """
+    Maybe add a discount line at the end of each order, priced off the order total.
+    Linear post-pass: totals come from one bincount over the lines, which must
+    be grouped by order (contiguous orderref).
+    """
+    n_lines = len(purchases_df)
+    if n_lines == 0:
+        return purchases_df
+
+    orderref = purchases_df['orderref'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, orderref[1:] != orderref[:-1]])
+    ends = np.r_[starts[1:], n_lines]
+    n_orders = len(starts)
+
+    # Order totals in cents so the discount is computed on exact amounts
+    line_cents = np.rint(purchases_df['price'].to_numpy(dtype=float) * 100) * purchases_df['quantity'].to_numpy()
+    order_cents = np.bincount(np.repeat(np.arange(n_orders), ends - starts), weights=line_cents, minlength=n_orders)
+
+    gets_discount = rng.random(n_orders) < DISCOUNT_PROB
+    rate = rng.uniform(DISCOUNT_RATE[0], DISCOUNT_RATE[1], n_orders)
+    discount_cents = np.floor(order_cents * rate + 0.5)
+
+    last_lines = ends[gets_discount] - 1
+    discounts = purchases_df.iloc[last_lines].copy()
+    discounts['orderline'] = discounts['orderline'].to_numpy() + 1
+    discounts['product'] = 'discount'
+    discounts['price'] = -discount_cents[gets_discount] / 100
+    discounts['quantity'] = 1
+
+    # Slot each discount right after the last line of its order: one positional gather
+    rows = np.insert(np.arange(n_lines), last_lines + 1, n_lines + np.arange(len(last_lines)))
+    combined = pd.concat([purchases_df, discounts], ignore_index=True)
+    return combined.take(rows).reset_index(drop=True)
@@ -0,0 +1,109 @@
+"""
+Synthetic recipients (STEP 1 scale-up)
+Draws names, brands and birthdates from the sample pools to scale the
+recipient base past data-sample/recipients.csv. crmids continue the sample
+numbering; emails are kept unique with a sorted 64-bit hash check instead
+of a Python set of strings.
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.timestamps import DAY_FORMAT, format_dates
+
+RECIPIENT_COLUMNS = ['crmid', 'firstname', 'lastname', 'email', 'brand', 'birthdate', 'folder']
+
+CRMID_PREFIX = 'CRM'
+CRMID_DIGITS = 10
+EMAIL_SUFFIX_MAX = 99999
+
+def crmid_numbers(df):
+    """Numeric part of the crmids of a recipients table"""
+    return df['crmid'].str.slice(len(CRMID_PREFIX)).astype(np.int64).to_numpy()
+
+def name_pools(*frames):
+    """Unique first / last names found in the given recipient-like tables"""
+    names = pd.concat([df[['firstname', 'lastname']] for df in frames], ignore_index=True)
+    return (names['firstname'].dropna().unique(), names['lastname'].dropna().unique())
+
+def _email_part(names):
+    """Lowercase ascii local-part fragment of each name"""
+    return (pd.Series(names).str.normalize('NFKD')
+            .str.encode('ascii', errors='ignore').str.decode('ascii')
+            .str.lower().str.replace('[^a-z]', '', regex=True).to_numpy(dtype=object))
+
+def _hash(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+def _duplicated(hashes):
+    """Mask of hashes already seen earlier in the array (sorted-array check)"""
+    order = np.argsort(hashes, kind='stable')
+    repeated = np.zeros(len(hashes), dtype=bool)
+    repeated[order[1:]] = hashes[order[1:]] == hashes[order[:-1]]
+    return repeated
+
+def synthesize_recipients(n, template_df, pools, rng, first_number):
+    """
+    Draw n new recipients shaped like template_df (the sample recipients).
+    crmids are sequential from first_number; emails never collide with each
+    other or with the template emails.
+    """
+    firstnames, lastnames = pools
+    first_idx = rng.integers(0, len(firstnames), n)
+    last_idx = rng.integers(0, len(lastnames), n)
+
+    # Email: firstnamelastname12345@domain, domains in sample proportions
+    domains = template_df['email'].str.split('@').str[1].value_counts(normalize=True)
+    domain = domains.index.to_numpy(dtype=object)[rng.choice(len(domains), size=n, p=domains.to_numpy())]
+    local = _email_part(firstnames)[first_idx] + _email_part(lastnames)[last_idx]
+
+    existing = _hash(template_df['email'].str.lower())
+    suffix = rng.integers(1, EMAIL_SUFFIX_MAX + 1, n)
+    pending = np.arange(n)
+    emails = np.empty(n, dtype=object)
+    while len(pending) > 0:
+        emails[pending] = local[pending] + suffix[pending].astype(str).astype(object) + '@' + domain[pending]
+        hashes = np.r_[existing, _hash(emails)]
+        # Redraw the suffix of every email whose hash was already taken
+        pending = np.flatnonzero(_duplicated(hashes)[len(existing):])
+        suffix[pending] = rng.integers(1, EMAIL_SUFFIX_MAX + 1, len(pending))
+
+    # Brands and birthdates follow the sample
+    brands = template_df['brand'].value_counts(normalize=True)
+    brand = brands.index.to_numpy(dtype=object)[rng.choice(len(brands), size=n, p=brands.to_numpy())]
+    birthdays = pd.to_datetime(template_df['birthdate'], format=DAY_FORMAT).to_numpy(dtype='datetime64[D]').astype(np.int64)
+    birthdate = rng.integers(birthdays.min(), birthdays.max() + 1, n).astype('datetime64[D]')
+
+    numbers = first_number + np.arange(n)
+    crmid = CRMID_PREFIX + pd.Series(numbers).astype(str).str.zfill(CRMID_DIGITS)
+
+    return pd.DataFrame({
+        'crmid': crmid.to_numpy(dtype=object),
+        'firstname': firstnames[first_idx],
+        'lastname': lastnames[last_idx],
+        'email': emails,
+        'brand': brand,
+        'birthdate': format_dates(birthdate),
+        'folder': template_df['folder'].mode().iloc[0],
+    }, columns=RECIPIENT_COLUMNS)
+
+def scale_recipients(recipients_df, individuals_df, scale, rng):
+    """
+    Recipient base at `scale` x the sample size.
+    scale <= 1 keeps the first rows of the sample; above 1 the sample is
+    kept as-is and synthetic recipients are appended.
+    """
+    target = int(round(len(recipients_df) * scale))
+    if target <= len(recipients_df):
+        return recipients_df.head(target).reset_index(drop=True)
+
+    numbers = crmid_numbers(recipients_df)
+    extra = synthesize_recipients(target - len(recipients_df), recipients_df,
+                                  name_pools(recipients_df, individuals_df), rng, int(numbers.max()) + 1)
+    scaled = pd.concat([recipients_df[RECIPIENT_COLUMNS], extra], ignore_index=True)
+
+    # crmid uniqueness: sorted-array check on the numeric part
+    all_numbers = np.sort(np.r_[numbers, crmid_numbers(extra)])
+    if (np.diff(all_numbers) == 0).any():
+        raise ValueError("Duplicate crmid in scaled recipients")
+    return scaled
@@ -0,0 +1,354 @@
+"""
+Real-time event replay
+Replays purchases, wishlist additions and abandoned carts in timestamp
+order, as a live feed for Campaign trigger load tests. Events are encoded
+once as NDJSON lines (the Campaign strings of the CSVs plus an "event"
+type) into a single buffer in time order, so sending a batch is a slice of
+that buffer. Each connection replays at a speed-up of event time or a
+fixed events/sec rate, over HTTP (chunked NDJSON) or plain TCP. Writes
+wait for the socket buffer to drain (backpressure), and a slow consumer
+shows up as lag: how far the last sent event is behind its due time.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from frescopa.columnar import read_table
+from frescopa.schema import render
+from frescopa.timestamps import DATE_FORMAT, DAY_FORMAT, parse_timestamps
+
+# Replayed tables: table -> (event type, timestamp column)
+EVENT_TABLES = {
+    'purchases': ('purchase', 'date'),
+    'wishlist': ('wishlist_add', 'creationDate'),
+    'abandoned': ('cart_abandoned', 'date'),
+}
+
+# Scheduler tick and the most events written per batch
+TICK_SECONDS = 0.01
+MAX_BATCH = 10000
+
+# Events assembled per block while loading
+ENCODE_ROWS = 1 << 18
+
+# Socket buffer above which writes wait for the consumer
+HIGH_WATER_BYTES = 1 << 20
+
+def parse_since(text):
+    """A replay start, 'dd/mm/yyyy' or 'dd/mm/yyyy HH:MM', as datetime64[m] (ValueError if invalid)"""
+    for fmt in (DAY_FORMAT, DATE_FORMAT):
+        try:
+            return np.datetime64(datetime.strptime(text, fmt), 'm')
+        except ValueError:
+            pass
+    raise ValueError(f"since must be dd/mm/yyyy or dd/mm/yyyy HH:MM, not {text!r}")
+
+def parse_positive(text, kind=float, name='value'):
+    """A speedup, rate or limit: a finite number above 0 (ValueError otherwise)"""
+    try:
+        value = kind(text)
+    except ValueError:
+        value = None
+    if value is None or not 0 < value < float('inf'):
+        raise ValueError(f"{name} must be a number above 0, not {text!r}")
+    return value
+
+def _json_texts(uniques):
+    """JSON text of each value (bytes); strings go through the C string encoder"""
+    return [(encode_basestring_ascii(value) if isinstance(value, str) else json.dumps(value)).encode()
+            for value in uniques.tolist()]
+
+class EventEncoder:
+    """
+    NDJSON lines of a rendered table's rows. Each piece of a line (the
+    event type, then '"column":value' per column) is encoded once per
+    distinct value into a padded byte table; lines are assembled by
+    gathering rows of these tables and dropping the padding.
+    """
+
+    def __init__(self, df, event_type):
+        pieces = [(None, [b'{"event":' + json.dumps(event_type).encode()])]
+        for col in df.columns:
+            codes, uniques = pd.factorize(df[col])
+            key = b',' + json.dumps(col).encode() + b':'
+            # Missing values (code -1) pick the trailing null
+            pieces.append((codes.astype(np.int32), [key + text for text in _json_texts(uniques)] + [key + b'null']))
+        pieces.append((None, [b'}\n']))
+
+        self.parts = []
+        for codes, texts in pieces:
+            width = max(map(len, texts))
+            table = np.array(texts, dtype=f'S{width}').view(np.uint8).reshape(-1, width)
+            self.parts.append((codes, table, np.array([len(text) for text in texts])))
+        self.width = sum(table.shape[1] for _, table, _ in self.parts)
+
+    def fill(self, rows, out, mask, positions):
+        """
+        Write the lines of rows into out[positions] (padded), with mask set
+        on their bytes; returns the line lengths
+        """
+        col, lengths = 0, np.zeros(len(rows), dtype=np.int64)
+        for codes, table, sizes in self.parts:
+            picks = codes[rows] if codes is not None else np.zeros(len(rows), dtype=np.int32)
+            width = table.shape[1]
+            out[positions, col:col + width] = table[picks]
+            mask[positions, col:col + width] = np.arange(width) < sizes[picks][:, None]
+            lengths += sizes[picks]
+            col += width
+        return lengths
+
+class EventLog:
+    """NDJSON events in time order: one buffer, line offsets and event minutes"""
+
+    def __init__(self, data, lengths, minutes, counts):
+        self.data = data
+        self.offsets = np.r_[0, np.cumsum(lengths)].astype(np.int64)
+        self.minutes = minutes
+        self.counts = counts
+        self._view = memoryview(data)
+
+    def __len__(self):
+        return len(self.minutes)
+
+    def lines(self, start, stop):
+        """Events [start, stop) as one bytes view (no copy)"""
+        return self._view[self.offsets[start]:self.offsets[stop]]
+
+    def position(self, since):
+        """Index of the first event at or after since ('dd/mm/yyyy' or 'dd/mm/yyyy HH:MM')"""
+        minute = parse_since(since).astype(np.int64)
+        return int(np.searchsorted(self.minutes, minute, side='left'))
+
+def load_events(data_dir, tables=tuple(EVENT_TABLES)):
+    """The EventLog of the given tables of a data directory"""
+    encoders, minutes, counts = [], [], {}
+    for name in tables:
+        event_type, time_col = EVENT_TABLES[name]
+        df = render(read_table(data_dir, name, parse_dates=False))
+        encoders.append(EventEncoder(df, event_type))
+        minutes.append(parse_timestamps(df[time_col].to_numpy(dtype=object)).astype(np.int64))
+        counts[name] = len(df)
+
+    # Stable: same-minute events keep table order, and order lines stay together
+    order = np.argsort(np.concatenate(minutes), kind='stable')
+    table_of = np.repeat(np.arange(len(encoders), dtype=np.int8), [len(m) for m in minutes])[order]
+    row_of = np.concatenate([np.arange(len(m)) for m in minutes])[order]
+
+    # Lines are assembled in time order, ENCODE_ROWS events at a time
+    chunks, lengths = [], np.zeros(len(order), dtype=np.int64)
+    width = max((encoder.width for encoder in encoders), default=0)
+    for start in range(0, len(order), ENCODE_ROWS):
+        stop = min(start + ENCODE_ROWS, len(order))
+        out = np.zeros((stop - start, width), dtype=np.uint8)
+        mask = np.zeros((stop - start, width), dtype=bool)
+        for i, encoder in enumerate(encoders):
+            positions = np.flatnonzero(table_of[start:stop] == i)
+            lengths[start + positions] = encoder.fill(row_of[start:stop][positions], out, mask, positions)
+        chunks.append(out[mask].tobytes())
+    return EventLog(b''.join(chunks), lengths, np.concatenate(minutes)[order], counts)
+
+class ReplaySchedule:
+    """
+    Due time (seconds from the start of a replay) of events [start, stop):
+    event time divided by speedup, a fixed rate in events/sec, or
+    everything at once when neither is given
+    """
+
+    def __init__(self, minutes, start=0, stop=None, speedup=None, rate=None):
+        if speedup and rate:
+            raise ValueError("a replay is paced by speedup or rate, not both")
+        self.minutes = minutes
+        self.start = start
+        self.stop = len(minutes) if stop is None else min(stop, len(minutes))
+        self.speedup = speedup
+        self.rate = rate
+
+    def at(self, index):
+        """Due time of event index"""
+        if self.rate:
+            return (index - self.start) / self.rate
+        if self.speedup:
+            return (self.minutes[index] - self.minutes[self.start]) * 60 / self.speedup
+        return 0.0
+
+    def due(self, elapsed):
+        """Index past the last event due at elapsed seconds"""
+        if self.start >= self.stop:
+            return self.stop
+        if self.rate:
+            index = self.start + int(elapsed * self.rate) + 1
+        elif self.speedup:
+            index = int(np.searchsorted(self.minutes, self.minutes[self.start] + elapsed * self.speedup / 60,
+                                        side='right'))
+        else:
+            index = self.stop
+        return min(max(index, self.start), self.stop)
+
+class ReplayMetrics:
+    """Throughput and lag over all connections"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.connections = 0
+        self.active = 0
+        self.events = 0
+        self.bytes = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._last = (self.started, 0)
+
+    def record(self, events, size, lag):
+        self.events += events
+        self.bytes += size
+        self.lag = lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def snapshot(self):
+        """Totals, plus the events/sec rate since the previous snapshot"""
+        now = time.monotonic()
+        since, events = self._last
+        self._last = (now, self.events)
+        return {'connections': self.connections, 'active': self.active, 'events': self.events,
+                'bytes': self.bytes, 'events_per_sec': round((self.events - events) / max(now - since, 1e-9)),
+                'lag_seconds': round(self.lag, 3), 'max_lag_seconds': round(self.max_lag, 3),
+                'uptime_seconds': round(now - self.started, 1)}
+
+async def replay(events, schedule, send, metrics):
+    """Send events of the schedule as they fall due, in batches of at most MAX_BATCH"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    sent = schedule.start
+    while sent < schedule.stop:
+        elapsed = loop.time() - started
+        due = min(schedule.due(elapsed), sent + MAX_BATCH)
+        if due <= sent:
+            await asyncio.sleep(min(schedule.at(sent) - elapsed, TICK_SECONDS))
+            continue
+        data = events.lines(sent, due)
+        await send(data)
+        metrics.record(due - sent, len(data), max(loop.time() - started - schedule.at(due - 1), 0.0))
+        sent = due
+
+async def _serve_connection(writer, run):
+    writer.transport.set_write_buffer_limits(high=HIGH_WATER_BYTES)
+    try:
+        await run()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+class ReplayServer:
+    """
+    Replays an EventLog to every connection, each from its own start.
+    TCP connections get the default pacing; HTTP clients can override it:
+    GET /events?speedup=3600 | ?rate=100000, &since=01/12/2025, &limit=N
+    (speedup, rate and limit above 0; leave them out for no pacing / no
+    limit) and GET /metrics for the current metrics as JSON.
+    """
+
+    def __init__(self, events, speedup=None, rate=None, since=None, limit=None):
+        self.events = events
+        self.defaults = {'speedup': speedup, 'rate': rate, 'since': since, 'limit': limit}
+        self.metrics = ReplayMetrics()
+
+    def options(self, query):
+        """Replay options of an HTTP query; speedup / rate replace the default pacing together"""
+        options = dict(self.defaults)
+        if 'speedup' in query or 'rate' in query:
+            options.update(speedup=parse_positive(query['speedup'], float, 'speedup') if 'speedup' in query else None,
+                           rate=parse_positive(query['rate'], float, 'rate') if 'rate' in query else None)
+        if 'since' in query:
+            options['since'] = query['since']
+        if 'limit' in query:
+            options['limit'] = parse_positive(query['limit'], int, 'limit')
+        return options
+
+    def schedule(self, speedup=None, rate=None, since=None, limit=None):
+        start = self.events.position(since) if since else 0
+        return ReplaySchedule(self.events.minutes, start, start + limit if limit else None, speedup, rate)
+
+    async def _replay(self, schedule, send):
+        self.metrics.connections += 1
+        self.metrics.active += 1
+        try:
+            await replay(self.events, schedule, send, self.metrics)
+        finally:
+            self.metrics.active -= 1
+
+    async def handle_tcp(self, reader, writer):
+        async def send(data):
+            writer.write(data)
+            await writer.drain()
+
+        await _serve_connection(writer, lambda: self._replay(self.schedule(**self.defaults), send))
+
+    async def handle_http(self, reader, writer):
+        async def respond(status, content_type, body=None):
+            headers = [f"HTTP/1.1 {status}", f"Content-Type: {content_type}", "Connection: close",
+                       f"Content-Length: {len(body)}" if body is not None else "Transfer-Encoding: chunked"]
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + (body or b''))
+            await writer.drain()
+
+        async def send(data):
+            writer.writelines([b'%x\r\n' % len(data), data, b'\r\n'])
+            await writer.drain()
+
+        async def run():
+            try:
+                request = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.LimitOverrunError:
+                await respond("431 Request Header Fields Too Large", "text/plain", b"request header too large\n")
+                return
+            try:
+                method, target, version = request.split(b'\r\n', 1)[0].split(b' ')
+                if not version.startswith(b'HTTP/'):
+                    raise ValueError(version)
+                url = urlsplit(target.decode('latin-1'))
+            except ValueError:
+                await respond("400 Bad Request", "text/plain", b"malformed request line\n")
+                return
+            if method != b'GET' or url.path not in ('/events', '/metrics'):
+                await respond("404 Not Found", "text/plain", b"GET /events or /metrics\n")
+                return
+            if url.path == '/metrics':
+                await respond("200 OK", "application/json", json.dumps(self.metrics.snapshot()).encode())
+                return
+
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                schedule = self.schedule(**self.options(query))
+            except (ValueError, IndexError) as error:
+                await respond("400 Bad Request", "text/plain", f"{error}\n".encode())
+                return
+
+            await respond("200 OK", "application/x-ndjson")
+            await self._replay(schedule, send)
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+
+        await _serve_connection(writer, run)
+
+async def serve(server, host, http_port=None, tcp_port=None, report_every=None, report=print):
+    """Run the HTTP and / or TCP listeners, reporting metrics every report_every seconds"""
+    listeners = []
+    if http_port is not None:
+        listeners.append(await asyncio.start_server(server.handle_http, host, http_port))
+    if tcp_port is not None:
+        listeners.append(await asyncio.start_server(server.handle_tcp, host, tcp_port))
+    try:
+        if not report_every:
+            await asyncio.Event().wait()
+        while True:
+            await asyncio.sleep(report_every)
+            report(server.metrics.snapshot())
+    finally:
+        for listener in listeners:
+            listener.close()
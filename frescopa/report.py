@@ -0,0 +1,179 @@
+"""
+Run report
+Per-stage wall time, CPU time, rows produced, rows/sec, bytes written and
+the process RSS high-water mark so far, plus the run's peak RSS, saved as
+JSON next to the outputs. Stages are opened in sequence with start()
+(which closes the previous one), so main() marks its steps with one call
+each instead of nesting them in with-blocks. Peaks come from getrusage,
+at no cost during the run. With profiling on, every stage also gets its
+own peak RSS growth (sampled in a thread), a cProfile dump and a
+tracemalloc snapshot.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+REPORT_FILE = "run_report.json"
+
+# RSS sampling period (seconds)
+SAMPLE_EVERY = 0.005
+
+# Allocation sites kept in the JSON per profiled stage
+TOP_ALLOCATIONS = 10
+
+def rss_bytes():
+    """Current resident set size (Linux /proc; 0 where unavailable)"""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def max_rss_bytes(who=resource.RUSAGE_SELF):
+    """RSS high-water mark of this process (or of its largest finished child)"""
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return resource.getrusage(who).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+class PeakRss:
+    """Track the peak RSS between start() and stop(), or while the with-block runs"""
+
+    def start(self):
+        self.base = self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_EVERY):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def _cpu_seconds():
+    """CPU time of this process plus its finished children (worker processes)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+class RunReport:
+    """Collects stage metrics and writes them as one JSON document"""
+
+    def __init__(self, config=None, profile_dir=None):
+        self.config = config or {}
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.started = datetime.now()
+        self._current = None
+        if profile_dir is not None:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self, name):
+        """Open a stage (closing the previous one)"""
+        self.finish()
+        self._current = {
+            'name': name,
+            'wall': time.perf_counter(),
+            'cpu': _cpu_seconds(),
+            'rows': 0,
+            'tables': {},
+            'files': [],
+        }
+        if self.profile_dir is not None:
+            self._current['memory'] = PeakRss().start()
+            self._current['profiler'] = cProfile.Profile()
+            tracemalloc.start()
+            self._current['profiler'].enable()
+
+    def rows(self, tables=None, **counts):
+        """Record rows produced by the open stage, per table"""
+        counts.update(tables or {})
+        self._current['tables'].update({name: int(n) for name, n in counts.items()})
+        self._current['rows'] = sum(self._current['tables'].values())
+
+    def files(self, *paths):
+        """Record files written by the open stage (sized when it closes)"""
+        self._current['files'].extend(paths)
+
+    def finish(self):
+        """Close the open stage, if any"""
+        stage, self._current = self._current, None
+        if stage is None:
+            return
+        wall = time.perf_counter() - stage['wall']
+        cpu = _cpu_seconds() - stage['cpu']
+
+        record = {
+            'stage': stage['name'],
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'max_rss_mb': round(max_rss_bytes() / 2**20, 1),
+            'rows': stage['rows'],
+            'rows_per_sec': round(stage['rows'] / wall) if wall > 0 else None,
+            'bytes_written': sum(os.path.getsize(path) for path in stage['files'] if os.path.exists(path)),
+        }
+        if stage['tables']:
+            record['tables'] = stage['tables']
+        if 'memory' in stage:
+            memory = stage['memory'].stop()
+            record['peak_rss_delta_mb'] = round((memory.peak - memory.base) / 2**20, 1)
+        if 'profiler' in stage:
+            record['profile'] = self._dump_profile(len(self.stages), stage)
+        self.stages.append(record)
+
+    def _dump_profile(self, index, stage):
+        stage['profiler'].disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        slug = re.sub('[^a-z0-9]+', '_', stage['name'].lower()).strip('_')
+        prof_path = self.profile_dir / f"{index:02d}_{slug}.prof"
+        snap_path = self.profile_dir / f"{index:02d}_{slug}.tracemalloc"
+        stage['profiler'].dump_stats(prof_path)
+        snapshot.dump(str(snap_path))
+        top = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+        return {
+            'cprofile': str(prof_path),
+            'tracemalloc': str(snap_path),
+            'top_allocations': [{'site': str(stat.traceback[0]), 'size_mb': round(stat.size / 2**20, 2),
+                                 'count': stat.count} for stat in top],
+        }
+
+    def to_dict(self):
+        self.finish()
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'argv': sys.argv[1:],
+            'python': platform.python_version(),
+            'config': self.config,
+            'total_wall_seconds': round(sum(s['wall_seconds'] for s in self.stages), 4),
+            'total_bytes_written': sum(s['bytes_written'] for s in self.stages),
+            'peak_rss_mb': round(max_rss_bytes() / 2**20, 1),
+            'peak_worker_rss_mb': round(max_rss_bytes(resource.RUSAGE_CHILDREN) / 2**20, 1),
+            'stages': self.stages,
+        }
+
+    def write(self, path):
+        """Write the report JSON (closes the open stage)"""
+        with open(path, 'w') as handle:
+            json.dump(self.to_dict(), handle, indent=2, default=str)
+            handle.write("\n")
@@ -0,0 +1,131 @@
+"""
+Compact typed tables
+Loads the Campaign tables with compact dtypes: product / brand codes and
+names as categoricals, CRM / ORD / WISH / CART keys as integers, dates as
+datetime64 and counters as the smallest int that fits. A column is only
+converted when re-rendering its distinct values gives back the exact
+text, so render() turns a compact table into the original Campaign
+strings and writing it reproduces the source file byte for byte.
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.columnar import CATEGORY_COLUMNS, TEXT_DATES, read_table
+from frescopa.export import DATE_COLUMNS, to_campaign
+from frescopa.ids import ID_PREFIXES, format_ids, id_width, parse_ids
+from frescopa.recipients import CRMID_DIGITS, CRMID_PREFIX
+from frescopa.timestamps import DATE_FORMAT, DAY_FORMAT, format_dates, format_timestamps, parse_timestamps
+
+# Integer-encoded keys: column -> prefix
+KEY_PREFIXES = {**ID_PREFIXES, 'crmid': CRMID_PREFIX, 'customer': CRMID_PREFIX}
+
+# Low-cardinality text kept as categoricals
+COMPACT_CATEGORIES = CATEGORY_COLUMNS + ['code', 'firstname', 'lastname']
+
+# Counters and scores downcast to the smallest int
+SMALL_INT_COLUMNS = ['orderline', 'quantity', 'cartnum', 'tosend', 'category', 'wishListName',
+                     'churnprop', 'nps', 'reactscore', 'vip']
+
+def _strftime(values, fmt):
+    """Render dates with a strftime format once per distinct value (NaT -> NaN)"""
+    codes, uniques = pd.factorize(pd.DatetimeIndex(values))
+    return np.append(uniques.strftime(fmt).to_numpy(dtype=object), np.nan)[codes]
+
+# Vectorized (parse, render) pairs for the common date formats
+DATE_CODECS = {
+    DATE_FORMAT: (parse_timestamps, format_timestamps),
+    DAY_FORMAT: (lambda values: parse_timestamps(values, width=10), format_dates),
+}
+
+def _parse_dates(values, fmt):
+    if fmt in DATE_CODECS:
+        return DATE_CODECS[fmt][0](values)
+    return pd.to_datetime(values, format=fmt).to_numpy()
+
+def _render_dates(values, fmt):
+    """Date strings in a format, NaT -> NaN (an empty CSV field)"""
+    if fmt not in DATE_CODECS:
+        return _strftime(values, fmt)
+    values = np.asarray(values, dtype='datetime64[m]')
+    missing = np.isnat(values)
+    rendered = DATE_CODECS[fmt][1](np.where(missing, np.datetime64(0, 'm'), values))
+    rendered[missing] = np.nan
+    return rendered
+
+def _lossless(values, parse, render, missing=None):
+    """
+    parse(values) when render() gives back every distinct value exactly,
+    else None. Missing values become `missing` (None: not convertible).
+    """
+    codes, uniques = pd.factorize(values)
+    if (codes < 0).any() and missing is None:
+        return None
+    try:
+        parsed = parse(pd.Series(uniques, dtype=object))
+    except (ValueError, TypeError):
+        return None
+    if not np.array_equal(np.asarray(render(parsed), dtype=object), np.asarray(uniques, dtype=object)):
+        return None
+    return np.append(parsed, np.array([missing], dtype=parsed.dtype) if missing is not None else parsed[:0])[codes]
+
+def _smallest_int(values):
+    """Values as int8 / int16 / int32 / int64, whichever is the first to hold them"""
+    values = np.asarray(values)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    return values.astype(np.int64)
+
+def _key_width(df, col):
+    return df.attrs.get('key_widths', {}).get(col) or (
+        CRMID_DIGITS if KEY_PREFIXES[col] == CRMID_PREFIX else id_width(df[col].max() if len(df) else None))
+
+def compact(df):
+    """
+    Compact copy of a Campaign table (rendered or typed). Key widths go to
+    df.attrs['key_widths'] for render().
+    """
+    typed = {}
+    widths = dict(df.attrs.get('key_widths', {}))
+    for col in df.columns:
+        values = df[col]
+        if col in KEY_PREFIXES and not pd.api.types.is_integer_dtype(values) and len(values):
+            prefix = KEY_PREFIXES[col]
+            width = len(str(values.iloc[0])) - len(prefix)
+            keys = _lossless(values, lambda uniques: parse_ids(uniques, prefix),
+                             lambda ids: format_ids(prefix, ids, width))
+            if keys is not None:
+                typed[col] = _smallest_int(keys)
+                widths[col] = width
+        elif (col in DATE_COLUMNS or col in TEXT_DATES) and not pd.api.types.is_datetime64_any_dtype(values):
+            fmt = TEXT_DATES.get(col, DATE_FORMAT)
+            dates = _lossless(values, lambda uniques: _parse_dates(uniques, fmt),
+                              lambda parsed: _render_dates(parsed, fmt), missing=np.datetime64('NaT'))
+            if dates is not None:
+                typed[col] = dates
+        elif col in COMPACT_CATEGORIES and not isinstance(values.dtype, pd.CategoricalDtype):
+            typed[col] = values.astype('category')
+        elif col in SMALL_INT_COLUMNS and pd.api.types.is_integer_dtype(values):
+            typed[col] = _smallest_int(values)
+    compacted = df.assign(**typed) if typed else df.copy()
+    compacted.attrs['key_widths'] = widths
+    return compacted
+
+def render(df):
+    """Campaign strings of a compact table (exact inverse of compact())"""
+    rendered = {}
+    for col in df.columns:
+        if col in KEY_PREFIXES and col not in ID_PREFIXES and pd.api.types.is_integer_dtype(df[col]):
+            rendered[col] = format_ids(KEY_PREFIXES[col], df[col], _key_width(df, col))
+        elif (col in DATE_COLUMNS or col in TEXT_DATES) and pd.api.types.is_datetime64_any_dtype(df[col]):
+            rendered[col] = _render_dates(df[col], TEXT_DATES.get(col, DATE_FORMAT))
+    id_widths = {col: _key_width(df, col) for col in ID_PREFIXES
+                 if col in df.columns and pd.api.types.is_integer_dtype(df[col])}
+    return to_campaign(df.assign(**rendered) if rendered else df, id_widths)
+
+def load_table(directory, name):
+    """Load a Campaign table (sidecar or CSV, see read_table) with compact dtypes"""
+    # Dates are parsed by compact(), once per distinct value
+    return compact(read_table(directory, name, parse_dates=False))
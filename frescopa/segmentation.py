@@ -0,0 +1,51 @@
+"""
+Internal customer segmentation (STEP 3)
+Segment, acquisition date and machine ownership drive the purchase logic
+and are never exported to recipients.csv
+"""
+
+import numpy as np
+import pandas as pd
+
+SEGMENT_DISTRIBUTION = {
+    'active_high': 0.15,
+    'active_medium': 0.20,
+    'occasional': 0.25,
+    'one_time': 0.15,
+    'lapsed': 0.15,
+    'prospect': 0.10
+}
+
+# Acquisition date windows (inclusive)
+ACQUISITION_WINDOWS = {
+    'lapsed': ('2023-01-01', '2024-06-30'),
+    'active_high': ('2023-01-01', '2025-10-31'),
+    'active_medium': ('2023-01-01', '2025-10-31'),
+    'prospect': ('2025-10-15', '2026-01-15'),
+    'occasional': ('2023-03-01', '2025-11-30'),
+    'one_time': ('2023-01-01', '2025-12-31'),
+}
+
+MACHINE_OWNERSHIP = {'active_high': 0.95, 'active_medium': 0.90, 'occasional': 0.70,
+                     'one_time': 0.40, 'lapsed': 0.80, 'prospect': 0.00}
+
+INTERNAL_COLUMNS = ['_internal_segment', '_internal_acquisition', '_internal_owns_machine']
+
+def assign_internal_segments(recipients_df, rng):
+    """Return recipients_df with the internal segment columns drawn from rng"""
+    n = len(recipients_df)
+    segments = rng.choice(list(SEGMENT_DISTRIBUTION.keys()), size=n,
+                          p=list(SEGMENT_DISTRIBUTION.values()))
+
+    window = pd.Series(segments).map(ACQUISITION_WINDOWS)
+    start = pd.to_datetime(window.str[0]).to_numpy(dtype='datetime64[D]').astype(np.int64)
+    end = pd.to_datetime(window.str[1]).to_numpy(dtype='datetime64[D]').astype(np.int64)
+    acquisition = rng.integers(start, end + 1).astype('datetime64[D]')
+
+    owns_machine = rng.random(n) < pd.Series(segments).map(MACHINE_OWNERSHIP).to_numpy()
+
+    return recipients_df.assign(
+        _internal_segment=segments,
+        _internal_acquisition=acquisition.astype('datetime64[ns]'),
+        _internal_owns_machine=owns_machine,
+    )
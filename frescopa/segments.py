@@ -0,0 +1,82 @@
+"""
+Segment scoring engine (STEP 7)
+One groupby pass over the purchases table gives per-customer aggregates,
+which are then mapped to churn / VIP / NPS / reactivity tiers vectorially
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.timestamps import DATE_FORMAT
+
+SEGMENT_COLUMNS = ['customer', 'churnprop', 'churndate', 'nps', 'npsdate',
+                   'reactscore', 'reactdate', 'vip', 'vipdate']
+
+# Scoring dates (same for every customer)
+SEGMENT_DATES = {
+    'churndate': '10/01/2026 09:00:00',
+    'npsdate': '15/12/2025 10:00:00',
+    'reactdate': '10/01/2026 10:00:00',
+    'vipdate': '30/11/2025 12:00:00',
+}
+
+# Tier boundaries (lower bound of tiers 1, 2, ...)
+CHURN_DAYS = [60, 120, 180]
+VIP_SPEND = [100, 500, 1500, 3000]
+
+# NPS choices by distinct order count
+NPS_LOYAL = np.array([8, 9, 9, 9])      # 10+ orders
+NPS_REGULAR = np.array([7, 8, 8, 9])    # 5+ orders
+NPS_DEFAULT = np.array([6, 7, 8])       # fewer orders or no purchase
+
+AGGREGATE_COLUMNS = ['last_purchase', 'orders', 'spent']
+
+def customer_aggregates(purchases_df):
+    """
+    Per-customer last purchase date, distinct order count and total spend.
+    Returns a DataFrame indexed by customer with AGGREGATE_COLUMNS.
+    """
+    dates = purchases_df['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=DATE_FORMAT)
+
+    lines = pd.DataFrame({
+        'customer': purchases_df['customer'].to_numpy(),
+        'orderref': purchases_df['orderref'].to_numpy(),
+        'date': dates.to_numpy(),
+        'spend': purchases_df['price'].to_numpy(dtype=float) * purchases_df['quantity'].to_numpy(),
+    })
+    grouped = lines.groupby('customer', sort=False)
+    return pd.DataFrame({
+        'last_purchase': grouped['date'].max(),
+        'orders': grouped['orderref'].nunique(),
+        'spent': grouped['spend'].sum(),
+    })
+
+def score_segments(crmids, aggregates, current_date, rng):
+    """Map per-customer aggregates to the segments table (one row per crmid)"""
+    stats = aggregates.reindex(pd.Index(crmids, name='customer'))
+    has_purchases = stats['orders'].notna().to_numpy()
+
+    days_since = ((pd.Timestamp(current_date) - stats['last_purchase']) // pd.Timedelta(days=1)).to_numpy()
+    orders = stats['orders'].fillna(0).to_numpy(dtype=np.int64)
+    spent = stats['spent'].fillna(0).to_numpy(dtype=float)
+
+    churnprop = np.where(has_purchases, np.digitize(np.nan_to_num(days_since), CHURN_DAYS), 0)
+    vip = np.where(has_purchases, np.digitize(spent, VIP_SPEND), -1)
+    reactscore = np.minimum(10, orders)
+
+    n = len(stats)
+    nps = NPS_DEFAULT[rng.integers(0, len(NPS_DEFAULT), n)]
+    nps = np.where(orders >= 5, NPS_REGULAR[rng.integers(0, len(NPS_REGULAR), n)], nps)
+    nps = np.where(orders >= 10, NPS_LOYAL[rng.integers(0, len(NPS_LOYAL), n)], nps)
+
+    segments_df = pd.DataFrame({
+        'customer': np.asarray(crmids),
+        'churnprop': churnprop,
+        'nps': nps,
+        'reactscore': reactscore,
+        'vip': vip,
+        **SEGMENT_DATES,
+    })
+    return segments_df[SEGMENT_COLUMNS]
@@ -0,0 +1,192 @@
+"""
+Sharded generation (STEP 4-7)
+Recipients are split into fixed-size crmid blocks; each shard generates its
+purchases, wishlist, abandoned carts and segments from its own seed stream,
+optionally in a process pool, and shard tables can be consumed one at a time
+(streaming output) or merged in memory. Shards depend only on RANDOM_SEED and the
+shard size, never on the worker count, so output is identical for any
+number of workers. Ids are shard-local and offset in shard order, which keeps
+ORD / WISH / CART ranges globally unique and contiguous.
+"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from frescopa.abandoned import ACTIVE_SEGMENTS, active_customers, generate_abandoned
+from frescopa.ids import id_width
+from frescopa.purchases import ORDER_COUNTS, generate_purchases
+from frescopa.segments import customer_aggregates, score_segments
+from frescopa.wishlist import WISHLIST_ITEMS, first_purchase_index, generate_wishlist
+
+SHARD_SIZE = 10000
+WISHLIST_FRACTION = 0.15
+
+SHARD_TABLES = ['purchases', 'wishlist', 'abandoned', 'segments']
+
+# Shard result entry that is not an output table: orders still due after CURRENT_DATE
+PENDING_ORDERS = 'pending_orders'
+SHARD_ID_COLUMNS = {'purchases': 'orderref', 'wishlist': 'wishListId', 'abandoned': 'cartid'}
+
+@dataclass(frozen=True)
+class ShardTask:
+    """Everything a worker needs to generate one shard"""
+    index: int
+    recipients: pd.DataFrame
+    catalog: object
+    current_date: datetime
+    seed: np.random.SeedSequence
+    carts_per_customer: int
+    abandoned_quota: int
+
+def plan_shards(n_recipients, shard_size=SHARD_SIZE):
+    """(start, stop) recipient row ranges of each shard"""
+    return [(start, min(start + shard_size, n_recipients))
+            for start in range(0, n_recipients, shard_size)]
+
+def split_quota(total, weights):
+    """Split an integer total proportionally to weights (largest remainder)"""
+    weights = np.asarray(weights, dtype=float)
+    if weights.sum() == 0:
+        return np.zeros(len(weights), dtype=np.int64)
+    exact = total * weights / weights.sum()
+    quota = np.floor(exact).astype(np.int64)
+    remainder = total - quota.sum()
+    quota[np.argsort(-(exact - quota), kind='stable')[:remainder]] += 1
+    return quota
+
+def generate_shard(task):
+    """
+    Generate the purchases / wishlist / abandoned / segments tables of one
+    shard, plus its pending orders (not a table: the --delta state)
+    """
+    rng = np.random.default_rng(task.seed)
+    recipients_df = task.recipients
+
+    purchases_df, pending_df = generate_purchases(recipients_df, task.catalog, task.current_date, rng,
+                                                  with_pending=True)
+
+    wishlist_candidates = recipients_df.sample(frac=WISHLIST_FRACTION, random_state=rng)
+    wishlist_df = generate_wishlist(wishlist_candidates, task.catalog,
+                                    first_purchase_index(purchases_df), task.current_date, rng)
+
+    abandoned_df = generate_abandoned(active_customers(recipients_df), task.catalog, task.current_date,
+                                      rng, task.carts_per_customer, task.abandoned_quota)
+
+    segments_df = score_segments(recipients_df['crmid'], customer_aggregates(purchases_df),
+                                 task.current_date, rng)
+
+    return {'purchases': purchases_df, 'wishlist': wishlist_df,
+            'abandoned': abandoned_df, 'segments': segments_df, PENDING_ORDERS: pending_df}
+
+def max_id_bounds(n_recipients, target_abandoned):
+    """Upper bounds of the ORD / WISH / CART ids a run can produce"""
+    return {
+        'orderref': n_recipients * max(high for _, high in ORDER_COUNTS.values()),
+        'wishListId': n_recipients * int(WISHLIST_ITEMS.max()),
+        'cartid': target_abandoned,
+    }
+
+def id_widths_for(n_recipients, target_abandoned):
+    """
+    Id widths fixed before generation starts, so streamed chunks and
+    in-memory runs render ids identically
+    """
+    return {col: id_width(bound) for col, bound in max_id_bounds(n_recipients, target_abandoned).items()}
+
+def shard_seed(seed, index):
+    """
+    Seed stream of shard index, keyed by (seed, index): the same stream as
+    SeedSequence(seed).spawn(n)[index], without spawning the others
+    """
+    return np.random.SeedSequence(seed, spawn_key=(index,))
+
+def shard_tasks(recipients_df, catalog, current_date, seed, target_abandoned, shard_size=SHARD_SIZE, indices=None):
+    """Lazily build one ShardTask per recipient block (only the blocks in indices, if given)"""
+    shards = plan_shards(len(recipients_df), shard_size)
+
+    # Abandoned cart volume is shared out by active customers per shard
+    active = recipients_df['_internal_segment'].isin(ACTIVE_SEGMENTS).to_numpy()
+    active_per_shard = [int(active[start:stop].sum()) for start, stop in shards]
+    carts_per_customer = max(1, target_abandoned // max(sum(active_per_shard), 1))
+    quotas = split_quota(target_abandoned, active_per_shard)
+
+    for i in range(len(shards)) if indices is None else indices:
+        start, stop = shards[i]
+        yield ShardTask(i, recipients_df.iloc[start:stop], catalog, current_date, shard_seed(seed, i),
+                        carts_per_customer, int(quotas[i]))
+
+def _run_tasks(tasks, workers, cache=None):
+    """
+    Shard results in shard order, with at most 2 x workers shards in flight.
+    With a StageCache, shards whose task was generated before are loaded
+    instead of recomputed, and fresh ones are stored.
+    """
+    def lookup(task):
+        key = cache.key('shard', task) if cache is not None else None
+        cached = cache.load(key) if key is not None else None
+        if cache is not None:
+            cache.record('shard', cached is not None)
+        return key, cached
+
+    def keep(key, result):
+        if key is not None:
+            cache.store(key, result)
+        return result
+
+    if workers <= 1:
+        for task in tasks:
+            key, cached = lookup(task)
+            yield cached if cached is not None else keep(key, generate_shard(task))
+        return
+
+    # fork keeps workers from re-running the calling script where available
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+
+        def finish():
+            key, cached, future = pending.popleft()
+            return cached if future is None else keep(key, future.result())
+
+        for task in tasks:
+            key, cached = lookup(task)
+            pending.append((key, cached, None if cached is not None else pool.submit(generate_shard, task)))
+            if len(pending) >= 2 * workers:
+                yield finish()
+        while pending:
+            yield finish()
+
+def iter_shards(recipients_df, catalog, current_date, seed, target_abandoned,
+                workers=1, shard_size=SHARD_SIZE, cache=None):
+    """
+    Yield shard tables in shard order with global ids.
+    Only the id counters carry over from one shard to the next: shards
+    partition customers, so per-customer aggregates are complete per shard.
+    """
+    tasks = shard_tasks(recipients_df, catalog, current_date, seed, target_abandoned, shard_size)
+    offsets = {name: 0 for name in SHARD_ID_COLUMNS}
+
+    for result in _run_tasks(tasks, workers, cache):
+        for name, id_col in SHARD_ID_COLUMNS.items():
+            df = result[name]
+            if len(df) > 0:
+                result[name] = df.assign(**{id_col: df[id_col].to_numpy() + offsets[name]})
+                offsets[name] = int(result[name][id_col].max())
+        yield result
+
+def generate_sharded(recipients_df, catalog, current_date, seed, target_abandoned,
+                     workers=1, shard_size=SHARD_SIZE):
+    """
+    Generate all shard tables and merge them in memory.
+    recipients_df must already carry the internal segment columns.
+    """
+    results = list(iter_shards(recipients_df, catalog, current_date, seed, target_abandoned,
+                               workers, shard_size))
+    return {name: pd.concat([result[name] for result in results], ignore_index=True)
+            for name in SHARD_TABLES}
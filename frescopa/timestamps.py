@@ -0,0 +1,98 @@
+"""
+Vectorized timestamps
+Samples realistic times of day as arrays and renders the CSV date format
+(dd/mm/yyyy HH:MM) in bulk instead of one strftime per row
+"""
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%d/%m/%Y %H:%M'
+DAY_FORMAT = '%d/%m/%Y'
+
+# (probability, hours) - morning, afternoon, evening, night
+HOUR_BUCKETS = [
+    (0.25, list(range(6, 12))),
+    (0.35, list(range(12, 18))),
+    (0.30, list(range(18, 22))),
+    (0.10, list(range(22, 24)) + list(range(0, 6))),
+]
+
+_BUCKET_P = np.array([p for p, _ in HOUR_BUCKETS])
+_BUCKET_SIZE = np.array([len(hours) for _, hours in HOUR_BUCKETS])
+_BUCKET_START = np.r_[0, np.cumsum(_BUCKET_SIZE)[:-1]]
+_BUCKET_HOURS = np.concatenate([hours for _, hours in HOUR_BUCKETS])
+
+def sample_minutes(rng, n):
+    """Draw n realistic times of day as minutes since midnight"""
+    bucket = rng.choice(len(HOUR_BUCKETS), size=n, p=_BUCKET_P)
+    offset = (rng.random(n) * _BUCKET_SIZE[bucket]).astype(np.int64)
+    hour = _BUCKET_HOURS[_BUCKET_START[bucket] + offset]
+    minute = rng.integers(0, 60, n)
+    return hour * 60 + minute
+
+def add_times(days, rng, groups=None):
+    """
+    Add a realistic time of day to day-precision dates.
+    Rows sharing a group key (orderref, cartid...) share one time.
+    """
+    days = np.asarray(days, dtype='datetime64[D]')
+    if groups is None:
+        minutes = sample_minutes(rng, len(days))
+    else:
+        codes, uniques = pd.factorize(np.asarray(groups))
+        minutes = sample_minutes(rng, len(uniques))[codes]
+    return days.astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+
+def _render(minutes, width=16):
+    """
+    dd/mm/yyyy HH:MM strings for int64 minutes since epoch, built digit by digit.
+    width=10 keeps the dd/mm/yyyy part only.
+    """
+    stamps = minutes.astype('datetime64[m]')
+    year = stamps.astype('datetime64[Y]').astype(np.int64) + 1970
+    month_start = stamps.astype('datetime64[M]')
+    month = month_start.astype(np.int64) % 12 + 1
+    day = (stamps.astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64) + 1
+    hour = (minutes // 60) % 24
+    minute = minutes % 60
+
+    chars = np.empty((len(minutes), 16), dtype=np.uint8)
+    for col, value, digits in [(0, day, 2), (3, month, 2), (6, year, 4), (11, hour, 2), (14, minute, 2)]:
+        for digit in range(digits):
+            chars[:, col + digits - 1 - digit] = ord('0') + (value // 10 ** digit) % 10
+    chars[:, [2, 5]] = ord('/')
+    chars[:, 10] = ord(' ')
+    chars[:, 13] = ord(':')
+    chars = np.ascontiguousarray(chars[:, :width])
+    return chars.view(f'S{width}').ravel().astype(str).astype(object)
+
+def parse_timestamps(values, width=16):
+    """
+    dd/mm/yyyy HH:MM strings back to datetime64[m] in bulk (inverse of
+    _render); width=10 parses dd/mm/yyyy dates. Input is not validated.
+    """
+    chars = np.asarray(values, dtype=f'S{width}').view(np.uint8).reshape(-1, width).astype(np.int64) - ord('0')
+
+    def number(col, digits):
+        return sum(chars[:, col + i] * 10 ** (digits - 1 - i) for i in range(digits))
+
+    months = (number(6, 4) - 1970) * 12 + number(3, 2) - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (number(0, 2) - 1)
+    minutes = days.astype('datetime64[m]')
+    if width > 10:
+        minutes += (number(11, 2) * 60 + number(14, 2)).astype('timedelta64[m]')
+    return minutes
+
+def format_timestamps(values):
+    """Render datetime values as dd/mm/yyyy HH:MM strings in bulk"""
+    minutes = np.asarray(values, dtype='datetime64[m]').astype(np.int64)
+    # Each distinct minute is rendered once, rows share the string objects
+    codes, uniques = pd.factorize(minutes)
+    return _render(np.asarray(uniques, dtype=np.int64))[codes]
+
+def format_dates(values):
+    """Render dates as dd/mm/yyyy strings in bulk (birthdates)"""
+    days = np.asarray(values, dtype='datetime64[D]').astype(np.int64)
+    codes, uniques = pd.factorize(days)
+    return _render(np.asarray(uniques, dtype=np.int64) * 1440, width=10)[codes]
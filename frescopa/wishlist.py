@@ -0,0 +1,87 @@
+"""
+Vectorized wishlist engine (STEP 5)
+Wishlist dates come from a precomputed (customer, product) -> first purchase
+index instead of re-filtering the purchases table per customer
+"""
+
+import numpy as np
+import pandas as pd
+
+from frescopa.catalog import ACCESSORY, MACHINE
+from frescopa.purchases import sample_without_replacement, to_days
+from frescopa.timestamps import DATE_FORMAT, add_times
+
+WISHLIST_COLUMNS = ['wishListId', 'wishListName', 'lastUpdate', 'creationDate', 'product', 'customer']
+
+WISHLIST_ITEMS = np.array([1, 1, 2])
+DAYS_BEFORE_PURCHASE = (7, 90)    # wishlist precedes the first purchase
+RECENT_WINDOW_DAYS = 180          # not bought yet: created in the last 6 months
+UPDATE_DAYS = (0, 30)
+WISHLIST_NAMES = (0, 5)
+
+def first_purchase_index(purchases_df):
+    """(customer, product) -> first purchase timestamp, as a MultiIndex Series"""
+    dates = purchases_df['date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=DATE_FORMAT)
+    lines = pd.DataFrame({
+        'customer': purchases_df['customer'].to_numpy(),
+        'product': purchases_df['product'].to_numpy(),
+        'date': dates.to_numpy(),
+    })
+    return lines.groupby(['customer', 'product'], sort=False)['date'].min()
+
+def lookup_first_purchase(index, customers, products):
+    """Vectorized index lookup, NaT where the customer never bought the product"""
+    keys = pd.MultiIndex.from_arrays([np.asarray(customers), np.asarray(products)])
+    return index.reindex(keys).to_numpy(dtype='datetime64[ns]')
+
+def generate_wishlist(candidates_df, catalog, first_purchases, current_date, rng, first_wish_id=1):
+    """
+    Generate wishlist items for the sampled candidate customers in one batch.
+    Machines and accessories are wishable, purchased or not, so wishlist ->
+    purchase conversion can be tracked. Dates are returned as datetime64
+    and wishListId as sequential integers.
+    """
+    # Get all machines and accessories (don't filter out purchased items!)
+    available = np.r_[catalog.positions(MACHINE), catalog.positions(ACCESSORY)]
+    n = len(candidates_df)
+    if n == 0 or len(available) == 0:
+        return pd.DataFrame(columns=WISHLIST_COLUMNS)
+
+    num_items = WISHLIST_ITEMS[rng.integers(0, len(WISHLIST_ITEMS), n)]
+    picks = sample_without_replacement(rng, len(available), num_items)
+    customer_idx, slot = np.nonzero(picks >= 0)
+    products = catalog.codes[available[picks[customer_idx, slot]]]
+    crmids = candidates_df['crmid'].to_numpy()[customer_idx]
+    acquisition = to_days(candidates_df['_internal_acquisition'])[customer_idx]
+    current_day = to_days([current_date])[0]
+    n_items = len(products)
+
+    # If the customer bought this product, wishlist was added BEFORE first purchase (aspirational)
+    first_purchase = lookup_first_purchase(first_purchases, crmids, products)
+    bought = ~np.isnat(first_purchase)
+    first_day = np.where(bought, first_purchase.astype('datetime64[D]').astype(np.int64), current_day)
+    before = first_day - rng.integers(
+        DAYS_BEFORE_PURCHASE[0], DAYS_BEFORE_PURCHASE[1] + 1, n_items)
+    before = np.maximum(before, acquisition)
+
+    # If not bought yet, wishlist is recent (last 6 months)
+    recent_start = np.maximum(acquisition, current_day - RECENT_WINDOW_DAYS)
+    recent = rng.integers(recent_start, np.maximum(recent_start, current_day) + 1)
+
+    creation_day = np.where(bought, before, recent)
+    update_day = np.minimum(creation_day + rng.integers(UPDATE_DAYS[0], UPDATE_DAYS[1] + 1, n_items), current_day)
+
+    creation = add_times(creation_day.astype('datetime64[D]'), rng)
+    last_update = np.maximum(add_times(update_day.astype('datetime64[D]'), rng), creation)
+
+    wish_ids = first_wish_id + np.arange(n_items)
+    return pd.DataFrame({
+        'wishListId': wish_ids,
+        'wishListName': rng.integers(WISHLIST_NAMES[0], WISHLIST_NAMES[1] + 1, n_items),
+        'lastUpdate': last_update,
+        'creationDate': creation,
+        'product': products,
+        'customer': crmids,
+    }, columns=WISHLIST_COLUMNS)
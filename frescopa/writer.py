@@ -0,0 +1,96 @@
+"""
+Streaming CSV writer
+Appends Campaign-rendered chunks to the ';' separated latin-1 CSVs as they
+are generated, so memory is bounded by the chunk size instead of the
+total output size. Compressed output (.csv.gz / .csv.zst) goes through a
+BlockWriter, one compressed block per BLOCK_ROWS rows.
+"""
+
+from frescopa.columnar import ChunkedColumnarWriter, columnar_path
+from frescopa.compression import BLOCK_ROWS, COMPRESSIONS, BlockWriter
+from frescopa.export import CSV_OPTIONS, to_campaign
+
+class ChunkedCsvWriter:
+    """Append DataFrame chunks to one Campaign CSV (header written once)"""
+
+    def __init__(self, path, id_widths=None, compression=None):
+        self.path = path
+        self.id_widths = id_widths
+        self.rows = 0
+        self._header = True
+        self._handle = None
+        self._blocks = None
+        if compression:
+            self.path = path.with_name(path.name + COMPRESSIONS[compression])
+            self._blocks = BlockWriter(self.path, compression)
+        else:
+            self._handle = open(path, 'w', encoding=CSV_OPTIONS['encoding'], newline='')
+
+    def write(self, df):
+        options = {k: v for k, v in CSV_OPTIONS.items() if k != 'encoding'}
+        rendered = to_campaign(df, self.id_widths)
+        if self._blocks is None:
+            rendered.to_csv(self._handle, header=self._header, **options)
+        else:
+            # Render here, compress in the pool
+            for start in range(0, max(len(rendered), 1), BLOCK_ROWS):
+                block = rendered.iloc[start:start + BLOCK_ROWS].to_csv(header=self._header, **options)
+                self._blocks.submit(block.encode(CSV_OPTIONS['encoding']))
+                self._header = False
+        self._header = False
+        self.rows += len(df)
+
+    def close(self):
+        if self._blocks is not None:
+            self._blocks.close()
+        else:
+            self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TableWriters:
+    """
+    One ChunkedCsvWriter per table (plus a columnar sidecar writer when a
+    columnar format is given), opened together and closed together
+    """
+
+    def __init__(self, directory, names, id_widths, columnar=None, vocabulary=None, compression=None):
+        self.writers = {name: ChunkedCsvWriter(directory / f"{name}.csv", id_widths, compression)
+                        for name in names}
+        self.sidecars = {}
+        if columnar:
+            self.sidecars = {name: ChunkedColumnarWriter(columnar_path(directory, name, columnar), columnar,
+                                                         id_widths, vocabulary)
+                             for name in names}
+
+    def write(self, tables):
+        for name, writer in self.writers.items():
+            writer.write(tables[name])
+        for name, writer in self.sidecars.items():
+            writer.write(tables[name])
+
+    def rows(self, name):
+        return self.writers[name].rows
+
+    def paths(self):
+        return [writer.path for writer in [*self.writers.values(), *self.sidecars.values()]]
+
+    def close(self):
+        for writer in [*self.writers.values(), *self.sidecars.values()]:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_csv(df, directory, name, id_widths=None, compression=None):
+    """Write a whole table as a Campaign CSV, compressed when requested"""
+    with ChunkedCsvWriter(directory / f"{name}.csv", id_widths, compression) as writer:
+        writer.write(df)
+    return writer.path
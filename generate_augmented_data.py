@@ -6,646 +6,404 @@ MAINTAINS EXACT SAME STRUCTURE AS ORIGINAL - Only adds volume!
 
 Current Date: January 15, 2026
 Business Timeline: Jan 2023 - Jan 2026 (3 years)
+
+Importing this module has no side effects: run main(), or use
+frescopa.pipeline for lazy per-table iterators without any file output.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
 from pathlib import Path
 
+from frescopa.abandoned import ABANDONED_COLUMNS
+from frescopa.aggregates import AGGREGATES_FILE, AggregateCollector, save_aggregates
+from frescopa.batches import MANIFEST_FILE, parse_size, split_directory
+from frescopa.cache import CACHE_DIR, CACHE_LIMIT, StageCache
+from frescopa.catalog import build_catalog
+from frescopa.columnar import COLUMNAR_FORMATS, columnar_path, read_table, write_columnar
+from frescopa.compression import COMPRESSIONS, compressor
+from frescopa.customers import SHARD_INDEX_FILE, ShardIndexCollector, save_shard_index
+from frescopa.delta import STATE_FILE, StateCollector, generate_delta, load_state, save_state, state_id_widths
+from frescopa.integrity import IntegrityChecker
+from frescopa.pipeline import BUSINESS_START, CURRENT_DATE, NEW_PRODUCTS, RANDOM_SEED, Pipeline
+from frescopa.purchases import PURCHASE_COLUMNS
+from frescopa.recipients import RECIPIENT_COLUMNS
+from frescopa.report import REPORT_FILE, RunReport
+from frescopa.segments import SEGMENT_COLUMNS
+from frescopa.sharding import PENDING_ORDERS, SHARD_SIZE, SHARD_TABLES, plan_shards
+from frescopa.wishlist import WISHLIST_COLUMNS
+from frescopa.writer import TableWriters, write_csv
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-# Paths
-DATA_SAMPLE_DIR = Path("data-sample")
+# Paths (the sample directory, timeline, target volumes, seed and STEP 2
+# products are the frescopa/pipeline.py defaults)
 DATA_AUGMENTED_DIR = Path("data-augmented")
-
-# Timeline
-CURRENT_DATE = datetime(2026, 1, 15)
-BUSINESS_START = datetime(2023, 1, 1)
-
-# Target volumes
-TARGET_PRODUCTS = 20
-TARGET_PURCHASES_ORDERS = 90000
-TARGET_WISHLIST = 4500
-TARGET_ABANDONED = 10000
-
-# Random seed for reproducibility
-RANDOM_SEED = 42
-random.seed(RANDOM_SEED)
-np.random.seed(RANDOM_SEED)
-
-print("="*80)
-print("🚀 FRESCOPA DATA GENERATOR")
-print("="*80)
-print(f"Current Date: {CURRENT_DATE.strftime('%B %d, %Y')}")
-print(f"Business Period: {BUSINESS_START.strftime('%Y')} - {CURRENT_DATE.strftime('%Y')}")
-print(f"⚠️  MAINTAINS EXACT SAME STRUCTURE - Only adds volume!")
-print("="*80)
-
-# ============================================================================
-# UTILITY FUNCTIONS
-# ============================================================================
-
-def random_date(start_date, end_date):
-    """Generate random date between start and end"""
-    if start_date >= end_date:
-        return start_date
-    delta = end_date - start_date
-    random_days = random.randint(0, delta.days)
-    return start_date + timedelta(days=random_days)
-
-def add_realistic_time(date_obj):
-    """Add realistic hour/minute to date"""
-    rand = random.random()
-    if rand < 0.25:
-        hour = random.randint(6, 11)
-    elif rand < 0.60:
-        hour = random.randint(12, 17)
-    elif rand < 0.90:
-        hour = random.randint(18, 21)
-    else:
-        hour = random.choice(list(range(22, 24)) + list(range(0, 6)))
-    minute = random.randint(0, 59)
-    return date_obj.replace(hour=hour, minute=minute, second=0)
-
-def format_date(date_obj):
-    """Format date in CSV format: dd/mm/yyyy HH:MM"""
-    if isinstance(date_obj, str):
-        return date_obj
-    date_with_time = add_realistic_time(date_obj)
-    return date_with_time.strftime('%d/%m/%Y %H:%M')
-
-def apply_seasonality(base_date):
-    """Apply seasonal patterns"""
-    month = base_date.month
-    if month in [9, 10, 11, 12, 1, 2]:
-        if random.random() < 0.25:
-            base_date = base_date - timedelta(days=random.randint(5, 10))
-        if month in [12, 1] and random.random() < 0.15:
-            base_date = base_date - timedelta(days=random.randint(3, 7))
-    elif month in [6, 7, 8]:
-        if random.random() < 0.20:
-            base_date = base_date + timedelta(days=random.randint(5, 15))
-    return base_date
-
-# ============================================================================
-# STEP 1: LOAD EXISTING DATA
-# ============================================================================
-
-print("\n📂 STEP 1: Loading existing data...")
-
-brands_df = pd.read_csv(DATA_SAMPLE_DIR / "brands.csv", sep=';', encoding='latin-1')
-brand_names = brands_df['name'].tolist()
-print(f"   ✓ brands.csv: {len(brands_df)} rows - {list(brands_df.columns)}")
-
-products_df = pd.read_csv(DATA_SAMPLE_DIR / "products.csv", sep=';', encoding='latin-1')
-print(f"   ✓ products.csv: {len(products_df)} rows - {list(products_df.columns)}")
-
-recipients_df = pd.read_csv(DATA_SAMPLE_DIR / "recipients.csv", sep=';', encoding='latin-1')
-print(f"   ✓ recipients.csv: {len(recipients_df)} rows - {list(recipients_df.columns)}")
-
-# Cache for FK validation
-recipient_crmids = recipients_df['crmid'].tolist()
-
-# ============================================================================
-# STEP 2: GENERATE NEW PRODUCTS (Same structure!)
-# ============================================================================
-
-print("\n☕ STEP 2: Generating new products (same structure)...")
-
-# EXACT COLUMNS: code, priceref, category, description, brand, imageurl
-new_products = [
-    {'code': 'RomaRoast', 'priceref': 11.50, 'category': 1, 'description': 'Roma Roast (9/10)', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'MilanoMagic', 'priceref': 12.00, 'category': 1, 'description': 'Milano Magic (8/10)', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'CapriCappuccino', 'priceref': 11.00, 'category': 1, 'description': 'Capri Cappuccino (6/10)', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'AmericanoBliss', 'priceref': 10.50, 'category': 1, 'description': 'Americano Bliss (7/10)', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'DecafDelight', 'priceref': 11.00, 'category': 1, 'description': 'Decaf Delight (5/10)', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'HazelnutHeaven', 'priceref': 12.50, 'category': 1, 'description': 'Hazelnut Heaven (7/10)', 'brand': 'javajunction', 'imageurl': ''},
-    {'code': 'ChocolateCharm', 'priceref': 13.00, 'category': 1, 'description': 'Chocolate Charm (8/10)', 'brand': 'javajunction', 'imageurl': ''},
-    {'code': 'IntenseIndulgence', 'priceref': 14.00, 'category': 1, 'description': 'Intense Indulgence (13/13)', 'brand': 'javajunction', 'imageurl': ''},
-    {'code': 'DescaleKit', 'priceref': 19.00, 'category': 4, 'description': 'Descaling Kit', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'CapsuleHolder', 'priceref': 29.00, 'category': 4, 'description': 'Rotating Capsule Holder', 'brand': 'coffeeworks', 'imageurl': ''},
-    {'code': 'MilkFrother', 'priceref': 89.00, 'category': 4, 'description': 'Milk Frother', 'brand': 'javajunction', 'imageurl': ''},
-    {'code': 'TravelMug', 'priceref': 24.00, 'category': 4, 'description': 'Insulated Travel Mug', 'brand': 'javajunction', 'imageurl': ''},
-]
-
-new_products_df = pd.DataFrame(new_products)
-products_df = pd.concat([products_df, new_products_df], ignore_index=True)
-product_codes = products_df['code'].tolist()
-
-print(f"   ✓ Added {len(new_products)} new products")
-print(f"   ✓ Total products: {len(products_df)}")
-
-# ============================================================================
-# STEP 3: INTERNAL CUSTOMER SEGMENTATION (for logic, not exported!)
-# ============================================================================
-
-print("\n👥 STEP 3: Assigning internal segments (for purchase logic)...")
-
-# Internal fields - NOT exported to recipients.csv!
-segment_distribution = {
-    'active_high': 0.15,
-    'active_medium': 0.20,
-    'occasional': 0.25,
-    'one_time': 0.15,
-    'lapsed': 0.15,
-    'prospect': 0.10
-}
-
-recipients_df['_internal_segment'] = np.random.choice(
-    list(segment_distribution.keys()),
-    size=len(recipients_df),
-    p=list(segment_distribution.values())
-)
-
-# Assign acquisition dates (internal)
-def assign_acquisition_date(segment):
-    if segment == 'lapsed':
-        return random_date(datetime(2023, 1, 1), datetime(2024, 6, 30))
-    elif segment in ['active_high', 'active_medium']:
-        return random_date(datetime(2023, 1, 1), datetime(2025, 10, 31))
-    elif segment == 'prospect':
-        return random_date(datetime(2025, 10, 15), datetime(2026, 1, 15))
-    elif segment == 'occasional':
-        return random_date(datetime(2023, 3, 1), datetime(2025, 11, 30))
+BATCH_DIR = DATA_AUGMENTED_DIR / "batches"
+
+def parse_args(argv=None):
+    # Parallelism: output is identical for any number of workers
+    parser = argparse.ArgumentParser(description="Frescopa demo data generator")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for STEP 4-7 (default: 1)")
+    parser.add_argument('--stream', action='store_true',
+                        help="append each shard to the CSVs as it is generated (bounded memory)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="recipient base as a multiple of the sample recipients (default: 1)")
+    parser.add_argument('--columnar', choices=sorted(COLUMNAR_FORMATS),
+                        help="also write a typed Parquet / Feather copy of each table")
+    parser.add_argument('--compress', choices=sorted(COMPRESSIONS),
+                        help="write .csv.gz / .csv.zst files, compressed in parallel blocks")
+    parser.add_argument('--delta', type=int, metavar='DAYS',
+                        help="advance the persisted state by DAYS days and write only the delta files")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, type=Path,
+                        help=f"stage cache directory (default: {CACHE_DIR})")
+    parser.add_argument('--cache-size', default=CACHE_LIMIT, type=parse_size, metavar='SIZE',
+                        help=f"stage cache size cap, least recently used entries deleted first "
+                             f"(e.g. 500M, default: {CACHE_LIMIT >> 30}G)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="recompute every stage instead of reusing cached results")
+    parser.add_argument('--batch-rows', type=int, metavar='ROWS',
+                        help="also split each table into import batches of at most ROWS rows (in batches/)")
+    parser.add_argument('--batch-size', type=parse_size, metavar='SIZE',
+                        help="also split each table into import batches of at most SIZE bytes (e.g. 256M)")
+    parser.add_argument('--profile', action='store_true',
+                        help="also sample peak RSS growth and capture a cProfile dump and tracemalloc snapshot per step")
+    args = parser.parse_args(argv)
+
+    # A delta advances the state by at least one day (0 is not a full run)
+    if args.delta is not None and args.delta < 1:
+        parser.error(f"--delta must be at least 1 day, not {args.delta}")
+
+    # Fail before STEP 1, not at STEP 9, when the codec is not installed
+    if args.compress:
+        try:
+            compressor(args.compress)
+        except ImportError as error:
+            parser.error(str(error))
+    return args
+
+def run_delta(args, report):
+    """DELTA MODE: advance the persisted state by args.delta days, write only the delta files"""
+    compression = args.compress
+    csv_suffix = ".csv" + COMPRESSIONS.get(compression, "")
+
+    report.start("delta")
+    state = load_state(DATA_AUGMENTED_DIR / STATE_FILE)
+    start_date = np.datetime64(int(state['current_day']), 'D')
+    print(f"\n📅 DELTA: {start_date} + {args.delta} day(s) for {len(state['crmid']):,} customers...")
+
+    catalog = build_catalog(read_table(DATA_AUGMENTED_DIR, "products"))
+    tables, state = generate_delta(state, catalog, args.delta)
+
+    # Delta files only: new purchases / wishlist / abandoned, changed segments
+    delta_dir = DATA_AUGMENTED_DIR / f"delta-{pd.Timestamp(np.datetime64(int(state['current_day']), 'D')):%Y%m%d}"
+    delta_dir.mkdir(exist_ok=True)
+    for name in SHARD_TABLES:
+        report.files(write_csv(tables[name], delta_dir, name, state_id_widths(state), compression))
+        print(f"   ✓ {name}{csv_suffix}: {len(tables[name]):,} rows")
+    report.rows({name: len(df) for name, df in tables.items()})
+
+    save_state(state, DATA_AUGMENTED_DIR / STATE_FILE)
+    report.write(delta_dir / REPORT_FILE)
+    print(f"\n📁 Delta written to: {delta_dir}/ (state advanced to {np.datetime64(int(state['current_day']), 'D')})")
+
+def main(argv=None):
+    args = parse_args(argv)
+    NUM_WORKERS = args.workers
+    STREAM_OUTPUT = args.stream
+    COLUMNAR_FORMAT = args.columnar
+    COMPRESSION = args.compress
+    CSV_SUFFIX = ".csv" + COMPRESSIONS.get(COMPRESSION, "")
+    DELTA_DAYS = args.delta
+
+    # Stage results are cached by a hash of their inputs (tables, config, RNG
+    # state, frescopa sources): reruns only recompute what changed
+    cache = StageCache(args.cache_dir, enabled=not args.no_cache and DELTA_DAYS is None, limit=args.cache_size)
+
+    # STEP 1-7 run lazily in the pipeline; the scale factor applies to the
+    # recipient base and the abandoned cart target
+    pipeline = Pipeline(scale=args.scale, workers=NUM_WORKERS, cache=cache)
+    RECIPIENT_SCALE = pipeline.scale
+    TARGET_ABANDONED = pipeline.target_abandoned
+
+    # Per-step metrics, written to run_report.json next to the outputs
+    report = RunReport(
+        config={'current_date': CURRENT_DATE, 'random_seed': RANDOM_SEED, 'scale': RECIPIENT_SCALE,
+                'target_abandoned': TARGET_ABANDONED, 'workers': NUM_WORKERS, 'stream': STREAM_OUTPUT,
+                'columnar': COLUMNAR_FORMAT, 'compress': COMPRESSION, 'delta_days': DELTA_DAYS,
+                'batch_rows': args.batch_rows, 'batch_size': args.batch_size},
+        profile_dir=DATA_AUGMENTED_DIR / "profile" if args.profile else None)
+
+    print("="*80)
+    print("🚀 FRESCOPA DATA GENERATOR")
+    print("="*80)
+    print(f"Current Date: {CURRENT_DATE.strftime('%B %d, %Y')}")
+    print(f"Business Period: {BUSINESS_START.strftime('%Y')} - {CURRENT_DATE.strftime('%Y')}")
+    print(f"⚠️  MAINTAINS EXACT SAME STRUCTURE - Only adds volume!")
+    print("="*80)
+
+    if DELTA_DAYS is not None:
+        run_delta(args, report)
+        return
+
+    # ============================================================================
+    # STEP 1: LOAD EXISTING DATA
+    # ============================================================================
+
+    print("\n📂 STEP 1: Loading existing data...")
+    report.start("STEP 1: load")
+
+    brands_df = pipeline.brands
+    brand_names = brands_df['name'].tolist()
+    print(f"   ✓ brands.csv: {len(brands_df)} rows - {list(brands_df.columns)}")
+
+    products_df = pipeline.sample_products
+    print(f"   ✓ products.csv: {len(products_df)} rows - {list(products_df.columns)}")
+
+    recipients_df = pipeline.sample_recipients
+    print(f"   ✓ recipients.csv: {len(recipients_df)} rows - {list(recipients_df.columns)}")
+
+    if RECIPIENT_SCALE != 1:
+        recipients_df = pipeline.scaled_recipients
+        print(f"   ✓ Scaled recipients x{RECIPIENT_SCALE:g}: {len(recipients_df):,} rows")
+
+    # Cache for FK validation
+    recipient_crmids = recipients_df['crmid'].tolist()
+    report.rows(brands=len(brands_df), products=len(products_df), recipients=len(recipients_df))
+
+    # ============================================================================
+    # STEP 2: GENERATE NEW PRODUCTS (Same structure!)
+    # ============================================================================
+
+    print("\n☕ STEP 2: Generating new products (same structure)...")
+    report.start("STEP 2: products")
+
+    # EXACT COLUMNS: code, priceref, category, description, brand, imageurl
+    products_df = pipeline.products
+    product_codes = products_df['code'].tolist()
+
+    # Immutable code -> price / category index used by all later steps
+    catalog = pipeline.catalog
+
+    print(f"   ✓ Added {len(NEW_PRODUCTS)} new products")
+    print(f"   ✓ Total products: {len(products_df)}")
+    report.rows(products=len(products_df))
+
+    # ============================================================================
+    # STEP 3: INTERNAL CUSTOMER SEGMENTATION (for logic, not exported!)
+    # ============================================================================
+
+    print("\n👥 STEP 3: Assigning internal segments (for purchase logic)...")
+    report.start("STEP 3: segmentation")
+
+    # Internal fields - NOT exported to recipients.csv!
+    # (segment, acquisition date, machine ownership - see frescopa/segmentation.py)
+    recipients_df = pipeline.recipients
+
+    print(f"   ✓ Internal segments assigned (not exported to CSV)")
+    report.rows(recipients=len(recipients_df))
+
+    # ============================================================================
+    # STEP 4-7: GENERATE PURCHASES, WISHLIST, ABANDONED CARTS, SEGMENTS
+    # ============================================================================
+
+    num_shards = len(plan_shards(len(recipients_df)))
+    print(f"\n⚙️  STEP 4-7: Generating activity tables ({num_shards} shards of {SHARD_SIZE:,} recipients, {NUM_WORKERS} workers)...")
+    report.start("STEP 4-7: activity" + (" (streamed, incl. writing)" if STREAM_OUTPUT else ""))
+
+    # Id widths are fixed up front so streamed and in-memory output are identical
+    id_widths = pipeline.id_widths
+    shards = pipeline.shards()
+
+    # Integrity checks (STEP 8) run on every chunk of generated rows
+    integrity = IntegrityChecker({'brands': brand_names, 'recipients': recipient_crmids, 'products': product_codes})
+    integrity.check({'products': products_df, 'recipients': recipients_df})
+
+    # Columnar sidecars share one category dictionary per code column
+    columnar_vocabulary = {'product': catalog.codes, 'brand': brand_names}
+
+    # Per-customer state for incremental deltas (--delta)
+    collector = StateCollector(catalog)
+
+    # Per-shard id offsets, so single customers can be regenerated (frescopa.customers)
+    shard_index = ShardIndexCollector(recipients_df)
+
+    # Report aggregates for verify_data.py, saved next to the tables
+    aggregator = AggregateCollector(catalog)
+    aggregator.add({'products': products_df, 'recipients': recipients_df[RECIPIENT_COLUMNS]})
+
+    table_rows = {}
+    if STREAM_OUTPUT:
+        # Each shard is validated and appended to the CSVs, then dropped
+        DATA_AUGMENTED_DIR.mkdir(exist_ok=True)
+        num_orders = 0
+        with TableWriters(DATA_AUGMENTED_DIR, SHARD_TABLES, id_widths,
+                          COLUMNAR_FORMAT, columnar_vocabulary, COMPRESSION) as writers:
+            for shard in shards:
+                collector.add_pending(shard.pop(PENDING_ORDERS))
+                integrity.check(shard)
+                collector.add(shard)
+                shard_index.add(shard)
+                aggregator.add(shard)
+                writers.write(shard)
+                num_orders += shard['purchases']['orderref'].nunique()
+        table_rows = {name: writers.rows(name) for name in SHARD_TABLES}
+        report.files(*writers.paths())
     else:
-        return random_date(datetime(2023, 1, 1), datetime(2025, 12, 31))
-
-recipients_df['_internal_acquisition'] = recipients_df['_internal_segment'].apply(assign_acquisition_date)
-
-# Machine ownership (internal)
-def assign_machine_ownership(segment):
-    prob = {'active_high': 0.95, 'active_medium': 0.90, 'occasional': 0.70,
-            'one_time': 0.40, 'lapsed': 0.80, 'prospect': 0.00}
-    return random.random() < prob.get(segment, 0.50)
-
-recipients_df['_internal_owns_machine'] = recipients_df['_internal_segment'].apply(assign_machine_ownership)
-
-print(f"   ✓ Internal segments assigned (not exported to CSV)")
-
-# ============================================================================
-# STEP 4: GENERATE PURCHASES (Same structure!)
-# ============================================================================
-
-print("\n🛒 STEP 4: Generating purchases (same structure)...")
-print("   (This may take a few minutes...)")
-
-# EXACT COLUMNS: date, orderref, orderline, product, price, quantity, customer
-purchases = []
-order_id_counter = 1
-
-capsules = products_df[products_df['category'] == 1]['code'].tolist()
-machines = products_df[products_df['category'] == 2]['code'].tolist()
-accessories = products_df[products_df['category'] == 4]['code'].tolist()
-
-for idx, customer in recipients_df.iterrows():
-    if idx % 2000 == 0:
-        print(f"   Processing customer {idx}/{len(recipients_df)}...")
-    
-    crmid = customer['crmid']
-    segment = customer['_internal_segment']
-    acquisition_date = customer['_internal_acquisition']
-    owns_machine = customer['_internal_owns_machine']
-    
-    if segment == 'prospect':
-        continue
-    
-    order_counts = {
-        'active_high': (8, 12),
-        'active_medium': (6, 9),
-        'occasional': (2, 4),
-        'one_time': (1, 2),
-        'lapsed': (3, 6)
-    }
-    
-    min_orders, max_orders = order_counts.get(segment, (2, 4))
-    num_orders = random.randint(min_orders, max_orders)
-    
-    reorder_intervals = {
-        'active_high': (25, 35),
-        'active_medium': (40, 60),
-        'occasional': (80, 120),
-        'one_time': (180, 365),
-        'lapsed': (30, 60)
-    }
-    
-    min_interval, max_interval = reorder_intervals[segment]
-    current_date = acquisition_date
-    
-    for order_num in range(num_orders):
-        if order_num == 0:
-            current_date = acquisition_date + timedelta(days=random.randint(0, 14))
+        results = list(shards)
+        for shard in results:
+            collector.add_pending(shard.pop(PENDING_ORDERS))
+        tables = {name: pd.concat([shard[name] for shard in results], ignore_index=True) for name in SHARD_TABLES}
+        integrity.check(tables)
+        collector.add(tables)
+        shard_index.add(tables)
+        aggregator.add(tables)
+        purchases_df = tables['purchases']
+        wishlist_df = tables['wishlist']
+        abandoned_df = tables['abandoned']
+        segments_df = tables['segments']
+        table_rows = {name: len(df) for name, df in tables.items()}
+        num_orders = purchases_df['orderref'].nunique()
+    report.rows(table_rows)
+
+    # EXACT COLUMNS: date, orderref, orderline, product, price, quantity, customer
+    print(f"\n🛒 STEP 4: Purchases (same structure)")
+    print(f"   ✓ Generated {table_rows['purchases']} purchase lines")
+
+    # EXACT COLUMNS: wishListId, wishListName, lastUpdate, creationDate, product, customer
+    # (allows overlap with purchases for conversion tracking)
+    print(f"\n💝 STEP 5: Wishlist (same structure)")
+    print(f"   ✓ Generated {table_rows['wishlist']} wishlist items")
+
+    # COLUMNS: date, cartid, cartnum, product, quantity, tosend, customer
+    print(f"\n🛒 STEP 6: Abandoned carts (with cartnum)")
+    print(f"   ✓ Generated {table_rows['abandoned']} abandoned cart items")
+
+    # EXACT COLUMNS: customer, churnprop, churndate, nps, npsdate, reactscore, reactdate, vip, vipdate
+    print(f"\n📊 STEP 7: Segments (same structure)")
+    print(f"   ✓ Generated {table_rows['segments']} segment records")
+
+    # ============================================================================
+    # STEP 8: VALIDATE FK INTEGRITY
+    # ============================================================================
+
+    print("\n🔍 STEP 8: Validating FK integrity...")
+    report.start("STEP 8: validation")
+
+    errors = []
+    integrity_results = integrity.finish()
+
+    for label, violation in integrity_results.items():
+        if violation is None:
+            print(f"   ✓ {label}: OK")
         else:
-            interval = random.randint(min_interval, max_interval)
-            current_date = current_date + timedelta(days=interval)
-            current_date = apply_seasonality(current_date)
-        
-        if segment == 'lapsed':
-            last_purchase_cutoff = CURRENT_DATE - timedelta(days=random.randint(180, 540))
-            if current_date > last_purchase_cutoff:
-                break
-        
-        if current_date > CURRENT_DATE:
-            break
-        
-        order_ref = f"ORD{str(order_id_counter).zfill(6)}"
-        order_id_counter += 1
-        line_num = 1
-        
-        # First order: maybe buy machine
-        if order_num == 0 and not owns_machine and random.random() < 0.40:
-            machine = random.choice(machines)
-            machine_price = float(products_df[products_df['code'] == machine]['priceref'].iloc[0])
-            purchases.append({
-                'date': format_date(current_date),
-                'orderref': order_ref,
-                'orderline': line_num,
-                'product': machine,
-                'price': machine_price,
-                'quantity': 1,
-                'customer': crmid
-            })
-            line_num += 1
-            owns_machine = True
-        
-        # Add capsules
-        if owns_machine:
-            num_varieties = random.choice([1, 1, 2, 2, 3])
-            selected_capsules = random.sample(capsules, min(num_varieties, len(capsules)))
-            
-            for capsule in selected_capsules:
-                capsule_price = float(products_df[products_df['code'] == capsule]['priceref'].iloc[0])
-                quantity = random.choice([5, 10, 10, 15, 20])
-                purchases.append({
-                    'date': format_date(current_date),
-                    'orderref': order_ref,
-                    'orderline': line_num,
-                    'product': capsule,
-                    'price': capsule_price,
-                    'quantity': quantity,
-                    'customer': crmid
-                })
-                line_num += 1
-        
-        # Maybe add accessories
-        if random.random() < 0.05 and len(accessories) > 0:
-            accessory = random.choice(accessories)
-            accessory_price = float(products_df[products_df['code'] == accessory]['priceref'].iloc[0])
-            purchases.append({
-                'date': format_date(current_date),
-                'orderref': order_ref,
-                'orderline': line_num,
-                'product': accessory,
-                'price': accessory_price,
-                'quantity': 1,
-                'customer': crmid
-            })
-            line_num += 1
-        
-        # Maybe add discount
-        if random.random() < 0.20 and line_num > 1:
-            order_total = sum(p['price'] * p['quantity'] for p in purchases if p['orderref'] == order_ref)
-            discount_amount = round(order_total * random.uniform(0.05, 0.15), 2)
-            purchases.append({
-                'date': format_date(current_date),
-                'orderref': order_ref,
-                'orderline': line_num,
-                'product': 'discount',
-                'price': -discount_amount,
-                'quantity': 1,
-                'customer': crmid
-            })
-
-purchases_df = pd.DataFrame(purchases)
-print(f"   ✓ Generated {len(purchases_df)} purchase lines")
-print(f"   ✓ Structure: {list(purchases_df.columns)}")
-
-# ============================================================================
-# STEP 5: GENERATE WISHLIST (Same structure!)
-# ============================================================================
-
-print("\n💝 STEP 5: Generating wishlist (allows overlap with purchases for conversion tracking)...")
-
-# EXACT COLUMNS: wishListId, wishListName, lastUpdate, creationDate, product, customer
-wishlist = []
-wishlist_id = 1
-
-wishlist_candidates = recipients_df.sample(frac=0.15)
-
-for idx, customer in wishlist_candidates.iterrows():
-    crmid = customer['crmid']
-    customer_purchases = purchases_df[purchases_df['customer'] == crmid]
-    
-    # Get all machines and accessories (don't filter out purchased items!)
-    # This allows tracking wishlist → purchase conversion
-    available = machines + accessories
-    
-    if len(available) > 0:
-        num_items = random.choice([1, 1, 2])
-        selected = random.sample(available, min(num_items, len(available)))
-        
-        for product in selected:
-            # Wishlist creation date logic:
-            # - If customer bought this product, wishlist was added BEFORE first purchase (aspirational)
-            # - If not bought yet, wishlist is recent (ongoing aspiration)
-            
-            product_purchases = customer_purchases[customer_purchases['product'] == product]
-            
-            if len(product_purchases) > 0:
-                # Product was purchased! Wishlist must be BEFORE first purchase
-                first_purchase_date = pd.to_datetime(product_purchases['date'], format='%d/%m/%Y %H:%M').min()
-                first_purchase_date = first_purchase_date.to_pydatetime()
-                
-                # Wishlist created 7-90 days before first purchase
-                days_before = random.randint(7, 90)
-                creation_date = first_purchase_date - timedelta(days=days_before)
-                
-                # Make sure it's after acquisition
-                creation_date = max(creation_date, customer['_internal_acquisition'])
-            else:
-                # Product not purchased yet - recent wishlist (last 6 months)
-                creation_date = random_date(
-                    max(customer['_internal_acquisition'], CURRENT_DATE - timedelta(days=180)),
-                    CURRENT_DATE
-                )
-            
-            last_update = creation_date + timedelta(days=random.randint(0, 30))
-            last_update = min(last_update, CURRENT_DATE)
-            
-            wishlist.append({
-                'wishListId': f'WISH{str(wishlist_id).zfill(6)}',
-                'wishListName': random.randint(0, 5),
-                'lastUpdate': format_date(last_update),
-                'creationDate': format_date(creation_date),
-                'product': product,
-                'customer': crmid
-            })
-            wishlist_id += 1
-
-wishlist_df = pd.DataFrame(wishlist)
-print(f"   ✓ Generated {len(wishlist_df)} wishlist items")
-print(f"   ✓ Structure: {list(wishlist_df.columns)}")
-
-# ============================================================================
-# STEP 6: GENERATE ABANDONED CARTS (Same structure!)
-# ============================================================================
-
-print("\n🛒 STEP 6: Generating abandoned carts (with cartnum)...")
-
-# COLUMNS: date, cartid, cartnum, product, quantity, tosend, customer
-abandoned = []
-cart_id_counter = 1  # Sequential cart ID to avoid duplicates
-
-active_customers = recipients_df[
-    recipients_df['_internal_segment'].isin(['active_high', 'active_medium', 'occasional'])
-]
-
-num_carts_needed = TARGET_ABANDONED
-carts_per_customer = max(1, num_carts_needed // len(active_customers))
-
-for idx, customer in active_customers.iterrows():
-    crmid = customer['crmid']
-    num_carts = random.randint(1, min(carts_per_customer, 3))
-    
-    for _ in range(num_carts):
-        cart_id = f'CART{str(cart_id_counter).zfill(6)}'  # Sequential, unique cart ID
-        cart_id_counter += 1
-        
-        days_ago = int(np.random.exponential(scale=30))
-        days_ago = min(days_ago, 90)
-        cart_date = CURRENT_DATE - timedelta(days=days_ago)
-        
-        num_products = random.choice([1, 1, 2, 3])
-        cart_products = random.sample(capsules + machines, num_products)
-        
-        # Add cartnum (line number within cart)
-        cart_line = 1
-        for product in cart_products:
-            abandoned.append({
-                'date': format_date(cart_date),
-                'cartid': cart_id,
-                'cartnum': cart_line,
-                'product': product,
-                'quantity': random.choice([1, 5, 10, 15, 20]),
-                'tosend': 0,
-                'customer': crmid
-            })
-            cart_line += 1
-        
-        if len(abandoned) >= TARGET_ABANDONED:
-            break
-    
-    if len(abandoned) >= TARGET_ABANDONED:
-        break
-
-abandoned_df = pd.DataFrame(abandoned[:TARGET_ABANDONED])
-print(f"   ✓ Generated {len(abandoned_df)} abandoned cart items")
-print(f"   ✓ Structure: {list(abandoned_df.columns)}")
-
-# ============================================================================
-# STEP 7: GENERATE SEGMENTS (Same structure!)
-# ============================================================================
-
-print("\n📊 STEP 7: Calculating segments (same structure)...")
-
-# EXACT COLUMNS: customer, churnprop, churndate, nps, npsdate, reactscore, reactdate, vip, vipdate
-segments = []
-
-for idx, customer in recipients_df.iterrows():
-    crmid = customer['crmid']
-    customer_orders = purchases_df[purchases_df['customer'] == crmid]
-    
-    if len(customer_orders) > 0:
-        order_dates = pd.to_datetime(customer_orders['date'], format='%d/%m/%Y %H:%M')
-        last_purchase = order_dates.max()
-        days_since = (CURRENT_DATE - last_purchase).days
-        purchase_count = customer_orders['orderref'].nunique()
-        total_spent = customer_orders.apply(lambda x: x['price'] * x['quantity'], axis=1).sum()
-        
-        # Churn propensity
-        if days_since < 60:
-            churnprop = 0
-        elif days_since < 120:
-            churnprop = 1
-        elif days_since < 180:
-            churnprop = 2
-        else:
-            churnprop = 3
-        
-        # VIP tier
-        if total_spent < 100:
-            vip = 0
-        elif total_spent < 500:
-            vip = 1
-        elif total_spent < 1500:
-            vip = 2
-        elif total_spent < 3000:
-            vip = 3
-        else:
-            vip = 4
-        
-        # NPS
-        if purchase_count >= 10:
-            nps = random.choice([8, 9, 9, 9])
-        elif purchase_count >= 5:
-            nps = random.choice([7, 8, 8, 9])
-        else:
-            nps = random.choice([6, 7, 8])
-        
-        reactscore = min(10, purchase_count)
+            errors.append(violation)
+
+    if errors:
+        print("\n❌ VALIDATION FAILED:")
+        for violation in errors:
+            print(f"   • {violation.check}: {violation.count:,} violating rows, e.g.")
+            print("        " + violation.rows.head(5).to_string(max_colwidth=30).replace("\n", "\n        "))
+        raise ValueError("FK integrity validation failed!")
     else:
-        churnprop = 0
-        vip = -1
-        nps = random.choice([6, 7, 8])
-        reactscore = 0
-    
-    segments.append({
-        'customer': crmid,
-        'churnprop': churnprop,
-        'churndate': '10/01/2026 09:00:00',
-        'nps': nps,
-        'npsdate': '15/12/2025 10:00:00',
-        'reactscore': reactscore,
-        'reactdate': '10/01/2026 10:00:00',
-        'vip': vip,
-        'vipdate': '30/11/2025 12:00:00'
-    })
-
-segments_df = pd.DataFrame(segments)
-print(f"   ✓ Generated {len(segments_df)} segment records")
-print(f"   ✓ Structure: {list(segments_df.columns)}")
-
-# ============================================================================
-# STEP 8: VALIDATE FK INTEGRITY
-# ============================================================================
-
-print("\n🔍 STEP 8: Validating FK integrity...")
-
-errors = []
-
-# Validate all FKs
-product_brands = set(products_df['brand'])
-brand_names_set = set(brand_names)
-if not product_brands.issubset(brand_names_set):
-    errors.append(f"Invalid brands in products")
-else:
-    print(f"   ✓ products.brand → brands.name: OK")
-
-recipient_brands = set(recipients_df['brand'])
-if not recipient_brands.issubset(brand_names_set):
-    errors.append(f"Invalid brands in recipients")
-else:
-    print(f"   ✓ recipients.brand → brands.name: OK")
-
-purchase_customers = set(purchases_df['customer'].unique())
-recipient_crmids_set = set(recipient_crmids)
-if not purchase_customers.issubset(recipient_crmids_set):
-    errors.append(f"Invalid customers in purchases")
-else:
-    print(f"   ✓ purchases.customer → recipients.crmid: OK")
-
-purchase_products = set(purchases_df['product'].unique())
-product_codes_set = set(product_codes)
-if not purchase_products.issubset(product_codes_set):
-    errors.append(f"Invalid products in purchases")
-else:
-    print(f"   ✓ purchases.product → products.code: OK")
-
-wishlist_customers = set(wishlist_df['customer'].unique())
-if not wishlist_customers.issubset(recipient_crmids_set):
-    errors.append(f"Invalid customers in wishlist")
-else:
-    print(f"   ✓ wishlist.customer → recipients.crmid: OK")
-
-wishlist_products = set(wishlist_df['product'].unique())
-if not wishlist_products.issubset(product_codes_set):
-    errors.append(f"Invalid products in wishlist")
-else:
-    print(f"   ✓ wishlist.product → products.code: OK")
-
-abandoned_customers = set(abandoned_df['customer'].unique())
-if not abandoned_customers.issubset(recipient_crmids_set):
-    errors.append(f"Invalid customers in abandoned")
-else:
-    print(f"   ✓ abandoned.customer → recipients.crmid: OK")
-
-abandoned_products = set(abandoned_df['product'].unique())
-if not abandoned_products.issubset(product_codes_set):
-    errors.append(f"Invalid products in abandoned")
-else:
-    print(f"   ✓ abandoned.product → products.code: OK")
-
-segments_customers = set(segments_df['customer'])
-if segments_customers != recipient_crmids_set:
-    errors.append(f"Segments not 1:1 with recipients")
-else:
-    print(f"   ✓ segments.customer ↔ recipients.crmid (1:1): OK")
-
-if errors:
-    print("\n❌ VALIDATION FAILED:")
-    for error in errors:
-        print(f"   • {error}")
-    raise ValueError("FK integrity validation failed!")
-else:
-    print("\n✅ ALL FOREIGN KEY CONSTRAINTS VALID")
-
-# ============================================================================
-# STEP 9: WRITE OUTPUT FILES (EXACT SAME STRUCTURE!)
-# ============================================================================
-
-print("\n💾 STEP 9: Writing output files (same structure as originals)...")
-
-DATA_AUGMENTED_DIR.mkdir(exist_ok=True)
-
-# Write brands (unchanged)
-brands_df.to_csv(DATA_AUGMENTED_DIR / "brands.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ brands.csv ({len(brands_df)} rows) - {list(brands_df.columns)}")
-
-# Write products (new products added)
-products_df.to_csv(DATA_AUGMENTED_DIR / "products.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ products.csv ({len(products_df)} rows) - {list(products_df.columns)}")
-
-# Write recipients - ONLY ORIGINAL COLUMNS!
-recipients_export = recipients_df[['crmid', 'firstname', 'lastname', 'email', 'brand', 'birthdate', 'folder']]
-recipients_export.to_csv(DATA_AUGMENTED_DIR / "recipients.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ recipients.csv ({len(recipients_export)} rows) - {list(recipients_export.columns)}")
-
-# Write purchases
-purchases_df.to_csv(DATA_AUGMENTED_DIR / "purchases.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ purchases.csv ({len(purchases_df)} rows) - {list(purchases_df.columns)}")
-
-# Write wishlist
-wishlist_df.to_csv(DATA_AUGMENTED_DIR / "wishlist.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ wishlist.csv ({len(wishlist_df)} rows) - {list(wishlist_df.columns)}")
-
-# Write abandoned
-abandoned_df.to_csv(DATA_AUGMENTED_DIR / "abandoned.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ abandoned.csv ({len(abandoned_df)} rows) - {list(abandoned_df.columns)}")
-
-# Write segments
-segments_df.to_csv(DATA_AUGMENTED_DIR / "segments.csv", sep=';', index=False, encoding='latin-1')
-print(f"   ✓ segments.csv ({len(segments_df)} rows) - {list(segments_df.columns)}")
-
-# ============================================================================
-# SUMMARY
-# ============================================================================
-
-print("\n" + "="*80)
-print("✅ DATA GENERATION COMPLETE")
-print("="*80)
-print(f"\n📊 SUMMARY:")
-print(f"   Brands:          {len(brands_df):>8,}")
-print(f"   Products:        {len(products_df):>8,}")
-print(f"   Recipients:      {len(recipients_export):>8,}")
-print(f"   Purchases:       {len(purchases_df):>8,} lines ({purchases_df['orderref'].nunique():,} orders)")
-print(f"   Wishlist:        {len(wishlist_df):>8,}")
-print(f"   Abandoned:       {len(abandoned_df):>8,}")
-print(f"   Segments:        {len(segments_df):>8,}")
-
-print(f"\n✅ ALL FILES MAINTAIN EXACT SAME STRUCTURE AS ORIGINALS")
-print(f"📁 Files written to: {DATA_AUGMENTED_DIR}/")
-print(f"🎯 Ready for Adobe Campaign Classic import!")
-print("="*80)
+        print("\n✅ ALL FOREIGN KEY CONSTRAINTS VALID")
+
+    # ============================================================================
+    # STEP 9: WRITE OUTPUT FILES (EXACT SAME STRUCTURE!)
+    # ============================================================================
+
+    print("\n💾 STEP 9: Writing output files (same structure as originals)...")
+    report.start("STEP 9: write")
+
+    DATA_AUGMENTED_DIR.mkdir(exist_ok=True)
+
+    # Write brands (unchanged)
+    report.files(write_csv(brands_df, DATA_AUGMENTED_DIR, "brands", compression=COMPRESSION))
+    print(f"   ✓ brands{CSV_SUFFIX} ({len(brands_df)} rows) - {list(brands_df.columns)}")
+
+    # Write products (new products added)
+    report.files(write_csv(products_df, DATA_AUGMENTED_DIR, "products", compression=COMPRESSION))
+    print(f"   ✓ products{CSV_SUFFIX} ({len(products_df)} rows) - {list(products_df.columns)}")
+
+    # Write recipients - ONLY ORIGINAL COLUMNS!
+    recipients_export = recipients_df[['crmid', 'firstname', 'lastname', 'email', 'brand', 'birthdate', 'folder']]
+    report.files(write_csv(recipients_export, DATA_AUGMENTED_DIR, "recipients", compression=COMPRESSION))
+    print(f"   ✓ recipients{CSV_SUFFIX} ({len(recipients_export)} rows) - {list(recipients_export.columns)}")
+
+    if not STREAM_OUTPUT:
+        # Write purchases, wishlist, abandoned, segments (timestamps rendered as
+        # dd/mm/yyyy HH:MM, ids as ORD000001)
+        for name in SHARD_TABLES:
+            report.files(write_csv(tables[name], DATA_AUGMENTED_DIR, name, id_widths, COMPRESSION))
+
+    for name, columns in [('purchases', PURCHASE_COLUMNS), ('wishlist', WISHLIST_COLUMNS),
+                          ('abandoned', ABANDONED_COLUMNS), ('segments', SEGMENT_COLUMNS)]:
+        print(f"   ✓ {name}{CSV_SUFFIX} ({table_rows[name]} rows) - {columns}")
+
+    if COLUMNAR_FORMAT:
+        # Typed sidecars (streamed ones were written with their CSVs)
+        sidecars = {'brands': brands_df, 'products': products_df, 'recipients': recipients_export}
+        if not STREAM_OUTPUT:
+            sidecars.update(tables)
+        for name, df in sidecars.items():
+            report.files(write_columnar(df, DATA_AUGMENTED_DIR, name, COLUMNAR_FORMAT, id_widths, columnar_vocabulary))
+        print(f"   ✓ {COLUMNAR_FORMAT} sidecars: {columnar_path(DATA_AUGMENTED_DIR, '*', COLUMNAR_FORMAT).name}")
+
+    if args.batch_rows or args.batch_size:
+        # Import batches cut from the files above, never inside an order or cart
+        manifest = split_directory(DATA_AUGMENTED_DIR, BATCH_DIR, args.batch_rows, args.batch_size)
+        report.files(BATCH_DIR / MANIFEST_FILE, *(BATCH_DIR / batch['file'] for entry in manifest['tables'].values()
+                                      for batch in entry['batches']))
+        num_batches = sum(len(entry['batches']) for entry in manifest['tables'].values())
+        print(f"   ✓ {BATCH_DIR.name}/ ({num_batches} import batches, listed in {MANIFEST_FILE})")
+
+    # Persist the per-customer state so later runs can use --delta
+    save_state(collector.state(recipients_df, CURRENT_DATE, id_widths, RANDOM_SEED, TARGET_ABANDONED),
+               DATA_AUGMENTED_DIR / STATE_FILE)
+    print(f"   ✓ {STATE_FILE} (state for incremental --delta runs)")
+    report.files(DATA_AUGMENTED_DIR / STATE_FILE)
+    report.files(save_shard_index(shard_index.result(CURRENT_DATE, RANDOM_SEED, TARGET_ABANDONED, id_widths),
+                                  DATA_AUGMENTED_DIR / SHARD_INDEX_FILE))
+    print(f"   ✓ {SHARD_INDEX_FILE} (shard index for single-customer regeneration)")
+
+    # Precomputed report numbers, keyed on the content hash of the files above
+    violations = {label: violation.count if violation else 0 for label, violation in integrity_results.items()}
+    report.files(save_aggregates(aggregator.result(violations), DATA_AUGMENTED_DIR))
+    print(f"   ✓ {AGGREGATES_FILE} (precomputed verify_data.py aggregates)")
+    report.rows(brands=len(brands_df), products=len(products_df), recipients=len(recipients_export),
+                **({} if STREAM_OUTPUT else table_rows))
+
+    report.write(DATA_AUGMENTED_DIR / REPORT_FILE)
+    print(f"   ✓ {REPORT_FILE} (per-step timings{', profiles in profile/' if args.profile else ''})")
+
+    # ============================================================================
+    # SUMMARY
+    # ============================================================================
+
+    print("\n" + "="*80)
+    print("✅ DATA GENERATION COMPLETE")
+    print("="*80)
+    print(f"\n📊 SUMMARY:")
+    print(f"   Brands:          {len(brands_df):>8,}")
+    print(f"   Products:        {len(products_df):>8,}")
+    print(f"   Recipients:      {len(recipients_export):>8,}")
+    print(f"   Purchases:       {table_rows['purchases']:>8,} lines ({num_orders:,} orders)")
+    print(f"   Wishlist:        {table_rows['wishlist']:>8,}")
+    print(f"   Abandoned:       {table_rows['abandoned']:>8,}")
+    print(f"   Segments:        {table_rows['segments']:>8,}")
+
+    if cache.enabled:
+        print(f"   Cached stages:   {len(cache.hits):>8,} reused, {len(cache.misses):,} computed ({cache.directory}/"
+              f"{f', {cache.evicted:,} evicted' if cache.evicted else ''})")
+
+    print(f"\n✅ ALL FILES MAINTAIN EXACT SAME STRUCTURE AS ORIGINALS")
+    print(f"📁 Files written to: {DATA_AUGMENTED_DIR}/")
+    print(f"🎯 Ready for Adobe Campaign Classic import!")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
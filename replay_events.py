@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Replay purchases, wishlist additions and abandoned carts as a live event feed (HTTP NDJSON / TCP)
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from frescopa.replay import EVENT_TABLES, ReplayServer, load_events, parse_positive, parse_since, serve
+
+DATA_DIR = Path("data-augmented")
+HOST = "127.0.0.1"
+HTTP_PORT = 8765
+TCP_PORT = 8766
+
+def since_date(text):
+    """--since, validated before the events are loaded"""
+    try:
+        parse_since(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    return text
+
+def positive(kind):
+    """--speedup / --rate / --limit: above 0 (leave the option out for no pacing or limit)"""
+    def parse(text):
+        try:
+            return parse_positive(text, kind)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error))
+    return parse
+
+parser = argparse.ArgumentParser(description="Frescopa real-time event replay")
+parser.add_argument('--data-dir', default=DATA_DIR, type=Path,
+                    help=f"directory of the tables to replay (default: {DATA_DIR})")
+parser.add_argument('--tables', nargs='+', choices=list(EVENT_TABLES), default=list(EVENT_TABLES),
+                    help="tables to replay (default: all three)")
+pacing = parser.add_mutually_exclusive_group()
+pacing.add_argument('--speedup', type=positive(float),
+                    help="replay event time this many times faster (e.g. 3600: one hour per second)")
+pacing.add_argument('--rate', type=positive(float),
+                    help="replay at a fixed rate of events/sec (default: as fast as the consumer reads)")
+parser.add_argument('--since', type=since_date, help="start at the first event on or after dd/mm/yyyy [HH:MM]")
+parser.add_argument('--limit', type=positive(int), help="stop each replay after this many events")
+parser.add_argument('--host', default=HOST, help=f"address to listen on (default: {HOST})")
+parser.add_argument('--http-port', default=HTTP_PORT, type=int, help=f"HTTP port (default: {HTTP_PORT})")
+parser.add_argument('--tcp-port', default=TCP_PORT, type=int, help=f"TCP port, 0 to disable (default: {TCP_PORT})")
+parser.add_argument('--report-every', default=5.0, type=float, help="seconds between metric lines (default: 5)")
+args = parser.parse_args()
+
+print("=" * 80)
+print("FRESCOPA EVENT REPLAY")
+print("=" * 80)
+
+print(f"\n📥 Loading {', '.join(args.tables)} from {args.data_dir}/...")
+start = time.perf_counter()
+events = load_events(args.data_dir, args.tables)
+for name, rows in events.counts.items():
+    print(f"   ✓ {name + ':':<12} {rows:>10,} events")
+print(f"   ✓ {len(events):,} events in time order ({len(events.data) / 1e6:,.1f} MB NDJSON) in {time.perf_counter() - start:.2f}s")
+
+server = ReplayServer(events, args.speedup, args.rate, args.since, args.limit)
+pace = (f"{args.speedup:g}x event time" if args.speedup else
+        f"{args.rate:,.0f} events/sec" if args.rate else "as fast as the consumer reads")
+
+def report(metrics):
+    print(f"   📈 {metrics['events_per_sec']:>9,} events/s | {metrics['events']:>11,} sent | "
+          f"{metrics['active']} active | lag {metrics['lag_seconds']:.3f}s (max {metrics['max_lag_seconds']:.3f}s)")
+
+print(f"\n📡 Replaying {pace}")
+print(f"   HTTP: curl -N 'http://{args.host}:{args.http_port}/events'  (metrics: /metrics)")
+if args.tcp_port:
+    print(f"   TCP:  nc {args.host} {args.tcp_port}")
+print("   Ctrl+C to stop\n")
+
+try:
+    asyncio.run(serve(server, args.host, args.http_port, args.tcp_port or None, args.report_every, report))
+except KeyboardInterrupt:
+    pass
+
+metrics = server.metrics.snapshot()
+print("\n" + "=" * 80)
+print(f"✅ Replay stopped: {metrics['events']:,} events to {metrics['connections']} connections "
+      f"in {metrics['uptime_seconds']:,.0f}s (max lag {metrics['max_lag_seconds']:.3f}s)")
+print("=" * 80)
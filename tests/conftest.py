@@ -0,0 +1,42 @@
+"""
+Shared fixtures: full generator runs in temporary directories
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import generate_augmented_data
+
+def run_generator(work_dir, *argv):
+    """Run generate_augmented_data.main(argv) in work_dir (output in work_dir/data-augmented)"""
+    work_dir.mkdir(parents=True, exist_ok=True)
+    if not (work_dir / "data-sample").exists():
+        (work_dir / "data-sample").symlink_to(ROOT / "data-sample")
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_augmented_data.main(['--no-cache', *argv])
+    finally:
+        os.chdir(cwd)
+    return work_dir / "data-augmented"
+
+@pytest.fixture(scope='session')
+def full_run(tmp_path_factory):
+    """data-augmented/ of a default in-memory run with one worker"""
+    return run_generator(tmp_path_factory.mktemp('full'))
+
+@pytest.fixture
+def full_run_copy(full_run, tmp_path):
+    """A work directory holding a private copy of the full run (for --delta)"""
+    shutil.copytree(full_run, tmp_path / "data-augmented")
+    return tmp_path
@@ -0,0 +1,33 @@
+"""
+Single-customer regeneration matches the customer's rows in the full run,
+from the shard index and rebuilt from the seed
+"""
+
+import pytest
+
+from conftest import ROOT
+from frescopa.customers import customer_index, generate_customer
+from frescopa.sharding import SHARD_TABLES
+from test_generator import read_csv
+
+@pytest.fixture(scope='module')
+def batch_tables(full_run):
+    return {name: read_csv(full_run, name) for name in SHARD_TABLES}
+
+@pytest.fixture(scope='module')
+def sample_customers(batch_tables):
+    """A customer with rows in every table, and one from the last shard"""
+    customers = set(batch_tables['segments']['customer'])
+    for name in ['purchases', 'wishlist', 'abandoned']:
+        customers &= set(batch_tables[name]['customer'])
+    return [min(customers), batch_tables['segments']['customer'].iloc[-1]]
+
+@pytest.mark.parametrize('from_index', [True, False])
+def test_generate_customer_matches_batch_rows(full_run, tmp_path, batch_tables, sample_customers, from_index):
+    data_dir = full_run if from_index else tmp_path
+    customer_index.cache_clear()
+    for crmid in sample_customers:
+        rows = generate_customer(crmid, data_dir, render=True, data_sample_dir=ROOT / "data-sample")
+        for name, df in batch_tables.items():
+            expected = df[df['customer'] == crmid]
+            assert rows[name].to_csv(sep=';', index=False) == expected.to_csv(sep=';', index=False), (crmid, name)
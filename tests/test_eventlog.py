@@ -0,0 +1,35 @@
+"""
+Event log: the external sort gives the replay server's buffer, in time order
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from frescopa.eventlog import write_event_log
+from frescopa.replay import load_events
+from frescopa.timestamps import parse_timestamps
+
+@pytest.fixture(scope='module')
+def replay_buffer(full_run):
+    return load_events(full_run)
+
+@pytest.mark.parametrize('run_rows, fanin', [(None, None), (5000, 4)])
+def test_event_log_matches_replay_buffer(full_run, tmp_path, replay_buffer, run_rows, fanin):
+    # Small runs and fan-in force intermediate merge passes
+    options = {key: value for key, value in [('run_rows', run_rows), ('fanin', fanin)] if value}
+    path = tmp_path / "events.ndjson"
+    counts = write_event_log(full_run, path, work_dir=tmp_path, **options)
+
+    assert counts == replay_buffer.counts
+    assert path.read_bytes() == replay_buffer.data
+    assert not list(tmp_path.glob('runs-*'))
+
+def test_events_are_in_time_order(replay_buffer):
+    events = [json.loads(line) for line in bytes(replay_buffer.data).splitlines()]
+    assert len(events) == len(replay_buffer)
+    times = np.array([event.get('date') or event['creationDate'] for event in events], dtype=object)
+    minutes = parse_timestamps(times).astype(np.int64)
+    assert (np.diff(minutes) >= 0).all()
+    assert (minutes == replay_buffer.minutes).all()
@@ -0,0 +1,54 @@
+"""
+Generator output: identical for any worker count and in streaming mode,
+and deltas continue the ids and the timeline of the full run
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import run_generator
+from frescopa.delta import STATE_FILE
+from frescopa.pipeline import CURRENT_DATE, TABLES
+from frescopa.timestamps import DATE_FORMAT
+
+def read_csv(directory, name):
+    return pd.read_csv(directory / f"{name}.csv", sep=';', encoding='latin-1', dtype=str, keep_default_na=False)
+
+@pytest.mark.parametrize('argv', [['--workers', '4'], ['--stream'], ['--stream', '--workers', '4']])
+def test_output_identical_for_workers_and_stream(full_run, tmp_path, argv):
+    output = run_generator(tmp_path, *argv)
+    for name in TABLES:
+        assert (output / f"{name}.csv").read_bytes() == (full_run / f"{name}.csv").read_bytes(), name
+
+def test_delta_continues_ids_and_dates(full_run_copy):
+    full = full_run_copy / "data-augmented"
+    before = {name: read_csv(full, name) for name in ['purchases', 'wishlist', 'abandoned']}
+    run_generator(full_run_copy, '--delta', '1')
+
+    delta_day = pd.Timestamp(CURRENT_DATE) + pd.Timedelta(days=1)
+    delta = full / f"delta-{delta_day:%Y%m%d}"
+    with np.load(full / STATE_FILE) as state:
+        assert np.datetime64(int(state['current_day']), 'D') == np.datetime64(delta_day.date())
+
+    for name, id_col in [('purchases', 'orderref'), ('wishlist', 'wishListId'), ('abandoned', 'cartid')]:
+        df = read_csv(delta, name)
+        assert len(df) > 0, name
+        # Ids go on from the last id of the full run, without gaps
+        prefix = before[name][id_col].iloc[0].rstrip('0123456789')
+        last = before[name][id_col].str.removeprefix(prefix).astype(int).max()
+        ids = np.unique(df[id_col].str.removeprefix(prefix).astype(int))
+        assert ids.tolist() == list(range(last + 1, last + 1 + len(ids))), name
+        assert df[id_col].str.len().eq(before[name][id_col].str.len().iloc[0]).all(), name
+
+    # New orders fall on the delta day; carts and wishlist items within the window
+    dates = pd.to_datetime(read_csv(delta, 'purchases')['date'], format=DATE_FORMAT)
+    assert (dates.dt.normalize() == delta_day).all()
+    created = pd.to_datetime(read_csv(delta, 'wishlist')['creationDate'], format=DATE_FORMAT)
+    assert (created.dt.normalize() == delta_day).all()
+    carts = pd.to_datetime(read_csv(delta, 'abandoned')['date'], format=DATE_FORMAT)
+    assert (carts.dt.normalize() == delta_day).all()
+
+    # Orders only go to known recipients
+    recipients = set(read_csv(full, 'recipients')['crmid'])
+    assert set(read_csv(delta, 'purchases')['customer']) <= recipients
@@ -0,0 +1,42 @@
+"""
+Integrity engine: every violation is counted and reported with its rows
+"""
+
+import pandas as pd
+
+from frescopa.integrity import check_directory, check_tables, covering_label, fk_label, unique_label
+from test_generator import read_csv
+
+TABLES = ['brands', 'products', 'recipients', 'purchases', 'wishlist', 'abandoned', 'segments']
+
+def test_clean_run_has_no_violations(full_run):
+    brands = read_csv(full_run, 'brands')['name']
+    assert all(violation is None for violation in check_directory(full_run, brands).values())
+
+def test_violations_are_reported_with_their_rows(full_run):
+    tables = {name: read_csv(full_run, name) for name in TABLES}
+    purchases = tables['purchases']
+    purchases.loc[10, 'customer'] = 'CRM9999999999'
+    tables['purchases'] = pd.concat([purchases, purchases.iloc[[0]]], ignore_index=True)
+    dropped = tables['segments']['customer'].iloc[3]
+    tables['segments'] = tables['segments'].drop(index=3)
+
+    results = check_tables(tables, tables['brands']['name'])
+
+    unknown = results[fk_label('purchases', 'customer', 'recipients', 'crmid')]
+    assert unknown.count == 1
+    assert unknown.rows.index.tolist() == [10]
+    assert unknown.rows['customer'].tolist() == ['CRM9999999999']
+
+    # Both rows of a duplicated key are reported
+    duplicate = results[unique_label('purchases', ['orderref', 'orderline'])]
+    assert duplicate.count == 2
+    assert duplicate.rows.index.tolist() == [0, len(purchases)]
+    assert duplicate.rows['orderref'].tolist() == [purchases['orderref'].iloc[0]] * 2
+
+    uncovered = results[covering_label('segments', 'customer', 'recipients', 'crmid')]
+    assert uncovered.count == 1
+    assert uncovered.rows['crmid'].tolist() == [dropped]
+
+    reported = {label for label, violation in results.items() if violation is not None}
+    assert reported == {unknown.check, duplicate.check, uncovered.check}
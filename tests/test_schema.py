@@ -0,0 +1,22 @@
+"""
+Compact dtypes: loading a table and rendering it back is lossless
+"""
+
+import pandas as pd
+import pytest
+
+from frescopa.export import CSV_OPTIONS
+from frescopa.pipeline import TABLES
+from frescopa.schema import load_table, render
+
+@pytest.mark.parametrize('name', TABLES)
+def test_load_render_round_trip(full_run, tmp_path, name):
+    compact_df = load_table(full_run, name)
+    # Keys and dates really are compact, not strings passed through
+    if name == 'purchases':
+        assert pd.api.types.is_integer_dtype(compact_df['orderref'])
+        assert pd.api.types.is_datetime64_any_dtype(compact_df['date'])
+        assert isinstance(compact_df['product'].dtype, pd.CategoricalDtype)
+
+    render(compact_df).to_csv(tmp_path / f"{name}.csv", **CSV_OPTIONS)
+    assert (tmp_path / f"{name}.csv").read_bytes() == (full_run / f"{name}.csv").read_bytes()
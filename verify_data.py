@@ -3,150 +3,194 @@
 Quick verification and sample queries for the augmented data
 """
 
+import json
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from frescopa.aggregates import AggregateCollector, SOURCE_TABLES, load_aggregates
+from frescopa.catalog import build_catalog
+from frescopa.integrity import Violation, check_tables
+from frescopa.schema import load_table
+
 DATA_DIR = Path("data-augmented")
 
-print("="*80)
-print("📊 FRESCOPA DATA VERIFICATION & SAMPLE QUERIES")
-print("="*80)
-
-# Load data
-recipients_df = pd.read_csv(DATA_DIR / "recipients.csv", sep=';', encoding='latin-1')
-purchases_df = pd.read_csv(DATA_DIR / "purchases.csv", sep=';', encoding='latin-1')
-segments_df = pd.read_csv(DATA_DIR / "segments.csv", sep=';', encoding='latin-1')
-abandoned_df = pd.read_csv(DATA_DIR / "abandoned.csv", sep=';', encoding='latin-1')
-wishlist_df = pd.read_csv(DATA_DIR / "wishlist.csv", sep=';', encoding='latin-1')
-
-# Convert dates
-purchases_df['date'] = pd.to_datetime(purchases_df['date'], format='%d/%m/%Y %H:%M')
-abandoned_df['date'] = pd.to_datetime(abandoned_df['date'], format='%d/%m/%Y %H:%M')
-
-print("\n1️⃣  RECIPIENT DATA")
-print("-" * 80)
-print(f"   Total recipients:    {len(recipients_df):>8,}")
-print(f"   Columns: {', '.join(recipients_df.columns)}")
-print(f"   Note: Demographics (segment, country, etc.) tracked in segments table")
-
-print("\n2️⃣  PURCHASE ANALYSIS")
-print("-" * 80)
-print(f"   Total orders:        {purchases_df['orderref'].nunique():>8,}")
-print(f"   Total order lines:   {len(purchases_df):>8,}")
-print(f"   Unique customers:    {purchases_df['customer'].nunique():>8,}")
-print(f"   Avg lines per order: {len(purchases_df) / purchases_df['orderref'].nunique():>8.2f}")
-
-# Top products
-print("\n   Top 5 Products by Order Lines:")
-top_products = purchases_df['product'].value_counts().head(5)
-for product, count in top_products.items():
-    print(f"      {product:20} {count:>6,} lines")
-
-print("\n3️⃣  VIP TIER DISTRIBUTION")
-print("-" * 80)
-vip_counts = segments_df['vip'].value_counts().sort_index()
-vip_labels = {-1: 'Invalid/Prospect', 0: 'Standard', 1: 'Bronze', 2: 'Silver', 3: 'Gold', 4: 'Platinum'}
-for tier, count in vip_counts.items():
-    pct = count / len(segments_df) * 100
-    label = vip_labels.get(tier, f'Tier {tier}')
-    print(f"   {label:15} {count:>6,} ({pct:>5.1f}%)")
-
-print("\n4️⃣  CHURN RISK DISTRIBUTION")
-print("-" * 80)
-churn_counts = segments_df['churnprop'].value_counts().sort_index()
-churn_labels = {0: 'Low', 1: 'Medium', 2: 'High', 3: 'Very High'}
-for risk, count in churn_counts.items():
-    pct = count / len(segments_df) * 100
-    label = churn_labels.get(risk, f'Risk {risk}')
-    print(f"   {label:15} {count:>6,} ({pct:>5.1f}%)")
-
-print("\n5️⃣  SAMPLE DEMO QUERIES")
-print("-" * 80)
-
-# Query 1: Get segment info from segments table
-active_high_segments = segments_df[segments_df['vip'] >= 3]  # Gold/Platinum as proxy for "active high value"
-print(f"\n   Query 1: High-value customers (Gold/Platinum VIP)")
-print(f"   Result: {len(active_high_segments):,} customers")
-print(f"   Use case: Premium capsule bundle offers")
-
-# Query 2: Lapsed customers from segments (high churn risk)
-lapsed_segments = segments_df[segments_df['churnprop'] == 3]
-print(f"\n   Query 2: Very high churn risk (no purchase >6 months)")
-print(f"   Result: {len(lapsed_segments):,} customers")
-print(f"   Use case: Win-back campaign with 20% discount")
-
-# Query 3: Recent cart abandoners
-recent_carts = abandoned_df[abandoned_df['tosend'] == 0]
-cart_customers = recent_carts['customer'].nunique()
-print(f"\n   Query 3: Customers with abandoned carts (reminder not sent)")
-print(f"   Result: {cart_customers:,} customers ({len(recent_carts):,} items)")
-print(f"   Use case: 24h automated reminder emails")
-
-# Query 4: Wishlist with high-value items
-wishlist_machines = wishlist_df[wishlist_df['product'].isin(['BrewMaster', 'CaffeineQueen'])]
-print(f"\n   Query 4: Customers with machines in wishlist")
-print(f"   Result: {wishlist_machines['customer'].nunique():,} customers")
-print(f"   Use case: Machine promotion alerts")
-
-# Query 5: Machine owners without recent capsule purchase
-# Get machine buyers
-machine_purchases = purchases_df[purchases_df['product'].isin(['BrewMaster', 'CaffeineQueen'])]
-machine_owners = set(machine_purchases['customer'].unique())
-
-# Get recent capsule buyers (last 60 days)
-capsule_products = ['VanillaVelvet', 'MorningBoost', 'MochaMadness', 'EspressoEnergy', 
-                    'CaramelCream', 'RomaRoast', 'MilanoMagic', 'CapriCappuccino', 
-                    'AmericanoBliss', 'DecafDelight', 'HazelnutHeaven', 'ChocolateCharm', 
-                    'IntenseIndulgence']
-recent_date = pd.Timestamp('2025-11-15')  # 60 days before Jan 15, 2026
-recent_capsules = purchases_df[
-    (purchases_df['product'].isin(capsule_products)) & 
-    (purchases_df['date'] >= recent_date)
-]
-recent_capsule_buyers = set(recent_capsules['customer'].unique())
-
-# Machine owners without recent capsule purchase
-needs_replenishment = machine_owners - recent_capsule_buyers
-print(f"\n   Query 5: Machine owners without capsule purchase in last 60 days")
-print(f"   Result: {len(needs_replenishment):,} customers")
-print(f"   Use case: Capsule replenishment reminder")
-
-# Query 6: Multi-tier VIP customers
-vip_segments = segments_df[segments_df['vip'] >= 3]
-print(f"\n   Query 6: Gold/Platinum VIP customers")
-print(f"   Result: {len(vip_segments):,} customers")
-print(f"   Use case: Exclusive VIP offers")
-print(f"   Note: Use recipients table join for country/language targeting")
-
-print("\n6️⃣  TEMPORAL PATTERNS")
-print("-" * 80)
-
-# Orders by month (last 6 months)
-purchases_df['month'] = purchases_df['date'].dt.to_period('M')
-recent_months = purchases_df[purchases_df['date'] >= '2025-07-01']
-monthly_orders = recent_months.groupby('month')['orderref'].nunique()
-
-print(f"\n   Orders by month (Jul 2025 - Jan 2026):")
-for month, count in monthly_orders.items():
-    print(f"      {month}: {count:>5,} orders")
-
-print("\n7️⃣  ABANDONED CART RECENCY")
-print("-" * 80)
-from datetime import datetime, timedelta
-current_date = pd.Timestamp('2026-01-15')
-
-abandoned_df['days_ago'] = (current_date - abandoned_df['date']).dt.days
-recency_bins = [0, 7, 14, 30, 60, 90]
-recency_labels = ['<7 days', '7-14 days', '14-30 days', '30-60 days', '60-90 days']
-abandoned_df['recency'] = pd.cut(abandoned_df['days_ago'], bins=recency_bins, labels=recency_labels)
-
-print(f"\n   Abandoned cart recency distribution:")
-recency_counts = abandoned_df['recency'].value_counts().sort_index()
-for period, count in recency_counts.items():
-    pct = count / len(abandoned_df) * 100
-    print(f"      {period:12} {count:>5,} items ({pct:>5.1f}%)")
-
-print("\n" + "="*80)
-print("✅ VERIFICATION COMPLETE - Data ready for Adobe Campaign!")
-print("="*80)
-print(f"\nSee DATA_SUMMARY.md for complete documentation")
+TABLES = ['brands', 'products', 'recipients', 'purchases', 'segments', 'abandoned', 'wishlist']
+
+def load_tables(data_dir=DATA_DIR):
+    """Load data with compact dtypes (integer keys, categorical codes, datetime64 dates)"""
+    return {name: load_table(data_dir, name) for name in TABLES}
+
+def compute_aggregates(tables):
+    """Report aggregates recomputed from loaded tables (same as the generator's sidecar)"""
+    collector = AggregateCollector(build_catalog(tables['products']))
+    collector.add({name: tables[name] for name in SOURCE_TABLES})
+    aggregates = collector.result()
+    aggregates['integrity'] = check_tables(tables, tables['brands']['name'])
+    return aggregates
+
+def load_report_data(data_dir=DATA_DIR):
+    """Aggregates from the generator's sidecar when fresh, else recomputed from the tables"""
+    aggregates = load_aggregates(data_dir)
+    if aggregates is None:
+        print("   (aggregates sidecar missing or stale - recomputing from the tables)")
+        return compute_aggregates(load_tables(data_dir))
+    # The generator only saves the sidecar once STEP 8 passed
+    aggregates['integrity'] = {label: Violation(label, count, pd.DataFrame()) if count else None
+                               for label, count in zip(aggregates['integrity_checks'],
+                                                       aggregates['integrity_violations'])}
+    return aggregates
+
+def _counts(aggregates, key):
+    return zip(aggregates[f'{key}_values'].tolist(), aggregates[f'{key}_counts'].tolist())
+
+def recipient_data(aggregates):
+    columns = json.loads(str(aggregates['columns'][0]))['recipients']
+
+    print("\n1️⃣  RECIPIENT DATA")
+    print("-" * 80)
+    print(f"   Total recipients:    {aggregates['recipients_rows']:>8,}")
+    print(f"   Columns: {', '.join(columns)}")
+    print(f"   Note: Demographics (segment, country, etc.) tracked in segments table")
+
+def purchase_analysis(aggregates):
+    print("\n2️⃣  PURCHASE ANALYSIS")
+    print("-" * 80)
+    print(f"   Total orders:        {aggregates['orders']:>8,}")
+    print(f"   Total order lines:   {aggregates['purchases_rows']:>8,}")
+    print(f"   Unique customers:    {aggregates['purchase_customers']:>8,}")
+    print(f"   Avg lines per order: {aggregates['purchases_rows'] / aggregates['orders']:>8.2f}")
+
+    # Top products
+    print("\n   Top 5 Products by Order Lines:")
+    top_products = list(_counts(aggregates, 'product_lines'))[:5]
+    for product, count in top_products:
+        print(f"      {product:20} {count:>6,} lines")
+
+def vip_distribution(aggregates):
+    print("\n3️⃣  VIP TIER DISTRIBUTION")
+    print("-" * 80)
+    vip_labels = {-1: 'Invalid/Prospect', 0: 'Standard', 1: 'Bronze', 2: 'Silver', 3: 'Gold', 4: 'Platinum'}
+    for tier, count in _counts(aggregates, 'vip'):
+        pct = count / aggregates['segments_rows'] * 100
+        label = vip_labels.get(tier, f'Tier {tier}')
+        print(f"   {label:15} {count:>6,} ({pct:>5.1f}%)")
+
+def churn_distribution(aggregates):
+    print("\n4️⃣  CHURN RISK DISTRIBUTION")
+    print("-" * 80)
+    churn_labels = {0: 'Low', 1: 'Medium', 2: 'High', 3: 'Very High'}
+    for risk, count in _counts(aggregates, 'churnprop'):
+        pct = count / aggregates['segments_rows'] * 100
+        label = churn_labels.get(risk, f'Risk {risk}')
+        print(f"   {label:15} {count:>6,} ({pct:>5.1f}%)")
+
+def demo_queries(aggregates):
+    vip_counts = dict(_counts(aggregates, 'vip'))
+    churn_counts = dict(_counts(aggregates, 'churnprop'))
+
+    print("\n5️⃣  SAMPLE DEMO QUERIES")
+    print("-" * 80)
+
+    # Query 1: Get segment info from segments table
+    active_high_segments = sum(n for tier, n in vip_counts.items() if tier >= 3)  # Gold/Platinum as proxy for "active high value"
+    print(f"\n   Query 1: High-value customers (Gold/Platinum VIP)")
+    print(f"   Result: {active_high_segments:,} customers")
+    print(f"   Use case: Premium capsule bundle offers")
+
+    # Query 2: Lapsed customers from segments (high churn risk)
+    lapsed_segments = churn_counts.get(3, 0)
+    print(f"\n   Query 2: Very high churn risk (no purchase >6 months)")
+    print(f"   Result: {lapsed_segments:,} customers")
+    print(f"   Use case: Win-back campaign with 20% discount")
+
+    # Query 3: Recent cart abandoners
+    print(f"\n   Query 3: Customers with abandoned carts (reminder not sent)")
+    print(f"   Result: {aggregates['pending_cart_customers']:,} customers ({aggregates['pending_cart_items']:,} items)")
+    print(f"   Use case: 24h automated reminder emails")
+
+    # Query 4: Wishlist with high-value items
+    print(f"\n   Query 4: Customers with machines in wishlist")
+    print(f"   Result: {aggregates['wishlist_machine_customers']:,} customers")
+    print(f"   Use case: Machine promotion alerts")
+
+    # Query 5: Machine owners without recent capsule purchase
+    # (per customer: machine bought, last capsule purchase)
+    recent_date = np.datetime64('2025-11-15')  # 60 days before Jan 15, 2026
+    recent_capsule = aggregates['last_capsule'] >= recent_date
+    needs_replenishment = aggregates['machine_owner'] & ~recent_capsule
+    print(f"\n   Query 5: Machine owners without capsule purchase in last 60 days")
+    print(f"   Result: {int(needs_replenishment.sum()):,} customers")
+    print(f"   Use case: Capsule replenishment reminder")
+
+    # Query 6: Multi-tier VIP customers
+    vip_segments = sum(n for tier, n in vip_counts.items() if tier >= 3)
+    print(f"\n   Query 6: Gold/Platinum VIP customers")
+    print(f"   Result: {vip_segments:,} customers")
+    print(f"   Use case: Exclusive VIP offers")
+    print(f"   Note: Use recipients table join for country/language targeting")
+
+def temporal_patterns(aggregates):
+    print("\n6️⃣  TEMPORAL PATTERNS")
+    print("-" * 80)
+
+    # Orders by month (last 6 months)
+    months = aggregates['month_orders_values']
+    recent = months >= np.datetime64('2025-07')
+
+    print(f"\n   Orders by month (Jul 2025 - Jan 2026):")
+    for month, count in zip(months[recent], aggregates['month_orders_counts'][recent]):
+        print(f"      {month}: {count:>5,} orders")
+
+def abandoned_recency(aggregates):
+    print("\n7️⃣  ABANDONED CART RECENCY")
+    print("-" * 80)
+    current_date = pd.Timestamp('2026-01-15')
+
+    # Cart items per timestamp
+    days_ago = (current_date - pd.DatetimeIndex(aggregates['cart_dates_values'])).days
+    recency_bins = [0, 7, 14, 30, 60, 90]
+    recency_labels = ['<7 days', '7-14 days', '14-30 days', '30-60 days', '60-90 days']
+    recency = pd.cut(days_ago, bins=recency_bins, labels=recency_labels)
+
+    print(f"\n   Abandoned cart recency distribution:")
+    recency_counts = pd.Series(aggregates['cart_dates_counts']).groupby(recency, observed=False).sum()
+    for period, count in recency_counts.items():
+        pct = count / aggregates['abandoned_rows'] * 100
+        print(f"      {period:12} {count:>5,} items ({pct:>5.1f}%)")
+
+def integrity(aggregates):
+    print("\n8️⃣  REFERENTIAL INTEGRITY")
+    print("-" * 80)
+    violations = 0
+    for label, violation in aggregates['integrity'].items():
+        if violation is None:
+            print(f"   ✓ {label}: OK")
+            continue
+        violations += 1
+        print(f"   ✗ {label}: {violation.count:,} violating rows, e.g.")
+        print("        " + violation.rows.head(5).to_string(max_colwidth=30).replace("\n", "\n        "))
+    if violations:
+        print(f"\n   ⚠️  {violations} integrity checks failed")
+
+# Report sections, in print order (also timed one by one by benchmarks/bench.py)
+QUERY_BLOCKS = [recipient_data, purchase_analysis, vip_distribution, churn_distribution,
+                demo_queries, temporal_patterns, abandoned_recency, integrity]
+
+def main():
+    print("="*80)
+    print("📊 FRESCOPA DATA VERIFICATION & SAMPLE QUERIES")
+    print("="*80)
+
+    aggregates = load_report_data()
+    for block in QUERY_BLOCKS:
+        block(aggregates)
+
+    print("\n" + "="*80)
+    print("✅ VERIFICATION COMPLETE - Data ready for Adobe Campaign!")
+    print("="*80)
+    print(f"\nSee DATA_SUMMARY.md for complete documentation")
+
+if __name__ == '__main__':
+    main()